@@ -0,0 +1,78 @@
+"""Show that BfsChecker scales linearly with the number of entries.
+
+Feeds synthetic, BFS-ordered streams of `zarr.json` names
+(a plate-like hierarchy of rows, wells and fields, interleaved with chunk names)
+to a BfsChecker and reports the time per entry,
+which should stay roughly constant as the stream grows.
+
+    python benchmarks/bfs_checker.py --max-exponent 7
+"""
+
+from argparse import ArgumentParser
+from collections.abc import Iterator
+from math import ceil
+import time
+
+from ozx_tck.validate import BfsChecker
+
+
+def plate_names(n: int) -> Iterator[str]:
+    """Yield about `n` names from a 3-level hierarchy in BFS order.
+
+    Each level has about the cube root of `n` siblings,
+    so sibling counts grow with `n`.
+    """
+    width = max(1, ceil(n ** (1 / 3)))
+    yield "zarr.json"
+    for row in range(width):
+        yield f"r{row}/zarr.json"
+    for row in range(width):
+        for well in range(width):
+            yield f"r{row}/w{well}/zarr.json"
+    for row in range(width):
+        for well in range(width):
+            for field in range(width):
+                yield f"r{row}/w{well}/f{field}/zarr.json"
+                yield f"r{row}/w{well}/f{field}/c/0/0"
+
+
+def wide_names(n: int) -> Iterator[str]:
+    """Yield `n` names from a single group with `n - 1` children."""
+    yield "zarr.json"
+    for idx in range(n - 1):
+        yield f"{idx}/zarr.json"
+
+
+SCENARIOS = {"plate": plate_names, "wide": wide_names}
+
+
+def run(scenario: str, n: int) -> tuple[int, float, bool]:
+    names = list(SCENARIOS[scenario](n))
+    checker = BfsChecker()
+    start = time.perf_counter()
+    for name in names:
+        checker.is_bfs_order(name)
+    elapsed = time.perf_counter() - start
+    return len(names), elapsed, checker.bfs
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-exponent", type=int, default=3)
+    parser.add_argument("--max-exponent", type=int, default=6)
+    parser.add_argument(
+        "--scenario", choices=sorted(SCENARIOS), action="append", default=None
+    )
+    args = parser.parse_args(raw_args)
+
+    print(f"{'scenario':<8} {'entries':>10} {'seconds':>9} {'ns/entry':>9}")
+    for scenario in args.scenario or sorted(SCENARIOS):
+        for exp in range(args.min_exponent, args.max_exponent + 1):
+            count, elapsed, bfs = run(scenario, 10**exp)
+            assert bfs, "synthetic stream should be in BFS order"
+            ns = elapsed / count * 1e9
+            print(f"{scenario:<8} {count:>10} {elapsed:>9.3f} {ns:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
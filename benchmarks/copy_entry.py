@@ -0,0 +1,88 @@
+"""Show that FileEntry.copy_entry uses bounded memory, and measure its throughput.
+
+Creates sparse source files from 1 MiB up to `--max-mib` (8 GiB by default)
+and copies each into a fresh ZIP archive in a child process,
+reporting the child's peak RSS and the copy throughput.
+Peak RSS should stay roughly constant as the entry grows.
+`--method read_bytes` shows the previous behaviour for comparison.
+Archives are written (densely) to `--tmp-dir` and removed after each run.
+
+    python benchmarks/copy_entry.py --max-mib 8192
+"""
+
+from argparse import ArgumentParser
+import json
+from pathlib import Path
+import resource
+import subprocess as sp
+import sys
+from tempfile import TemporaryDirectory
+import time
+from zipfile import ZipFile
+
+from ozx_tck.util import FileEntry
+
+METHODS = ("stream", "read_bytes")
+
+
+def copy_read_bytes(entry: FileEntry, zf: ZipFile):
+    b = entry.path.read_bytes()
+    with zf.open(entry.name, "w", force_zip64=True) as f:
+        f.write(b)
+
+
+def child(method: str, src: Path, dst: Path):
+    """Copy `src` into a new archive at `dst`, and print timing and peak RSS."""
+    entry = FileEntry(src, "c/0/0/0")
+    start = time.perf_counter()
+    with ZipFile(dst, "x") as zf:
+        if method == "stream":
+            entry.copy_entry(zf)
+        else:
+            copy_read_bytes(entry, zf)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"seconds": elapsed, "max_rss": rss}))
+
+
+def run(method: str, size: int, tmp_dir: Path) -> dict:
+    with TemporaryDirectory(dir=tmp_dir) as d:
+        src = Path(d) / "src"
+        with src.open("wb") as f:
+            f.truncate(size)
+        dst = Path(d) / "dst.zip"
+        out = sp.run(
+            [sys.executable, __file__, "--child", method, str(src), str(dst)],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return json.loads(out.stdout)
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-mib", type=int, default=8192)
+    parser.add_argument("--method", choices=METHODS, action="append", default=None)
+    parser.add_argument("--tmp-dir", type=Path)
+    parser.add_argument("--child", nargs=3, help="internal use")
+    args = parser.parse_args(raw_args)
+
+    if args.child:
+        method, src, dst = args.child
+        child(method, Path(src), Path(dst))
+        return
+
+    print(f"{'method':<10} {'MiB':>6} {'seconds':>9} {'MiB/s':>9} {'peak RSS MiB':>13}")
+    sizes = [8**exp for exp in range(8) if 8**exp < args.max_mib] + [args.max_mib]
+    for method in args.method or ["stream"]:
+        for mib in sizes:
+            result = run(method, mib * 1024**2, args.tmp_dir)
+            secs = result["seconds"]
+            rss = result["max_rss"] / 1024**2
+            print(f"{method:<10} {mib:>6} {secs:>9.3f} {mib / secs:>9.1f} {rss:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Serve a directory over HTTP with Range request support, as a stand-in for remote storage.
+
+`python -m http.server` ignores Range headers, so cannot be used to try
+`ozx-tck validate` on remote archives.
+Single byte ranges (`bytes=a-b`, `bytes=a-` and `bytes=-n`) get a 206 response;
+anything else gets the whole file.
+Each request is logged to stderr with its range,
+to count the requests validating an archive makes.
+With `--ignore-range`, every request gets the whole file,
+as from a server without Range support.
+
+    python benchmarks/range_server.py out/ --port 8000 &
+    ozx-tck validate http://127.0.0.1:8000/valid/valid.ozx
+"""
+
+from argparse import ArgumentParser
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+from pathlib import Path
+import re
+import shutil
+import sys
+
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ignore_range = False
+    range: tuple[int, int] | None = None
+
+    def send_head(self):
+        self.range = None
+        range_header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if self.ignore_range or range_header is None or not os.path.isfile(path):
+            return super().send_head()
+
+        m = BYTE_RANGE.fullmatch(range_header.strip())
+        if m is None or m.groups() == ("", ""):
+            return super().send_head()
+        size = os.path.getsize(path)
+        first, last = m.groups()
+        if first:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+        else:
+            start = max(size - int(last), 0)
+            end = size
+        if start >= end:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        f = open(path, "rb")
+        f.seek(start)
+        self.range = (start, end)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        if self.range is None:
+            shutil.copyfileobj(source, outputfile)
+            return
+        start, end = self.range
+        remaining = end - start
+        while remaining:
+            buf = source.read(min(remaining, 1024**2))
+            if not buf:
+                break
+            outputfile.write(buf)
+            remaining -= len(buf)
+
+    def log_request(self, code="-", size="-"):
+        rng = self.headers.get("Range", "-")
+        self.log_message('"%s" %s range=%s', self.requestline, code, rng)
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", type=Path, nargs="?", default=Path.cwd())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--ignore-range",
+        action="store_true",
+        help="respond to every request with the whole file",
+    )
+    args = parser.parse_args(raw_args)
+
+    RangeRequestHandler.ignore_range = args.ignore_range
+    handler = partial(RangeRequestHandler, directory=str(args.directory))
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    host, port = server.server_address[:2]
+    print(f"serving {args.directory} on http://{host}:{port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Compare OzxReader with zipfile for opening archives and reading random chunks.
+
+Writes archives of `n` small stored chunks (10^3 up to 10^`--max-exponent`)
+and, in a child process per reader and size, reports the time to open the archive,
+the memory held by the index, and allocated at peak while opening (by tracemalloc),
+and the latency of reading `--reads` randomly chosen chunks,
+one at a time and (for OzxReader) in batches of `--batch`.
+
+    python benchmarks/reader.py --max-exponent 6
+"""
+
+from argparse import ArgumentParser
+import json
+from pathlib import Path
+import random
+import subprocess as sp
+import sys
+from tempfile import TemporaryDirectory
+import time
+import tracemalloc
+from zipfile import ZipFile
+
+from ozx_tck.reader import OzxReader
+from ozx_tck.zipwrite import ZipWriter
+
+READERS = ("zipfile", "ozx")
+CHUNK = bytes(range(256)) * 4
+
+
+def chunk_names(n: int) -> list[str]:
+    width = max(1, round(n**0.5))
+    return [f"0/c/{i // width}/{i % width}" for i in range(n)]
+
+
+def write_archive(path: Path, n: int):
+    with ZipWriter(path) as zw:
+        zw.writestr("zarr.json", b"{}")
+        zw.writestr("0/zarr.json", b"{}")
+        for name in chunk_names(n):
+            zw.writestr(name, CHUNK)
+
+
+def percentile(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+
+def child(reader: str, path: Path, n: int, reads: int, batch: int):
+    """Open `path` with one reader, and print timings as JSON."""
+    rng = random.Random(0)
+    names = chunk_names(n)
+    keys = [rng.choice(names) for _ in range(reads)]
+
+    def open_reader() -> ZipFile | OzxReader:
+        return ZipFile(path) if reader == "zipfile" else OzxReader(path)
+
+    # tracing allocations slows opening, so time and measure separately
+    tracemalloc.start()
+    traced = open_reader()
+    index_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    traced.close()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    r = open_reader()
+    open_seconds = time.perf_counter() - start
+
+    latencies = []
+    for key in keys:
+        t = time.perf_counter()
+        data = r.read(key)
+        latencies.append(time.perf_counter() - t)
+        assert len(data) == len(CHUNK)
+        del data
+
+    d = {
+        "open_seconds": open_seconds,
+        "index_bytes": index_bytes,
+        "peak_bytes": peak_bytes,
+        "read_p50": percentile(latencies, 50),
+        "read_p99": percentile(latencies, 99),
+    }
+    if isinstance(r, OzxReader):
+        t = time.perf_counter()
+        for i in range(0, len(keys), batch):
+            results = r.read_many(keys[i : i + batch])
+            del results
+        d["batched_per_read"] = (time.perf_counter() - t) / len(keys)
+    r.close()
+    print(json.dumps(d))
+
+
+def main(raw_args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-exponent", type=int, default=6)
+    parser.add_argument("--reads", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--tmp-dir", type=Path)
+    parser.add_argument("--child", nargs=5, help="internal use")
+    args = parser.parse_args(raw_args)
+
+    if args.child:
+        reader, path, n, reads, batch = args.child
+        child(reader, Path(path), int(n), int(reads), int(batch))
+        return
+
+    print(
+        f"{'reader':<8} {'entries':>9} {'open s':>8} {'index MiB':>10} {'peak MiB':>9} "
+        f"{'p50 us':>8} {'p99 us':>8} {'batched us':>11}"
+    )
+    for exp in range(3, args.max_exponent + 1):
+        n = 10**exp
+        with TemporaryDirectory(dir=args.tmp_dir) as d:
+            path = Path(d) / "bench.ozx"
+            write_archive(path, n)
+            for reader in READERS:
+                out = sp.run(
+                    [
+                        sys.executable,
+                        __file__,
+                        "--child",
+                        reader,
+                        str(path),
+                        str(n),
+                        str(args.reads),
+                        str(args.batch),
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                r = json.loads(out.stdout)
+                batched = r.get("batched_per_read")
+                batched_s = "" if batched is None else f"{batched * 1e6:.2f}"
+                print(
+                    f"{reader:<8} {n:>9} {r['open_seconds']:>8.3f} "
+                    f"{r['index_bytes'] / 1024**2:>10.1f} "
+                    f"{r['peak_bytes'] / 1024**2:>9.1f} "
+                    f"{r['read_p50'] * 1e6:>8.2f} {r['read_p99'] * 1e6:>8.2f} "
+                    f"{batched_s:>11}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,27 @@
 import logging
 from argparse import ArgumentParser
+import importlib
 
-from .generate import Generate
-from .validate import Validate
 from .executor import Executor
 
 logger = logging.getLogger(__name__)
 
+SUBCOMMANDS = {
+    "generate": "generate:Generate",
+    "validate": "validate:Validate",
+    "pack": "pack:Pack",
+    "fix": "fix:Fix",
+    "synth": "synth:Synth",
+    "bench": "bench:Bench",
+    "serve": "serve:Serve",
+}
+"""Module and class of each subcommand's Executor, imported only when it is run."""
+
+
+def load_executor(name: str) -> type[Executor]:
+    module, cls = SUBCOMMANDS[name].split(":")
+    return getattr(importlib.import_module(f".{module}", __package__), cls)
+
 
 def setup_logging(verbosity: int | None):
     level = {0: logging.ERROR, 1: logging.WARN, 2: logging.INFO, 3: logging.DEBUG}.get(
@@ -35,12 +50,18 @@ def main(raw_args=None):
     inner = ArgumentParser()
     subparsers = inner.add_subparsers()
 
-    Cls: type[Executor]
-    for Cls in [Generate, Validate]:
-        logger.debug("adding executor %s", Cls.__name__)
-        Cls().add_parser(subparsers)
+    # the first positional argument is the subcommand;
+    # others are listed in help, but their modules are not imported
+    requested = next((a for a in remaining if not a.startswith("-")), None)
+    for name in SUBCOMMANDS:
+        if name == requested:
+            logger.debug("adding executor %s", name)
+            load_executor(name)().add_parser(subparsers)
+        else:
+            subparsers.add_parser(name)
 
     args = inner.parse_args(remaining)
+    args.verbose = initial_args.verbose
 
     args.func(args)
 
@@ -0,0 +1,427 @@
+"""Benchmark scenarios for generate and validate, with regression comparison.
+
+Fixtures are synthesised (see `synth`) into a work directory and reused.
+Each scenario runs the CLI in a child process, `--repeat` times,
+so that peak RSS is measured per run;
+per-case and per-archive timings come from the child's `--profile` report.
+"""
+
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from argparse import ArgumentParser, Namespace
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from fnmatch import fnmatch
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import subprocess as sp
+import sys
+import time
+from typing import Any
+import logging
+
+from .executor import Executor
+from .generate.base import CASE_WRITERS
+from .synth import Plan
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+
+DEFAULT_THRESHOLD = 0.1
+"""Relative change in a metric which counts as a regression."""
+
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass(frozen=True)
+class Fixture:
+    """Parameters for a synthetic hierarchy; see `synth.Plan`."""
+
+    shape: tuple[int, ...]
+    chunks: tuple[int, ...]
+    levels: int = 1
+    rows: int = 0
+    columns: int = 0
+    fields: int = 1
+    fill: str = "random"
+
+    def plan(self) -> Plan:
+        return Plan(
+            self.shape,
+            self.chunks,
+            levels=self.levels,
+            rows=self.rows,
+            columns=self.columns,
+            fields=self.fields,
+        )
+
+
+FIXTURES = {
+    # 80 chunks
+    "small": Fixture((1, 512, 512), (1, 64, 64), levels=2),
+    # a 4x6 plate of 2 fields; 3840 chunks of 16 KiB
+    "medium": Fixture(
+        (1, 1024, 1024), (1, 128, 128), levels=2, rows=4, columns=6, fields=2
+    ),
+    # a million-entry central directory of 1-byte chunks
+    "large": Fixture((1, 1024, 1024), (1, 1, 1), fill="zeros"),
+}
+
+DEFAULT_SIZES = ("small", "medium")
+
+STATES = sorted({Cls.STATE for Cls in CASE_WRITERS.values()} - {"perf"})
+
+METRICS: dict[str, tuple[Callable[[dict[str, Any]], float | None], bool]] = {
+    "wall_seconds.p50": (lambda r: r["wall_seconds"]["p50"], False),
+    "max_rss": (lambda r: r["max_rss"], False),
+    "entries_per_second": (lambda r: r["throughput"].get("entries_per_second"), True),
+}
+"""Metrics compared against a baseline; whether higher is better."""
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """Minimum, maximum and `PERCENTILES`, interpolating between closest ranks."""
+    if not values:
+        return dict()
+    s = sorted(values)
+    d = {"min": s[0]}
+    for p in PERCENTILES:
+        pos = (len(s) - 1) * p / 100
+        lo = int(pos)
+        hi = min(lo + 1, len(s) - 1)
+        d[f"p{p}"] = s[lo] + (s[hi] - s[lo]) * (pos - lo)
+    d["max"] = s[-1]
+    return d
+
+
+@dataclass
+class Run:
+    wall_seconds: float
+    max_rss: int
+    """Peak resident set size of the child process, in bytes."""
+
+    report: dict[str, Any]
+    """The child's profile report."""
+
+
+def run_child(args: list[str], report_path: Path, ok_codes=(0,)) -> Run:
+    """Run an ozx-tck subcommand in a child process, measuring its peak RSS."""
+    cmd = [sys.executable, "-m", "ozx_tck", *args, "--profile", str(report_path)]
+    logger.debug("running %s", cmd)
+    start = time.perf_counter()
+    proc = sp.Popen(cmd, stdout=sp.DEVNULL, stderr=sp.PIPE)
+    assert proc.stderr is not None
+    stderr = proc.stderr.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode not in ok_codes or b"Traceback" in stderr:
+        raise RuntimeError(
+            f"{' '.join(cmd)} exited with {proc.returncode}:\n"
+            + stderr.decode(errors="replace")
+        )
+    report = json.loads(report_path.read_text())
+    report_path.unlink()
+    # ru_maxrss is in KiB on Linux
+    return Run(wall, rusage.ru_maxrss * 1024, report)
+
+
+class Scenario(ABC):
+    """A benchmark which runs a subcommand on one fixture."""
+
+    def __init__(self, name: str, size: str) -> None:
+        self.name = name
+        self.size = size
+
+    def prepare(self, work_dir: Path):
+        """Set up before each run; not timed."""
+
+    @abstractmethod
+    def command(self, work_dir: Path) -> list[str]:
+        pass
+
+    ok_codes: tuple[int, ...] = (0,)
+
+    def run(self, work_dir: Path, repeat: int) -> dict[str, Any]:
+        runs = []
+        for _ in range(repeat):
+            self.prepare(work_dir)
+            runs.append(
+                run_child(self.command(work_dir), report_path(work_dir), self.ok_codes)
+            )
+        return summarise(runs)
+
+
+def fixture_root(work_dir: Path, size: str) -> Path:
+    return work_dir / "fixtures" / f"{size}.ome.zarr"
+
+
+def report_path(work_dir: Path) -> Path:
+    return work_dir / "profile.json"
+
+
+def output_root(work_dir: Path, size: str) -> Path:
+    return work_dir / "output" / size
+
+
+def ensure_fixture(work_dir: Path, size: str, jobs: int = 0) -> Path:
+    """Synthesise a fixture, unless an identical one already exists."""
+    root = fixture_root(work_dir, size)
+    # kept beside the root, so that it is not part of the hierarchy
+    marker = root.with_suffix(".json")
+    params = json.dumps(asdict(FIXTURES[size]))
+    if marker.is_file() and marker.read_text() == params:
+        return root
+    if root.exists():
+        shutil.rmtree(root)
+    fixture = FIXTURES[size]
+    plan = fixture.plan()
+    logger.info("synthesising %s fixture of %s chunks", size, plan.n_chunks)
+    root.mkdir(parents=True)
+    plan.write_metadata(root)
+    plan.write_chunks(root, fixture.fill, jobs=jobs)
+    marker.write_text(params)
+    return root
+
+
+class GenerateScenario(Scenario):
+    def prepare(self, work_dir: Path):
+        out = output_root(work_dir, self.size)
+        if out.exists():
+            shutil.rmtree(out)
+
+    def command(self, work_dir: Path) -> list[str]:
+        return [
+            "generate",
+            str(fixture_root(work_dir, self.size)),
+            str(output_root(work_dir, self.size)),
+        ]
+
+
+class ValidateScenario(Scenario):
+    # validation events in the warn and error states set the exit code
+    ok_codes = (0, 1, 2)
+
+    def __init__(self, name: str, size: str, state: str) -> None:
+        super().__init__(name, size)
+        self.state = state
+
+    def prepare(self, work_dir: Path):
+        # generated cases are shared by every validate scenario on a fixture
+        if not (output_root(work_dir, self.size) / self.state).is_dir():
+            generate = GenerateScenario("", self.size)
+            run_child(generate.command(work_dir), report_path(work_dir))
+
+    def command(self, work_dir: Path) -> list[str]:
+        return ["validate", str(output_root(work_dir, self.size) / self.state)]
+
+
+def all_scenarios() -> dict[str, Scenario]:
+    scenarios: dict[str, Scenario] = dict()
+    for size in FIXTURES:
+        name = f"generate/{size}"
+        scenarios[name] = GenerateScenario(name, size)
+        for state in STATES:
+            name = f"validate/{size}/{state}"
+            scenarios[name] = ValidateScenario(name, size, state)
+    return scenarios
+
+
+def summarise(runs: list[Run]) -> dict[str, Any]:
+    """Aggregate the runs of one scenario.
+
+    Latencies are per item in the profile reports (generated case or validated archive).
+    """
+    walls = [r.wall_seconds for r in runs]
+    items = [
+        item["wall_seconds"]
+        for r in runs
+        for item in r.report.get("items", [])
+        if "wall_seconds" in item
+    ]
+    entries = sum(
+        item.get("counts", {}).get("entries", 0)
+        for r in runs
+        for item in r.report.get("items", [])
+    )
+    io = [r.report.get("io", {}) for r in runs]
+    total_wall = sum(walls)
+    throughput = {"entries_per_second": entries / total_wall}
+    if all(io):
+        moved = sum(d["read_bytes"] + d["write_bytes"] for d in io)
+        throughput["bytes_per_second"] = moved / total_wall
+    return {
+        "runs": len(runs),
+        "wall_seconds": percentiles(walls),
+        "item_seconds": percentiles(items),
+        "entries": entries // len(runs),
+        "throughput": throughput,
+        "max_rss": max(r.max_rss for r in runs),
+    }
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], threshold=DEFAULT_THRESHOLD
+) -> list[str]:
+    """Describe every metric which is worse than the baseline by more than `threshold`."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        for metric, (get, higher_is_better) in METRICS.items():
+            old = get(base)
+            new = get(result)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if higher_is_better:
+                change = -change
+            if change > threshold:
+                regressions.append(
+                    f"{name}: {metric} {old:.4g} -> {new:.4g} ({change:+.1%} worse)"
+                )
+    return regressions
+
+
+class Bench(Executor):
+    def populate_parser(self, parser: ArgumentParser):
+        super().populate_parser(parser)
+        parser.description = (
+            "Benchmark generating every case and validating each generated state, "
+            "on synthetic fixtures; optionally compare against a baseline."
+        )
+        parser.add_argument(
+            "-s",
+            "--scenario",
+            action="append",
+            metavar="PATTERN",
+            help=(
+                "glob pattern of scenarios to run, e.g. 'validate/*/valid'; "
+                "may be repeated (default all scenarios for --size)"
+            ),
+        )
+        parser.add_argument(
+            "--size",
+            action="append",
+            choices=list(FIXTURES),
+            help=(
+                "fixture sizes to run; may be repeated. "
+                "'large' has a million entries and takes minutes "
+                f"(default {' '.join(DEFAULT_SIZES)})"
+            ),
+        )
+        parser.add_argument(
+            "--list", action="store_true", help="list scenarios and exit"
+        )
+        parser.add_argument(
+            "-r",
+            "--repeat",
+            type=int,
+            default=3,
+            help="number of runs of each scenario (default 3)",
+        )
+        parser.add_argument(
+            "--work-dir",
+            type=Path,
+            default=Path(".ozx-bench"),
+            help=(
+                "directory for fixtures, which are reused, and generated cases "
+                "(default .ozx-bench)"
+            ),
+        )
+        parser.add_argument(
+            "-o", "--output", type=Path, help="write results as JSON to this path"
+        )
+        parser.add_argument(
+            "--compare",
+            type=Path,
+            metavar="BASELINE",
+            help=(
+                "compare results against a stored JSON baseline, "
+                "exiting with 1 if any metric regressed"
+            ),
+        )
+        parser.add_argument(
+            "--results",
+            type=Path,
+            help="with --compare, compare these stored results instead of running",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help=(
+                "relative change in median wall time, peak RSS or throughput "
+                f"counted as a regression (default {DEFAULT_THRESHOLD})"
+            ),
+        )
+
+    def execute(self, args: Namespace):
+        super().execute(args)
+        scenarios = self.select(args)
+        if args.list:
+            for name in scenarios:
+                print(name)
+            return
+
+        if args.results is not None:
+            results = json.loads(args.results.read_text())
+        else:
+            results = self.run_scenarios(args, scenarios)
+            if args.output is not None:
+                args.output.write_text(json.dumps(results, indent=2) + "\n")
+                logger.info("wrote results to %s", args.output)
+            else:
+                print(json.dumps(results, indent=2))
+
+        if args.compare is None:
+            return
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(baseline, results, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(
+            f"no regressions beyond {args.threshold:.0%} against {args.compare}",
+            file=sys.stderr,
+        )
+
+    def select(self, args: Namespace) -> dict[str, Scenario]:
+        sizes = args.size or DEFAULT_SIZES
+        patterns = args.scenario or ["*"]
+        return {
+            name: s
+            for name, s in all_scenarios().items()
+            if s.size in sizes and any(fnmatch(name, p) for p in patterns)
+        }
+
+    def run_scenarios(
+        self, args: Namespace, scenarios: dict[str, Scenario]
+    ) -> dict[str, Any]:
+        for size in sorted({s.size for s in scenarios.values()}):
+            ensure_fixture(args.work_dir, size)
+
+        results: dict[str, Any] = dict()
+        for name, scenario in scenarios.items():
+            logger.info("running scenario %s", name)
+            results[name] = scenario.run(args.work_dir, args.repeat)
+            logger.info(
+                "%s: median %.3fs, peak RSS %.1f MiB",
+                name,
+                results[name]["wall_seconds"]["p50"],
+                results[name]["max_rss"] / 1024**2,
+            )
+        return {
+            "version": RESULTS_VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.process_cpu_count(),
+            "repeat": args.repeat,
+            "scenarios": results,
+        }
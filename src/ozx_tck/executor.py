@@ -4,6 +4,8 @@ from argparse import ArgumentParser, Namespace
 from typing import Any
 import logging
 
+from .profile import ProfileSession, add_profile_arguments
+
 logger = logging.getLogger(__name__)
 EXECUTORS: dict[str, Executor] = dict()
 
@@ -22,7 +24,24 @@ class Executor(ABC):
             type(self).__name__.lower(), **add_subparser_kwargs
         )
         self.populate_parser(parser)
-        parser.set_defaults(func=self.execute)
+        add_profile_arguments(parser)
+        parser.set_defaults(func=self.run)
+
+    def run(self, args: Namespace):
+        """Execute, writing a profile report afterwards if one was requested.
+
+        While executing, `self.profiling` is the ProfileSession, or None.
+        """
+        self.profiling = ProfileSession.from_args(type(self).__name__.lower(), args)
+        if self.profiling is None:
+            self.execute(args)
+            return
+
+        self.profiling.start()
+        try:
+            self.execute(args)
+        finally:
+            self.profiling.finish()
 
     @abstractmethod
     def execute(self, args: Namespace):
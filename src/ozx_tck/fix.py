@@ -0,0 +1,257 @@
+"""Fix the central directory order and comment of an archive, in place.
+
+Entry data and local headers are left untouched:
+only the central directory records are reordered
+(metadata first, in breadth-first order, then everything else in its existing order),
+and the end of central directory records and comment are rewritten.
+The cost is proportional to the size of the central directory, not the archive.
+
+Before the tail of the archive is overwritten,
+the original is saved to a journal beside it and synced to disk.
+If fixing is interrupted, the next run restores the original tail from the journal
+before trying again, so the archive is never left half-written.
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser, Namespace
+from dataclasses import dataclass, replace
+import io
+import json
+import os
+from pathlib import Path
+import struct
+import sys
+from typing import BinaryIO
+from zipfile import BadZipFile
+import zlib
+import logging
+
+from .executor import Executor
+from .util import is_metadata, make_zip_comment
+from .validate.layout import bfs_key
+from .zipread import (
+    CENTRAL_DIR,
+    file_size,
+    iter_central_directory,
+    pread,
+    read_entry,
+    read_eocd,
+)
+from .zipwrite import end_records
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".fix-journal"
+
+JOURNAL_MAGIC = b"OZXFIX\x00\x01"
+JOURNAL_HEADER = struct.Struct("<8sQQL")
+"""Magic, original archive size, offset of the saved tail, and its CRC-32."""
+
+
+def journal_path(path: Path) -> Path:
+    return path.with_name(path.name + JOURNAL_SUFFIX)
+
+
+def fsync_dir(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def recover(path: Path) -> bool:
+    """Restore an archive's original tail from its journal, if one exists.
+
+    Returns whether the archive was restored.
+    A journal which is incomplete was being written when fixing stopped,
+    before the archive was changed, so it is discarded.
+    """
+    journal = journal_path(path)
+    if not journal.is_file():
+        return False
+    b = journal.read_bytes()
+    restored = False
+    if len(b) >= JOURNAL_HEADER.size:
+        magic, size, offset, crc = JOURNAL_HEADER.unpack_from(b)
+        tail = b[JOURNAL_HEADER.size :]
+        if (
+            magic == JOURNAL_MAGIC
+            and offset + len(tail) == size
+            and zlib.crc32(tail) == crc
+        ):
+            logger.warning("restoring %s from interrupted fix", path)
+            with path.open("r+b") as f:
+                os.pwrite(f.fileno(), tail, offset)
+                f.truncate(size)
+                os.fsync(f.fileno())
+            restored = True
+    if not restored:
+        logger.warning("discarding incomplete journal %s", journal)
+    journal.unlink()
+    fsync_dir(journal.parent)
+    return restored
+
+
+def split_records(cd: bytes, total: int) -> list[bytes]:
+    """Raw bytes of each record in a central directory."""
+    records = []
+    pos = 0
+    for _ in range(total):
+        # name, extra and comment lengths
+        lengths = struct.unpack_from("<3H", cd, pos + CENTRAL_DIR.size - 18)
+        end = pos + CENTRAL_DIR.size + sum(lengths)
+        records.append(cd[pos:end])
+        pos = end
+    return records
+
+
+def comment_version(comment: bytes) -> str | None:
+    try:
+        d = json.loads(comment)
+    except ValueError:
+        return None
+    ome = d.get("ome") if isinstance(d, dict) else None
+    version = ome.get("version") if isinstance(ome, dict) else None
+    return version if isinstance(version, str) else None
+
+
+@dataclass
+class TailFix:
+    """The tail of an archive, from its central directory to the end."""
+
+    offset: int
+    old: bytes
+    new: bytes
+    reordered: int
+    """Number of central directory records which moved."""
+
+    @property
+    def needed(self) -> bool:
+        return self.old != self.new
+
+
+def plan_fix(f: BinaryIO, version: str | None = None) -> TailFix:
+    """Work out the new tail of an archive, without changing it.
+
+    The OME-Zarr version in the comment is, in order of preference,
+    `version`, the version in the existing comment, or that in the root zarr.json.
+    Raises BadZipFile if the archive cannot be fixed in place.
+    """
+    eocd = read_eocd(f)
+    if eocd.multipart:
+        raise BadZipFile("multi-part archives cannot be fixed in place")
+    cd = pread(f, eocd.cd_start, eocd.cd_size)
+    if len(cd) != eocd.cd_size:
+        raise BadZipFile("truncated central directory")
+    entries = list(
+        iter_central_directory(
+            io.BytesIO(cd),  # type: ignore[arg-type]
+            replace(eocd, cd_offset=0, concat=0),
+        )
+    )
+    records = split_records(cd, len(entries))
+
+    order = sorted(
+        (i for i, e in enumerate(entries) if is_metadata(e.filename)),
+        key=lambda i: bfs_key(entries[i].filename),
+    )
+    order += [i for i, e in enumerate(entries) if not is_metadata(e.filename)]
+    reordered = sum(i != j for i, j in enumerate(order))
+
+    if version is None:
+        version = comment_version(eocd.comment)
+    if version is None:
+        root = next((e for e in entries if e.filename == "zarr.json"), None)
+        if root is None:
+            raise BadZipFile("no root zarr.json to take the OME-Zarr version from")
+        try:
+            meta = json.loads(read_entry(f, root, eocd.concat))
+            version = meta["attributes"]["ome"]["version"]
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError("root zarr.json has no OME-Zarr version") from e
+
+    new_cd = b"".join(records[i] for i in order)
+    new = new_cd + end_records(
+        eocd.cd_offset + len(new_cd),
+        len(entries),
+        len(new_cd),
+        eocd.cd_offset,
+        make_zip_comment(version),
+    )
+    old = pread(f, eocd.cd_start, file_size(f) - eocd.cd_start)
+    return TailFix(eocd.cd_start, old, new, reordered)
+
+
+def apply_fix(path: Path, f: BinaryIO, fix: TailFix):
+    """Overwrite the tail of an archive, journalling the original first."""
+    journal = journal_path(path)
+    header = JOURNAL_HEADER.pack(
+        JOURNAL_MAGIC, fix.offset + len(fix.old), fix.offset, zlib.crc32(fix.old)
+    )
+    with journal.open("xb") as j:
+        j.write(header)
+        j.write(fix.old)
+        j.flush()
+        os.fsync(j.fileno())
+    fsync_dir(journal.parent)
+
+    fd = f.fileno()
+    os.pwrite(fd, fix.new, fix.offset)
+    os.ftruncate(fd, fix.offset + len(fix.new))
+    os.fsync(fd)
+
+    journal.unlink()
+    fsync_dir(journal.parent)
+
+
+class Fix(Executor):
+    def populate_parser(self, parser: ArgumentParser):
+        super().populate_parser(parser)
+        parser.description = (
+            "Rewrite archives' central directories in place, "
+            "in JSON-first, breadth-first order, with a fresh JSON comment; "
+            "entry data is not rewritten."
+        )
+        parser.add_argument("archives", nargs="+", type=Path, help="archives to fix")
+        parser.add_argument(
+            "--ome-version",
+            help=(
+                "OME-Zarr version for the comment "
+                "(default from the existing comment, or the root zarr.json)"
+            ),
+        )
+        parser.add_argument(
+            "-n",
+            "--dry-run",
+            action="store_true",
+            help="report what would change, but do not write anything",
+        )
+
+    def execute(self, args: Namespace):
+        super().execute(args)
+        failed = False
+        for path in args.archives:
+            try:
+                self.fix(path, args.ome_version, args.dry_run)
+            except (BadZipFile, OSError, ValueError) as e:
+                print(f"{path}: cannot fix: {e}", file=sys.stderr)
+                failed = True
+        if failed:
+            sys.exit(1)
+
+    def fix(self, path: Path, version: str | None, dry_run: bool):
+        if not dry_run and recover(path):
+            print(f"{path}: restored after an interrupted fix")
+        with path.open("rb" if dry_run else "r+b") as f:
+            fix = plan_fix(f, version)
+            if not fix.needed:
+                print(f"{path}: already fixed")
+                return
+            action = "would rewrite" if dry_run else "rewrote"
+            print(
+                f"{path}: {action} {len(fix.new)} bytes of central directory "
+                f"and comment ({fix.reordered} records moved)"
+            )
+            if not dry_run:
+                apply_fix(path, f, fix)
@@ -1,4 +1,4 @@
-from . import valid, invalid, warning
+from . import valid, invalid, warning, perf, zip64
 from .main import Generate
 
-__all__ = ["valid", "invalid", "warning", "Generate"]
+__all__ = ["valid", "invalid", "warning", "perf", "zip64", "Generate"]
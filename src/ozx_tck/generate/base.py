@@ -3,18 +3,36 @@ from pathlib import Path
 from abc import ABC, abstractmethod
 import logging
 
-from ..util import is_array, ome_zarr_version, State
+from ..profile import NullProfile, Profile
+from ..util import CaseState, is_array, ome_zarr_version
+from ..zipwrite import ZipWriter
+from .staging import StagedEntry, Staging
 
 logger = logging.getLogger(__name__)
 CASE_WRITERS: dict[str, type[CaseWriter]] = dict()
 
 
 class CaseWriter(ABC):
-    STATE: State
+    STATE: CaseState
 
-    def __init__(self, zip_dir: Path, zarr_root: Path) -> None:
+    OPT_IN: str | None = None
+    """`generate` flag without which this case is skipped, if any."""
+
+    READS_SOURCE = True
+    """Whether the output depends on the zarr root."""
+
+    def __init__(
+        self,
+        zip_dir: Path,
+        zarr_root: Path,
+        profile: Profile | None = None,
+        staging: Staging | None = None,
+    ) -> None:
+        """`staging` can be shared between writers for the same zarr root."""
         self.zip_dir = zip_dir
         self.zarr_root = zarr_root
+        self.profile = NullProfile() if profile is None else profile
+        self.staging = Staging(zarr_root) if staging is None else staging
 
     @classmethod
     def slug(cls) -> str:
@@ -33,13 +51,33 @@ class CaseWriter(ABC):
     def is_array(self) -> bool:
         return is_array(self.zarr_root / "zarr.json")
 
+    def outputs(self) -> list[Path]:
+        """Files written by the case."""
+        return [self.zip_path]
+
+    def clean(self):
+        """Remove the output of a previous run, so that the case can be written again."""
+        self.zip_path.unlink(missing_ok=True)
+
     def prepare(self):
         assert not self.zip_path.exists(), "target zip already exists"
         self.zip_path.parent.mkdir(exist_ok=True, parents=True)
 
+    def entries(self) -> list[StagedEntry]:
+        """Files below the zarr root, metadata first, in breadth-first order."""
+        with self.profile.phase("staging"):
+            return self.staging.entries
+
+    def copy_entry(self, entry: StagedEntry, zw: ZipWriter, force_zip64=True):
+        with self.profile.phase("copy_entry"):
+            entry.copy_entry(zw, force_zip64)
+        self.profile.count("entries")
+
     def write(self):
-        self.prepare()
-        self._write()
+        with self.profile.phase("prepare"):
+            self.prepare()
+        with self.profile.phase("write"):
+            self._write()
 
     @abstractmethod
     def _write(self):
@@ -1,12 +1,13 @@
+from dataclasses import replace
 import json
 from math import ceil
 from random import Random
-import subprocess as sp
-from zipfile import ZipFile
-import shlex
 from pathlib import Path
+import shutil
 from tempfile import TemporaryDirectory
-from ..util import walk_files_sorted, make_zip_comment
+from ..util import make_zip_comment
+from ..zipread import read_split_layout
+from ..zipwrite import MIN_SEGMENT_SIZE, SplitZipWriter, ZipWriter
 from .base import CaseWriter
 
 
@@ -17,10 +18,10 @@ class ErrorWriter(CaseWriter):
 class RootNotZarr(ErrorWriter):
     def _write(self):
         v = self.ome_zarr_version()
-        with ZipFile(self.zip_path, "x") as z:
-            for entry in walk_files_sorted(self.zarr_root):
-                entry.name = "somedirectory/" + entry.name
-                entry.copy_entry(z)
+        with ZipWriter(self.zip_path) as z:
+            for entry in self.entries():
+                entry = replace(entry, name="somedirectory/" + entry.name)
+                self.copy_entry(entry, z)
 
             z.comment = make_zip_comment(v)
 
@@ -33,24 +34,23 @@ class OzxInOzx(ErrorWriter):
         v = self.ome_zarr_version()
         with TemporaryDirectory(prefix="ozx-tck_ozx-in-ozx") as dname:
             tmpz = Path(dname) / "inner.ozx"
-            with ZipFile(tmpz, "w") as z:
-                with z.open("zarr.json", "w", force_zip64=True) as f:
-                    f.write(
-                        json.dumps(
-                            {
-                                "node_type": "group",
-                                "zarr_version": 3,
-                                "attributes": {"ome": {"version": v}},
-                            }
-                        ).encode()
-                    )
+            with ZipWriter(tmpz, "w") as z:
+                z.writestr(
+                    "zarr.json",
+                    json.dumps(
+                        {
+                            "node_type": "group",
+                            "zarr_version": 3,
+                            "attributes": {"ome": {"version": v}},
+                        }
+                    ).encode(),
+                )
                 z.comment = make_zip_comment(v)
 
-            with ZipFile(self.zip_path, "x") as z:
-                for entry in walk_files_sorted(self.zarr_root):
-                    entry.copy_entry(z)
-                with z.open("inner.ozx", "w", force_zip64=True) as f:
-                    f.write(tmpz.read_bytes())
+            with ZipWriter(self.zip_path) as z:
+                for entry in self.entries():
+                    self.copy_entry(entry, z)
+                z.write("inner.ozx", tmpz)
 
                 z.comment = make_zip_comment(v)
 
@@ -59,28 +59,38 @@ OzxInOzx.register()
 
 
 class Multipart(ErrorWriter):
+    SEGMENT_SIZE: int | None = None
+    """Size of each segment; by default, a third of the data (at least 64 KiB)."""
+
+    def container(self) -> Path:
+        """Directory holding the segments, in place of the archive."""
+        return self.zip_path.with_suffix("")
+
+    def outputs(self) -> list[Path]:
+        return sorted(self.container().iterdir())
+
+    def clean(self):
+        if self.container().is_dir():
+            shutil.rmtree(self.container())
+
     def _write(self):
         v = self.ome_zarr_version()
-        with ZipFile(self.zip_path, "x") as z:
-            for entry in walk_files_sorted(self.zarr_root):
-                entry.copy_entry(z)
-
-            z.comment = make_zip_comment(v)
+        entries = self.entries()
+        segment_size = self.SEGMENT_SIZE
+        if segment_size is None:
+            segment_size = max(MIN_SEGMENT_SIZE, ceil(sum(e.size for e in entries) / 3))
 
-        size = self.zip_path.stat().st_size
-        maxsize = ceil(size / 3)
-        container = self.zip_path.with_suffix("")
+        container = self.container()
         container.mkdir()
         root = container / (self.zip_path.stem + ".zip")
-        sp.run(
-            shlex.split(f"zip {self.zip_path} --out {root} -s {maxsize}"),
-            check=True,
-            capture_output=True,
-        )
-        try:
-            self.zip_path.unlink()
-        except FileNotFoundError:
-            pass
+        with SplitZipWriter(root, segment_size) as z:
+            for entry in entries:
+                self.copy_entry(entry, z)
+
+            z.comment = make_zip_comment(v)
+
+        layout = read_split_layout(root)
+        assert len(layout.segments) > 1, "data too small to split into segments"
 
 
 Multipart.register()
@@ -91,11 +101,11 @@ class MisleadingSort(ErrorWriter):
         v = self.ome_zarr_version()
         rng = Random(1991)
 
-        entries = list(walk_files_sorted(self.zarr_root))
+        entries = list(self.entries())
         rng.shuffle(entries)
-        with ZipFile(self.zip_path, "x") as z:
+        with ZipWriter(self.zip_path) as z:
             for entry in entries:
-                entry.copy_entry(z)
+                self.copy_entry(entry, z)
 
             # metadata is incorrect
             z.comment = make_zip_comment(v, True)
@@ -1,12 +1,56 @@
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import Future, ProcessPoolExecutor
+import os
 from pathlib import Path
+import sys
+import traceback
+from typing import Any
 import logging
 
 from ..executor import Executor
+from ..profile import NullProfile, Profile
 from .base import CASE_WRITERS
+from .manifest import MANIFEST_NAME, Manifest, case_inputs, source_fingerprint
+from .staging import DEFAULT_CACHE_BYTES, Staging
 
 logger = logging.getLogger(__name__)
 
+type CaseResult = tuple[str | None, dict[str, Any] | None]
+"""Traceback if the case failed, and profile report if requested."""
+
+_worker_staging: Staging | None = None
+
+
+def _init_worker(staging: Staging):
+    """Receive the staged entries once per worker process, rather than per case.
+
+    They are sent without their cached contents (see `Staging`).
+    """
+    global _worker_staging
+    _worker_staging = staging
+
+
+def write_case(
+    slug: str,
+    zip_dir: Path,
+    zarr_root: Path,
+    staging: Staging | None = None,
+    profile=False,
+) -> CaseResult:
+    """Write a single case; suitable for running in a worker process.
+
+    Exceptions are caught and returned as a formatted traceback,
+    so that other cases can continue.
+    """
+    if staging is None:
+        staging = _worker_staging
+    prof = Profile(slug) if profile else None
+    try:
+        CASE_WRITERS[slug](zip_dir, zarr_root, prof, staging).write()
+    except Exception:
+        return traceback.format_exc(), None
+    return None, None if prof is None else prof.report()
+
 
 class Generate(Executor):
     def populate_parser(self, parser: ArgumentParser):
@@ -21,17 +65,153 @@ class Generate(Executor):
             "output_root",
             type=Path,
             help=(
-                "path to an empty target directory; "
+                "path to a target directory; "
                 "will populate with `valid`, `warn`, and `error` directories, "
-                "each of which contains the relevant examples"
+                "each of which contains the relevant examples, "
+                f"and a `{MANIFEST_NAME}` recording what produced them. "
+                "Cases whose source, writer code and output are unchanged "
+                "since the last run are not regenerated"
+            ),
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help=(
+                "number of cases to generate in parallel, in separate processes; "
+                "0 means one per CPU (default 1). "
+                "Output is identical to a serial run"
+            ),
+        )
+        parser.add_argument(
+            "--perf",
+            action="store_true",
+            help=(
+                "also generate `perf` cases: valid archives shaped to stress readers "
+                "(e.g. a million entries, 5 GiB of sparse data), "
+                "each with a JSON manifest of expected costs"
+            ),
+        )
+        parser.add_argument(
+            "--zip64",
+            action="store_true",
+            help=(
+                "also generate `valid` cases at the ZIP64 limits: "
+                "an entry over 4 GiB, over 65535 entries, and offsets over 4 GiB. "
+                "Entries are zeros and the archives sparse, "
+                "so they take little time or disk space"
+            ),
+        )
+        parser.add_argument(
+            "-f",
+            "--force",
+            action="store_true",
+            help="regenerate every case, even if it is up to date",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help=(
+                "record hashes of outputs, and only skip cases whose outputs "
+                "match them; slower, as every output is read. "
+                "Without this, outputs are only compared by size and modification "
+                "time, so one rewritten in place with the same size, "
+                "or copied with its modification time, counts as up to date"
+            ),
+        )
+        parser.add_argument(
+            "--walk-threads",
+            type=int,
+            default=1,
+            help=(
+                "number of directories to list concurrently "
+                "while walking the zarr root; "
+                "higher values help on high-latency (e.g. network) storage "
+                "(default 1)"
             ),
         )
 
     def execute(self, args: Namespace):
         super().execute(args)
+        # workers are not sent cached contents, so only cache them for serial runs
+        cache_bytes = DEFAULT_CACHE_BYTES if args.jobs == 1 else 0
+        staging = Staging(args.zarr_root, cache_bytes, args.walk_threads)
+        total = NullProfile() if self.profiling is None else self.profiling.total
+        with total.phase("fingerprint"):
+            source = source_fingerprint(staging.files)
+        args.output_root.mkdir(exist_ok=True, parents=True)
+        manifest = Manifest.load(args.output_root, args.verify)
+
+        slugs = []
+        inputs: dict[str, dict[str, Any]] = dict()
         for slug, Cls in CASE_WRITERS.items():
-            logger.info("generating case %s", slug)
+            if Cls.OPT_IN is not None and not getattr(args, Cls.OPT_IN):
+                continue
+            inputs[slug] = case_inputs(Cls, source if Cls.READS_SOURCE else None)
+            if not args.force and manifest.is_current(slug, inputs[slug]):
+                logger.info("case %s is up to date", slug)
+                continue
             d: Path = args.output_root / Cls.STATE
             d.mkdir(exist_ok=True, parents=True)
-            inst = Cls(d, args.zarr_root)
-            inst.write()
+            Cls(d, args.zarr_root, staging=staging).clean()
+            slugs.append((slug, d))
+        logger.info(
+            "generating %s cases; %s up to date", len(slugs), len(inputs) - len(slugs)
+        )
+
+        if any(CASE_WRITERS[slug].READS_SOURCE for slug, _ in slugs):
+            # read the source once, for all cases; it was walked for the fingerprint
+            with total.phase("staging"):
+                total.count("entries", len(staging.entries))
+
+        failed = []
+        for slug, (tb, report) in self.iter_results(args, slugs, staging):
+            Cls = CASE_WRITERS[slug]
+            writer = Cls(args.output_root / Cls.STATE, args.zarr_root, staging=staging)
+            if tb is None:
+                try:
+                    with total.phase("manifest"):
+                        manifest.record(slug, inputs[slug], writer.outputs())
+                except OSError:
+                    tb = traceback.format_exc()
+            if tb is not None:
+                logger.error("failed to generate case %s:\n%s", slug, tb)
+                failed.append(slug)
+                manifest.forget(slug)
+            if self.profiling is not None and report is not None:
+                self.profiling.add(report)
+        manifest.save()
+
+        if failed:
+            print(f"failed to generate cases: {', '.join(failed)}", file=sys.stderr)
+            sys.exit(1)
+
+    def iter_results(
+        self, args: Namespace, slugs: list[tuple[str, Path]], staging: Staging
+    ):
+        """Write every case, yielding results in registration order."""
+        profile = self.profiling is not None
+        jobs: int = args.jobs or os.process_cpu_count() or 1
+        if jobs == 1 or len(slugs) <= 1:
+            for slug, d in slugs:
+                logger.info("generating case %s", slug)
+                yield slug, write_case(slug, d, args.zarr_root, staging, profile)
+            return
+
+        with ProcessPoolExecutor(
+            min(jobs, len(slugs)), initializer=_init_worker, initargs=(staging,)
+        ) as pool:
+            futures: list[tuple[str, Future[CaseResult]]] = []
+            for slug, d in slugs:
+                logger.info("generating case %s", slug)
+                futures.append(
+                    (
+                        slug,
+                        pool.submit(
+                            write_case, slug, d, args.zarr_root, profile=profile
+                        ),
+                    )
+                )
+            for slug, fut in futures:
+                yield slug, fut.result()
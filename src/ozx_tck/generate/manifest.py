@@ -0,0 +1,175 @@
+"""Record of what produced each generated case, so unchanged cases can be skipped.
+
+The manifest records, for each case, its inputs:
+the tool version, a hash of the writer's code,
+and a fingerprint of the source tree (for cases which read it);
+and its outputs, with their sizes and modification times.
+A case is up to date if its inputs are unchanged
+and its outputs have the recorded sizes and modification times,
+so an output rewritten in place with the same size,
+or copied with its modification time preserved, is not noticed.
+With `verify`, outputs are also hashed when recorded,
+and a case is only up to date if its outputs' hashes match;
+this is not the default, as reading multi-GB archives
+costs as much as writing them again.
+"""
+
+from __future__ import annotations
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+from pathlib import Path
+import sys
+from types import ModuleType
+from typing import Any
+import logging
+
+from ..util import FileEntry, tool_version
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+PACKAGE = __name__.split(".")[0]
+
+
+def source_fingerprint(files: Iterable[FileEntry]) -> str:
+    """Hash of the names, sizes and modification times of the files of a zarr root.
+
+    `files` are those walked for staging (see `Staging.files`);
+    they are not read, so this is much cheaper than staging.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for entry in files:
+        st = os.stat(entry.path)
+        h.update(f"{entry.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def code_fingerprint(cls: type) -> str:
+    """Hash of the source of the modules a class's behaviour depends on.
+
+    These are the package's modules which define the class and its bases,
+    and, transitively, those whose modules, classes or functions they refer to.
+    """
+    names: set[str] = set()
+    stack = [c.__module__ for c in cls.__mro__]
+    while stack:
+        name = stack.pop()
+        if name in names or not name.startswith(PACKAGE + "."):
+            continue
+        names.add(name)
+        for value in vars(sys.modules[name]).values():
+            ref = (
+                value.__name__
+                if isinstance(value, ModuleType)
+                else getattr(value, "__module__", None)
+            )
+            if isinstance(ref, str) and ref not in names:
+                stack.append(ref)
+
+    h = hashlib.blake2b(digest_size=20)
+    for name in sorted(names):
+        path = sys.modules[name].__file__
+        if path is None:
+            continue
+        h.update(name.encode() + b"\0")
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    with path.open("rb") as f:
+        return hashlib.file_digest(
+            f, lambda: hashlib.blake2b(digest_size=20)
+        ).hexdigest()
+
+
+def describe_output(path: Path, verify=False) -> dict[str, Any]:
+    st = path.stat()
+    d: dict[str, Any] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if verify:
+        d["blake2b"] = file_digest(path)
+    return d
+
+
+def case_inputs(cls: type, source: str | None) -> dict[str, Any]:
+    """What a case's output depends on; `source` is None if it does not read one."""
+    return {
+        "tool_version": tool_version(),
+        "code": code_fingerprint(cls),
+        "source": source,
+    }
+
+
+@dataclass
+class Manifest:
+    """The manifest of an output root, keyed by case slug.
+
+    With `verify`, outputs' hashes are recorded and checked.
+    """
+
+    output_root: Path
+    verify: bool = False
+    cases: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def path(self) -> Path:
+        return self.output_root / MANIFEST_NAME
+
+    @classmethod
+    def load(cls, output_root: Path, verify=False) -> Manifest:
+        """The existing manifest, or an empty one if it is missing or unreadable."""
+        manifest = cls(output_root, verify)
+        try:
+            d = json.loads(manifest.path.read_text())
+        except FileNotFoundError:
+            return manifest
+        except ValueError as e:
+            logger.warning("ignoring unreadable manifest %s: %s", manifest.path, e)
+            return manifest
+        if d.get("manifest_version") != MANIFEST_VERSION:
+            logger.info("ignoring manifest of a different version")
+            return manifest
+        manifest.cases = d["cases"]
+        return manifest
+
+    def is_current(self, slug: str, inputs: dict[str, Any]) -> bool:
+        """Whether a case was generated from these inputs, and is unchanged since."""
+        record = self.cases.get(slug)
+        if record is None or record["inputs"] != inputs:
+            return False
+        for rel, expected in record["outputs"].items():
+            path = self.output_root / rel
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                return False
+            if (st.st_size, st.st_mtime_ns) != (expected["size"], expected["mtime_ns"]):
+                return False
+            if self.verify and expected.get("blake2b") != file_digest(path):
+                return False
+        return True
+
+    def record(self, slug: str, inputs: dict[str, Any], outputs: list[Path]):
+        described = {
+            p.relative_to(self.output_root).as_posix(): describe_output(p, self.verify)
+            for p in outputs
+        }
+        self.cases[slug] = {"inputs": inputs, "outputs": described}
+
+    def forget(self, slug: str):
+        self.cases.pop(slug, None)
+
+    def save(self):
+        d = {
+            "manifest_version": MANIFEST_VERSION,
+            "tool_version": tool_version(),
+            "cases": dict(sorted(self.cases.items())),
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(d, indent=2) + "\n")
+        tmp.replace(self.path)
@@ -0,0 +1,256 @@
+"""Valid archives shaped to stress readers, rather than to test correctness.
+
+Entries are synthesised in memory (see `synth`), not copied from the zarr root,
+so cases can be far larger than the source hierarchy.
+Each case is written with a `<slug>.json` manifest beside it,
+describing what a reader must do to open, list and look up entries in it.
+"""
+
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+import json
+from math import ceil, log2
+from pathlib import Path
+from typing import Any
+import logging
+
+from ..synth import ArraySpec, OME_VERSION, group_metadata, multiscales
+from ..util import is_metadata, make_zip_comment
+from ..validate.layout import bfs_key
+from ..zipread import (
+    EOCD,
+    MAX_COMMENT,
+    ZIP64_EOCD,
+    ZIP64_LOCATOR,
+    file_size,
+    iter_central_directory,
+    read_eocd,
+)
+from ..zipwrite import ZipWriter
+from .base import CaseWriter
+
+logger = logging.getLogger(__name__)
+
+MAX_NAME = 0xFFFF
+"""Longest name a ZIP record can hold, in bytes."""
+
+
+def image_entries(
+    prefix: str, array: ArraySpec, chunk: bytes | None = b"\x00"
+) -> Iterator[tuple[str, bytes]]:
+    """Metadata of a single-scale image with one array at `<prefix>0`, then its chunks.
+
+    With `chunk`, every chunk of the array has that content.
+    """
+    path = prefix + "0"
+    docs = [
+        (prefix + "zarr.json", group_metadata(multiscales("image", 1))),
+        (path + "/zarr.json", array.metadata()),
+    ]
+    for name, doc in docs:
+        yield name, json.dumps(doc).encode()
+    if chunk is not None:
+        for key in array.chunk_keys():
+            yield chunk_name(path, key), chunk
+
+
+def chunk_name(array_path: str, key: tuple[int, ...]) -> str:
+    return f"{array_path}/c/{'/'.join(map(str, key))}"
+
+
+def perf_manifest(path: Path) -> dict[str, Any]:
+    """Describe the work a reader must do to open, list and look up entries."""
+    n = 0
+    max_name = 0
+    max_depth = 0
+    metadata_offsets = []
+    with path.open("rb") as f:
+        size = file_size(f)
+        eocd = read_eocd(f)
+        for entry in iter_central_directory(f, eocd):
+            n += 1
+            max_name = max(max_name, len(entry.filename.encode()))
+            max_depth = max(max_depth, entry.filename.count("/"))
+            if is_metadata(entry.filename):
+                metadata_offsets.append(entry.header_offset)
+
+    end_records = size - eocd.offset
+    if eocd.zip64:
+        end_records += ZIP64_EOCD.size + ZIP64_LOCATOR.size
+    return {
+        "archive_bytes": size,
+        "entries": n,
+        "max_name_bytes": max_name,
+        "max_depth": max_depth,
+        "comment_bytes": len(eocd.comment),
+        "zip64_eocd": eocd.zip64,
+        "central_directory_offset": eocd.cd_offset,
+        "central_directory_bytes": eocd.cd_size,
+        "first_metadata_offset": min(metadata_offsets, default=None),
+        "expected_costs": {
+            "open": {
+                "description": (
+                    "find the end records by scanning back from the end of the file"
+                ),
+                "max_scan_bytes": min(size, EOCD.size + MAX_COMMENT),
+                "end_record_bytes": end_records,
+                "reads": 2 if eocd.zip64 else 1,
+            },
+            "list": {
+                "description": "read every central directory record",
+                "bytes": eocd.cd_size,
+                "records": n,
+            },
+            "lookup": {
+                "description": "find one name in a sorted index of the entries",
+                "comparisons": ceil(log2(n)) if n > 1 else n,
+                "max_key_bytes": max_name,
+            },
+            "read_metadata": {
+                "description": (
+                    "bytes before the first metadata entry, "
+                    "which a reader streaming from the start must skip"
+                ),
+                "offset": min(metadata_offsets, default=None),
+            },
+        },
+    }
+
+
+class PerfWriter(CaseWriter):
+    STATE = "perf"
+    OPT_IN = "perf"
+    READS_SOURCE = False
+
+    FORCE_ZIP64_END = False
+
+    def manifest_path(self) -> Path:
+        return self.zip_path.with_suffix(".json")
+
+    def outputs(self) -> list[Path]:
+        return [self.zip_path, self.manifest_path()]
+
+    def clean(self):
+        super().clean()
+        self.manifest_path().unlink(missing_ok=True)
+
+    def write(self):
+        super().write()
+        with self.profile.phase("manifest"):
+            manifest = {"case": self.slug(), "description": type(self).__doc__}
+            manifest |= perf_manifest(self.zip_path)
+            self.manifest_path().write_text(json.dumps(manifest, indent=2) + "\n")
+
+    def comment(self) -> bytes:
+        return make_zip_comment(OME_VERSION)
+
+    def _write(self):
+        with ZipWriter(self.zip_path, force_zip64_end=self.FORCE_ZIP64_END) as zw:
+            for name, data in self.perf_entries():
+                zw.writestr(name, data)
+                self.profile.count("entries")
+            zw.comment = self.comment()
+
+    def perf_entries(self) -> Iterable[tuple[str, bytes]]:
+        """Names and contents of the entries, in order."""
+        return image_entries("", ArraySpec("0", (1, 1, 1), (1, 1, 1), "uint8"))
+
+
+class MillionEntries(PerfWriter):
+    """A central directory with a million 1-byte chunks."""
+
+    SHAPE = (1, 1000, 1000)
+
+    def perf_entries(self):
+        return image_entries("", ArraySpec("0", self.SHAPE, (1, 1, 1), "uint8"))
+
+
+MillionEntries.register()
+
+
+class DeepNesting(PerfWriter):
+    """An image below 256 levels of nested groups."""
+
+    DEPTH = 256
+
+    def perf_entries(self):
+        prefix = ""
+        for depth in range(self.DEPTH):
+            yield prefix + "zarr.json", json.dumps(group_metadata()).encode()
+            prefix += f"g{depth}/"
+        array = ArraySpec(prefix + "0", (1, 2, 2), (1, 1, 1), "uint8")
+        yield from image_entries(prefix, array)
+
+
+DeepNesting.register()
+
+
+class LongNames(PerfWriter):
+    """An image whose name makes its array's metadata name as long as ZIP allows."""
+
+    def perf_entries(self):
+        longest = "/0/zarr.json"
+        prefix = "i" * (MAX_NAME - len(longest)) + "/"
+        array = ArraySpec(prefix + "0", (1, 1, 1), (1, 1, 1), "uint8")
+        yield "zarr.json", json.dumps(group_metadata()).encode()
+        yield from image_entries(prefix, array)
+
+
+LongNames.register()
+
+
+class LongComment(PerfWriter):
+    """A JSON comment padded to the maximum length, which readers must scan past."""
+
+    def comment(self) -> bytes:
+        d = json.loads(super().comment())
+        d["padding"] = ""
+        d["padding"] = " " * (MAX_COMMENT - len(json.dumps(d).encode()))
+        return json.dumps(d).encode()
+
+
+LongComment.register()
+
+
+class Zip64Small(PerfWriter):
+    """A small archive with ZIP64 end of central directory records it does not need."""
+
+    FORCE_ZIP64_END = True
+
+
+Zip64Small.register()
+
+
+class MetadataAfterData(PerfWriter):
+    """Metadata entries stored after 5 GiB of chunk data, at offsets which need ZIP64.
+
+    The central directory still lists metadata first,
+    so readers which load metadata up front must seek to the end of the archive,
+    and those which stream from the start must skip all of the data.
+    """
+
+    CHUNK_SIZE = 1024**3
+    CHUNKS = 5
+
+    def _write(self):
+        array = ArraySpec(
+            "0", (1, self.CHUNKS, self.CHUNK_SIZE), (1, 1, self.CHUNK_SIZE), "uint8"
+        )
+        entries = list(image_entries("", array, None))
+        with ZipWriter(self.zip_path) as zw:
+            for key in array.chunk_keys():
+                zw.write_zeros(chunk_name("0", key), self.CHUNK_SIZE)
+                self.profile.count("entries")
+            for name, data in entries:
+                zw.writestr(name, data)
+                self.profile.count("entries")
+            # list metadata first, in BFS order, as the comment says
+            n_chunks = len(zw.entries) - len(entries)
+            metadata = sorted(
+                zw.entries[n_chunks:], key=lambda e: bfs_key(e.name.decode())
+            )
+            zw.entries[:] = metadata + zw.entries[:n_chunks]
+            zw.comment = self.comment()
+
+
+MetadataAfterData.register()
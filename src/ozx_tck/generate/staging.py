@@ -0,0 +1,128 @@
+"""Files below a zarr root, walked and checksummed once for every case writer."""
+
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from io import RawIOBase
+from pathlib import Path
+import zlib
+import logging
+
+from ..util import FileEntry, walk_files_sorted
+from ..zipwrite import COPY_BUFSIZE, ZipWriter
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_FILE = 1024**2
+"""Files up to this size have their contents kept in memory."""
+
+DEFAULT_CACHE_BYTES = 256 * 1024**2
+"""Total size of file contents kept in memory."""
+
+
+@dataclass(frozen=True, slots=True)
+class StagedEntry:
+    path: Path
+    """Path to the file on the file system."""
+
+    name: str
+    """Name of the entry in the zip archive (includes parent directories)."""
+
+    size: int
+    crc: int
+
+    data: bytes | None = None
+    """Contents of the file, if small enough to be kept in memory."""
+
+    def copy_entry(self, zw: ZipWriter, force_zip64=True, compress_type=None):
+        source = self.path if self.data is None else self.data
+        zw.write(self.name, source, self.crc, self.size, compress_type, force_zip64)
+
+
+class Staging:
+    """Ordered entries for a zarr root, with sizes and CRC-32s.
+
+    The tree is walked once, on first use of `files` or `entries`,
+    and every file is read once, on first use of `entries`;
+    small files' contents are kept so that archives can be written
+    without reading them again.
+    Entries are frozen, so case writers which rename them must copy them.
+
+    When pickled (e.g. for worker processes), entries are sent without
+    their cached contents, which are then read from the files as needed.
+    """
+
+    def __init__(
+        self, zarr_root: Path, cache_bytes=DEFAULT_CACHE_BYTES, walk_threads: int = 1
+    ) -> None:
+        """`walk_threads` directories are listed concurrently while walking."""
+        self.zarr_root = zarr_root
+        self.cache_bytes = cache_bytes
+        self.walk_threads = walk_threads
+        self._files: list[FileEntry] | None = None
+        self._entries: list[StagedEntry] | None = None
+
+    @property
+    def files(self) -> list[FileEntry]:
+        """Files below the zarr root, in archive order, without reading them."""
+        if self._files is None:
+            self._files = list(walk_files_sorted(self.zarr_root, self.walk_threads))
+        return self._files
+
+    @property
+    def entries(self) -> list[StagedEntry]:
+        if self._entries is None:
+            self._entries = list(self._stage())
+            logger.info("staged %s files below %s", len(self._entries), self.zarr_root)
+        return self._entries
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._entries is not None:
+            state["_entries"] = [replace(e, data=None) for e in self._entries]
+        return state
+
+    def _stage(self):
+        cached = 0
+        buf = bytearray(COPY_BUFSIZE)
+        for entry in self.files:
+            staged = stage_file(entry, buf, cached < self.cache_bytes)
+            if staged.data is not None:
+                cached += staged.size
+            yield staged
+
+
+def stage_file(entry: FileEntry, buf: bytearray, cache=True) -> StagedEntry:
+    """Read a file once for its size and CRC-32, using `buf` for reads.
+
+    With `cache`, the contents of files up to `MAX_CACHED_FILE` bytes are kept.
+    Each thread must use its own `buf`.
+    """
+    view = memoryview(buf)
+    with entry.path.open("rb", buffering=0) as f:
+        n = read_full(f, view)
+        if cache and n < len(buf) and n <= MAX_CACHED_FILE:
+            data = bytes(view[:n])
+            return StagedEntry(entry.path, entry.name, n, zlib.crc32(data), data)
+
+        crc = 0
+        size = 0
+        while n:
+            crc = zlib.crc32(view[:n], crc)
+            size += n
+            n = f.readinto(buf)
+    return StagedEntry(entry.path, entry.name, size, crc)
+
+
+def read_full(f: RawIOBase, view: memoryview) -> int:
+    """Read into `view` until it is full or the end of the file is reached.
+
+    A single unbuffered read can return less than requested before the end,
+    e.g. on network file systems, or when interrupted by a signal.
+    """
+    n = 0
+    while n < len(view):
+        got = f.readinto(view[n:])
+        if not got:
+            break
+        n += got
+    return n
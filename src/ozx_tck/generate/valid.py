@@ -1,6 +1,6 @@
-from zipfile import ZipFile
 import logging
-from ..util import walk_files_sorted, make_zip_comment
+from ..util import make_zip_comment
+from ..zipwrite import ZipWriter
 from .base import CaseWriter
 
 logger = logging.getLogger(__name__)
@@ -12,9 +12,9 @@ class Valid(CaseWriter):
     def _write(self):
         v = self.ome_zarr_version()
 
-        with ZipFile(self.zip_path, "x") as z:
-            for entry in walk_files_sorted(self.zarr_root):
-                entry.copy_entry(z)
+        with ZipWriter(self.zip_path) as z:
+            for entry in self.entries():
+                self.copy_entry(entry, z)
 
             z.comment = make_zip_comment(v)
 
@@ -1,7 +1,8 @@
-from zipfile import ZipFile, ZIP_DEFLATED
+from zipfile import ZIP_DEFLATED
 from random import Random
 
-from ..util import walk_files_sorted, make_zip_comment
+from ..util import make_zip_comment
+from ..zipwrite import ZipWriter
 from .base import CaseWriter
 
 
@@ -11,9 +12,9 @@ class WarnWriter(CaseWriter):
 
 class MissingComment(WarnWriter):
     def _write(self):
-        with ZipFile(self.zip_path, "x") as z:
-            for entry in walk_files_sorted(self.zarr_root):
-                entry.copy_entry(z)
+        with ZipWriter(self.zip_path) as z:
+            for entry in self.entries():
+                self.copy_entry(entry, z)
 
 
 MissingComment.register()
@@ -23,11 +24,11 @@ class NotZip64(WarnWriter):
     def _write(self):
         v = self.ome_zarr_version()
         all_over_2gig = True
-        with ZipFile(self.zip_path, "x") as z:
-            for entry in walk_files_sorted(self.zarr_root):
-                if all_over_2gig and entry.path.stat().st_size <= 2 * 1024**3:
+        with ZipWriter(self.zip_path) as z:
+            for entry in self.entries():
+                if all_over_2gig and entry.size <= 2 * 1024**3:
                     all_over_2gig = False
-                entry.copy_entry(z, False)
+                self.copy_entry(entry, z, False)
 
             z.comment = make_zip_comment(v)
         assert not all_over_2gig, "all files are over 2GiB; cannot test non-zip64"
@@ -41,11 +42,11 @@ class Unsorted(WarnWriter):
         v = self.ome_zarr_version()
         rng = Random(1991)
 
-        entries = list(walk_files_sorted(self.zarr_root))
+        entries = list(self.entries())
         rng.shuffle(entries)
-        with ZipFile(self.zip_path, "x") as z:
+        with ZipWriter(self.zip_path) as z:
             for entry in entries:
-                entry.copy_entry(z)
+                self.copy_entry(entry, z)
 
             # metadata is correct, we just don't like unsorted
             z.comment = make_zip_comment(v, False)
@@ -55,13 +56,16 @@ Unsorted.register()
 
 
 class NotOzx(WarnWriter):
+    def filename(self) -> str:
+        return type(self).slug() + ".zip"
+
     def _write(self):
         v = self.ome_zarr_version()
 
         self.zip_path.parent.mkdir(exist_ok=True, parents=True)
-        with ZipFile(self.zip_path.with_suffix(".zip"), "x") as z:
-            for entry in walk_files_sorted(self.zarr_root):
-                entry.copy_entry(z)
+        with ZipWriter(self.zip_path) as z:
+            for entry in self.entries():
+                self.copy_entry(entry, z)
 
             z.comment = make_zip_comment(v)
 
@@ -74,9 +78,9 @@ class Compressed(WarnWriter):
         v = self.ome_zarr_version()
 
         self.zip_path.parent.mkdir(exist_ok=True, parents=True)
-        with ZipFile(self.zip_path, "x", compression=ZIP_DEFLATED) as z:
-            for entry in walk_files_sorted(self.zarr_root):
-                entry.copy_entry(z)
+        with ZipWriter(self.zip_path, compression=ZIP_DEFLATED) as z:
+            for entry in self.entries():
+                self.copy_entry(entry, z)
 
             z.comment = make_zip_comment(v)
 
@@ -0,0 +1,103 @@
+"""Valid archives at the limits of the original ZIP format, where ZIP64 is required.
+
+Chunks are zeros, written with `ZipWriter.write_zeros`:
+their CRC-32s are computed rather than read,
+and their data is never written, leaving the archives sparse.
+Archives of several GiB therefore take seconds and little disk space to write.
+"""
+
+from __future__ import annotations
+from abc import abstractmethod
+import logging
+
+from ..synth import ArraySpec, OME_VERSION
+from ..util import make_zip_comment
+from ..zipread import (
+    CentralDirectoryEntry,
+    EndOfCentralDirectory,
+    iter_central_directory,
+    read_eocd,
+)
+from ..zipwrite import ZIP_FILECOUNT_LIMIT, ZIP64_LIMIT, ZipWriter
+from .base import CaseWriter
+from .perf import chunk_name, image_entries
+
+logger = logging.getLogger(__name__)
+
+ZIP32_MAX = 0xFFFFFFFF
+"""Largest size or offset the original ZIP format can record."""
+
+
+class Zip64Writer(CaseWriter):
+    STATE = "valid"
+    OPT_IN = "zip64"
+    READS_SOURCE = False
+
+    SHAPE = (1, 1, 1)
+    CHUNKS = (1, 1, 1)
+
+    def array(self) -> ArraySpec:
+        return ArraySpec("0", self.SHAPE, self.CHUNKS, "uint8")
+
+    def _write(self):
+        array = self.array()
+        with ZipWriter(self.zip_path) as zw:
+            for name, data in image_entries("", array, None):
+                zw.writestr(name, data)
+                self.profile.count("entries")
+            for key in array.chunk_keys():
+                zw.write_zeros(chunk_name("0", key), array.chunk_nbytes)
+                self.profile.count("entries")
+            zw.comment = make_zip_comment(OME_VERSION)
+
+        with self.zip_path.open("rb") as f:
+            eocd = read_eocd(f)
+            entries = list(iter_central_directory(f, eocd))
+        assert self.needs_zip64(eocd, entries), "case does not exceed ZIP limits"
+
+    @abstractmethod
+    def needs_zip64(
+        self, eocd: EndOfCentralDirectory, entries: list[CentralDirectoryEntry]
+    ) -> bool:
+        """Whether the written archive has reached the limit this case is for."""
+
+
+class Zip64LargeEntry(Zip64Writer):
+    """A chunk of more than 4 GiB."""
+
+    SHAPE = CHUNKS = (1, 1, ZIP32_MAX + 1)
+
+    def needs_zip64(self, eocd, entries):
+        return any(e.file_size > ZIP32_MAX for e in entries)
+
+
+Zip64LargeEntry.register()
+
+
+class Zip64ManyEntries(Zip64Writer):
+    """More entries than the end of central directory record can count."""
+
+    SHAPE = (1, 256, 256)
+
+    def needs_zip64(self, eocd, entries):
+        return eocd.zip64 and len(entries) > ZIP_FILECOUNT_LIMIT
+
+
+Zip64ManyEntries.register()
+
+
+class Zip64Offsets(Zip64Writer):
+    """Chunks which each fit the original format, but start more than 4 GiB in."""
+
+    SHAPE = (1, 3, ZIP64_LIMIT)
+    CHUNKS = (1, 1, ZIP64_LIMIT)
+
+    def needs_zip64(self, eocd, entries):
+        return (
+            all(e.file_size <= ZIP64_LIMIT for e in entries)
+            and entries[-1].header_offset > ZIP32_MAX
+            and eocd.cd_offset > ZIP32_MAX
+        )
+
+
+Zip64Offsets.register()
@@ -0,0 +1,195 @@
+"""Pack an OME-Zarr hierarchy into a single .ozx archive, for production use.
+
+Files are read, checksummed and (optionally) compressed by a pool of threads,
+ahead of a single writer which appends entries in order;
+large files' data is then copied into the archive by the kernel.
+The archive is otherwise identical to the `valid` case written by `generate`.
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser, Namespace
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import threading
+import time
+import zlib
+import logging
+
+from .executor import Executor
+from .generate.staging import COPY_BUFSIZE, StagedEntry, stage_file
+from .profile import NullProfile, Profile
+from .util import (
+    FileEntry,
+    is_metadata,
+    make_zip_comment,
+    ome_zarr_version,
+    walk_files_sorted,
+)
+from .zipwrite import ZipWriter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALIGN = 0
+"""No alignment; 4096, a typical file system block size, lets copies share extents."""
+
+
+@dataclass(slots=True)
+class PackedEntry:
+    staged: StagedEntry
+
+    compressed: bytes | None = None
+    """Raw deflate data, if the entry is to be compressed."""
+
+
+class Packer:
+    """Stage files in a thread pool, and write them in order to one archive."""
+
+    def __init__(
+        self,
+        threads: int,
+        compress_metadata=False,
+        ahead: int | None = None,
+        profile: Profile | None = None,
+    ) -> None:
+        """`ahead` is the number of files being staged while the writer catches up."""
+        self.threads = threads
+        self.compress_metadata = compress_metadata
+        self.ahead = threads * 4 if ahead is None else ahead
+        self.profile = NullProfile() if profile is None else profile
+        self._local = threading.local()
+
+    def prepare(self, entry: FileEntry) -> PackedEntry:
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = bytearray(COPY_BUFSIZE)
+        staged = stage_file(entry, buf)
+        packed = PackedEntry(staged)
+        if (
+            self.compress_metadata
+            and staged.data is not None
+            and is_metadata(staged.name)
+        ):
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS
+            )
+            packed.compressed = compressor.compress(staged.data) + compressor.flush()
+        return packed
+
+    def iter_prepared(self, entries: Iterable[FileEntry]) -> Iterator[PackedEntry]:
+        """Prepare entries in the pool, yielding them in their original order."""
+        if self.threads == 1:
+            yield from map(self.prepare, entries)
+            return
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            pending: deque[Future[PackedEntry]] = deque()
+            for entry in entries:
+                pending.append(pool.submit(self.prepare, entry))
+                if len(pending) >= self.ahead:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def pack(self, zw: ZipWriter, entries: Iterable[FileEntry]) -> int:
+        """Write every entry; return the number of bytes of entry data."""
+        nbytes = 0
+        for packed in self.profile.timed("stage", self.iter_prepared(entries)):
+            staged = packed.staged
+            with self.profile.phase("write"):
+                if packed.compressed is not None:
+                    zw.write_compressed(
+                        staged.name, packed.compressed, staged.crc, staged.size
+                    )
+                else:
+                    staged.copy_entry(zw)
+            self.profile.count("entries")
+            nbytes += staged.size
+        return nbytes
+
+
+class Pack(Executor):
+    def populate_parser(self, parser: ArgumentParser):
+        super().populate_parser(parser)
+        parser.description = (
+            "Pack an OME-Zarr hierarchy into a valid .ozx archive, "
+            "reading and checksumming files in parallel."
+        )
+        parser.add_argument(
+            "zarr_root",
+            type=Path,
+            help="local path to existing valid OME-Zarr hierarchy root",
+        )
+        parser.add_argument(
+            "output", type=Path, help="path to the archive to create, e.g. data.ozx"
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=0,
+            help=(
+                "number of threads reading and checksumming files; "
+                "0 means one per CPU (default 0)"
+            ),
+        )
+        parser.add_argument(
+            "--walk-threads",
+            type=int,
+            default=1,
+            help=(
+                "number of directories to list concurrently "
+                "while walking the zarr root (default 1)"
+            ),
+        )
+        parser.add_argument(
+            "--align",
+            type=int,
+            default=DEFAULT_ALIGN,
+            help=(
+                "align the data of entries of at least this many bytes "
+                "to a multiple of it, "
+                "padding local headers with an extra field, "
+                "so that file systems which support reflinks "
+                "can share blocks with the source files, e.g. 4096; "
+                f"0 to disable (default {DEFAULT_ALIGN})"
+            ),
+        )
+        parser.add_argument(
+            "--compress-metadata",
+            action="store_true",
+            help=(
+                "deflate zarr.json entries; "
+                "note that validators warn about compressed entries"
+            ),
+        )
+        parser.add_argument(
+            "-f", "--force", action="store_true", help="overwrite an existing output"
+        )
+
+    def execute(self, args: Namespace):
+        super().execute(args)
+        version = ome_zarr_version(args.zarr_root)
+        total = NullProfile() if self.profiling is None else self.profiling.total
+        packer = Packer(
+            args.jobs or os.process_cpu_count() or 1,
+            args.compress_metadata,
+            profile=total,
+        )
+        start = time.perf_counter()
+        with ZipWriter(args.output, "w" if args.force else "x", align=args.align) as zw:
+            entries = walk_files_sorted(args.zarr_root, args.walk_threads)
+            nbytes = packer.pack(zw, entries)
+            zw.comment = make_zip_comment(version)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "packed %s entries (%.1f MiB) into %s in %.2fs (%.1f MiB/s)",
+            len(zw.entries),
+            nbytes / 1024**2,
+            args.output,
+            elapsed,
+            nbytes / 1024**2 / elapsed,
+        )
@@ -0,0 +1,207 @@
+"""Lightweight phase timing and I/O accounting for subcommands.
+
+A Profile records wall-clock and CPU time per named phase,
+arbitrary counts, and the bytes read and written by the process
+while it was active (from /proc/self/io, where available).
+A ProfileSession collects the reports of many Profiles
+(e.g. one per Validator or CaseWriter) and writes them as one JSON document,
+optionally alongside a cProfile dump.
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser, Namespace
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+import cProfile
+from dataclasses import asdict, dataclass
+import json
+from pathlib import Path
+import sys
+import time
+from typing import Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def io_counters() -> dict[str, int] | None:
+    """Bytes read and written by this process so far, if the platform reports it.
+
+    Includes all read/write syscalls (e.g. cached reads), but not mmap page faults.
+    """
+    try:
+        text = Path("/proc/self/io").read_text()
+    except OSError:
+        return None
+    d = dict(line.split(": ", 1) for line in text.splitlines() if ": " in line)
+    if "rchar" not in d or "wchar" not in d:
+        return None
+    return {"read_bytes": int(d["rchar"]), "write_bytes": int(d["wchar"])}
+
+
+@dataclass
+class PhaseStats:
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    calls: int = 0
+
+
+class Profile:
+    """Timing and counts for one unit of work."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.phases: dict[str, PhaseStats] = dict()
+        self.counts: Counter[str] = Counter()
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_io = io_counters()
+
+    def add(self, phase: str, wall: float, cpu: float, calls: int = 1):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        stats.wall_seconds += wall
+        stats.cpu_seconds += cpu
+        stats.calls += calls
+
+    @contextmanager
+    def _phase(self, phase: str):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def phase(self, phase: str) -> AbstractContextManager:
+        return self._phase(phase)
+
+    def timed[T](self, phase: str, items: Iterable[T]) -> Iterator[T]:
+        """Iterate, attributing the time spent producing each item to a phase."""
+        it = iter(items)
+        while True:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(
+                    phase, time.perf_counter() - wall, time.process_time() - cpu, 0
+                )
+                return
+            self.add(phase, time.perf_counter() - wall, time.process_time() - cpu)
+            yield item
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] += n
+
+    def report(self) -> dict[str, Any]:
+        d: dict[str, Any] = {
+            "name": self.name,
+            "wall_seconds": time.perf_counter() - self.start_wall,
+            "cpu_seconds": time.process_time() - self.start_cpu,
+            "phases": {k: asdict(v) for k, v in self.phases.items()},
+            "counts": dict(self.counts),
+        }
+        end_io = io_counters()
+        if self.start_io is not None and end_io is not None:
+            d["io"] = {k: end_io[k] - self.start_io[k] for k in end_io}
+        return d
+
+
+NULL_CONTEXT = nullcontext()
+
+
+class NullProfile(Profile):
+    """Profile which records nothing, for when profiling is disabled."""
+
+    def __init__(self, name: str = "") -> None:
+        self.name = name
+
+    def add(self, phase: str, wall: float, cpu: float, calls: int = 1):
+        pass
+
+    def phase(self, phase: str) -> AbstractContextManager:
+        return NULL_CONTEXT
+
+    def timed[T](self, phase: str, items: Iterable[T]) -> Iterator[T]:
+        return iter(items)
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def report(self) -> dict[str, Any]:
+        return {"name": self.name}
+
+
+def add_profile_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="JSON",
+        help=(
+            "write a JSON report of per-phase wall and CPU time, counts, "
+            "and bytes read and written, to this path ('-' for stderr)"
+        ),
+    )
+    parser.add_argument(
+        "--cprofile",
+        type=Path,
+        metavar="PSTATS",
+        help=(
+            "write cProfile statistics for the main process to this path, "
+            "for use with pstats or snakeviz"
+        ),
+    )
+
+
+class ProfileSession:
+    """Collects the reports of a subcommand's Profiles."""
+
+    def __init__(
+        self,
+        command: str,
+        report_path: Path | None = None,
+        cprofile_path: Path | None = None,
+    ) -> None:
+        self.command = command
+        self.report_path = report_path
+        self.cprofile_path = cprofile_path
+        self.total = Profile(command)
+        self.items: list[dict[str, Any]] = []
+        self.cprofile: cProfile.Profile | None = None
+
+    @classmethod
+    def from_args(cls, command: str, args: Namespace) -> ProfileSession | None:
+        report_path = getattr(args, "profile", None)
+        cprofile_path = getattr(args, "cprofile", None)
+        if report_path is None and cprofile_path is None:
+            return None
+        return cls(command, report_path, cprofile_path)
+
+    def add(self, report: dict[str, Any]):
+        self.items.append(report)
+
+    def start(self):
+        if self.cprofile_path is not None:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def finish(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            assert self.cprofile_path is not None
+            self.cprofile.dump_stats(self.cprofile_path)
+            logger.info("wrote cProfile statistics to %s", self.cprofile_path)
+
+        if self.report_path is None:
+            return
+        report = self.total.report() | {"items": self.items}
+        s = json.dumps(report, indent=2)
+        if str(self.report_path) == "-":
+            print(s, file=sys.stderr)
+        else:
+            self.report_path.write_text(s + "\n")
+            logger.info("wrote profile report to %s", self.report_path)
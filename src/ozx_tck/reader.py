@@ -0,0 +1,188 @@
+"""Random-access reader for .ozx archives, with a compact index.
+
+`zipfile.ZipFile` keeps a dict of `ZipInfo` objects, one per entry,
+and copies every member it reads.
+OzxReader instead keeps the central directory as a sorted index
+of names in a single buffer and offsets and sizes in arrays,
+and returns stored entries as zero-copy views of a memory map of the archive.
+"""
+
+from __future__ import annotations
+from array import array
+from collections.abc import Iterable, Iterator
+from contextlib import AbstractContextManager
+import mmap
+from pathlib import Path
+import struct
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile
+import zlib
+import logging
+
+from .zipread import (
+    LOCAL_HEADER,
+    LOCAL_HEADER_SIG,
+    iter_central_directory,
+    read_eocd,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class OzxReader(AbstractContextManager):
+    """Read entries of a local archive by name.
+
+    The central directory is read once, when opened.
+    Views returned for stored entries refer to the memory map,
+    so must be released before the reader is closed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._build_index()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mmap)
+
+    def _build_index(self):
+        eocd = read_eocd(self._file)
+        if eocd.multipart:
+            raise BadZipFile("multi-part archives are not supported")
+        self.comment = eocd.comment
+
+        names: list[bytes] = []
+        header_offsets = array("Q")
+        compress_sizes = array("Q")
+        file_sizes = array("Q")
+        crcs = array("L")
+        compress_types = array("H")
+        for entry in iter_central_directory(self._file, eocd):
+            names.append(entry.filename.encode())
+            header_offsets.append(entry.header_offset + eocd.concat)
+            compress_sizes.append(entry.compress_size)
+            file_sizes.append(entry.file_size)
+            crcs.append(entry.crc)
+            compress_types.append(entry.compress_type)
+
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self._starts = array("Q", [0])
+        for idx in order:
+            self._starts.append(self._starts[-1] + len(names[idx]))
+        self._names = b"".join(names[idx] for idx in order)
+        self._header_offsets = array("Q", (header_offsets[i] for i in order))
+        self._compress_sizes = array("Q", (compress_sizes[i] for i in order))
+        self.file_sizes = array("Q", (file_sizes[i] for i in order))
+        """Uncompressed size of each entry, in name order."""
+        self.crcs = array("L", (crcs[i] for i in order))
+        """CRC-32 of each entry, in name order."""
+        self._compress_types = array("H", (compress_types[i] for i in order))
+
+    def __len__(self) -> int:
+        return len(self._header_offsets)
+
+    def name(self, idx: int) -> str:
+        """Name of the entry at a position in the index."""
+        return self._name(idx).decode()
+
+    def _name(self, idx: int) -> bytes:
+        return self._names[self._starts[idx] : self._starts[idx + 1]]
+
+    def names(self) -> Iterator[str]:
+        """Every entry's name, in sorted order."""
+        return map(self.name, range(len(self)))
+
+    def _bisect(self, key: bytes, lo: int = 0) -> int:
+        hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, name: str) -> int | None:
+        """Position of an entry in the index, if present."""
+        key = name.encode()
+        idx = self._bisect(key)
+        if idx < len(self) and self._name(idx) == key:
+            return idx
+        return None
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self.find(name) is not None
+
+    def find_many(self, names: Iterable[str]) -> list[int | None]:
+        """Positions of many entries, in the order given.
+
+        Keys are looked up in sorted order,
+        so each search starts where the last one ended.
+        """
+        keys = [n.encode() for n in names]
+        out: list[int | None] = [None] * len(keys)
+        lo = 0
+        for q in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[q]
+            lo = self._bisect(key, lo)
+            if lo < len(self) and self._name(lo) == key:
+                out[q] = lo
+        return out
+
+    def data_offset(self, idx: int) -> int:
+        """Offset of an entry's data, from its local header."""
+        offset = self._header_offsets[idx]
+        if self._mmap[offset : offset + 4] != LOCAL_HEADER_SIG:
+            raise BadZipFile(f"bad local file header for {self.name(idx)!r}")
+        name_len, extra_len = struct.unpack_from(
+            "<2H", self._mmap, offset + LOCAL_HEADER.size - 4
+        )
+        return offset + LOCAL_HEADER.size + name_len + extra_len
+
+    def read_index(self, idx: int) -> memoryview | bytes:
+        """Contents of the entry at a position in the index.
+
+        Stored entries are returned as views of the memory map, without copying;
+        compressed entries are decompressed into new bytes.
+        """
+        start = self.data_offset(idx)
+        data = self._view[start : start + self._compress_sizes[idx]]
+        compress_type = self._compress_types[idx]
+        if compress_type == ZIP_STORED:
+            return data
+        with data:
+            if compress_type == ZIP_DEFLATED:
+                return zlib.decompress(data, -zlib.MAX_WBITS)
+        raise BadZipFile(f"unsupported compression type {compress_type}")
+
+    def read(self, name: str) -> memoryview | bytes:
+        """Contents of an entry; raises KeyError if there is none by that name."""
+        idx = self.find(name)
+        if idx is None:
+            raise KeyError(name)
+        return self.read_index(idx)
+
+    def read_many(self, names: Iterable[str]) -> list[memoryview | bytes | None]:
+        """Contents of many entries (e.g. chunks), or None for any which are missing.
+
+        Entries are read in archive order, to make best use of read-ahead.
+        """
+        found = self.find_many(names)
+        out: list[memoryview | bytes | None] = [None] * len(found)
+        present = [(q, idx) for q, idx in enumerate(found) if idx is not None]
+        present.sort(key=lambda qi: self._header_offsets[qi[1]])
+        for q, idx in present:
+            out[q] = self.read_index(idx)
+        return out
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
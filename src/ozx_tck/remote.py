@@ -0,0 +1,299 @@
+"""Read-only, seekable access to archives served over HTTP(S).
+
+Only the byte ranges which are actually read are fetched,
+using Range requests over keep-alive connections which are pooled per host.
+"""
+
+from __future__ import annotations
+from http.client import HTTPConnection, HTTPResponse, HTTPSConnection, HTTPException
+import io
+import os
+from pathlib import Path, PurePosixPath
+import re
+from threading import Lock
+from typing import BinaryIO
+from urllib.parse import urlsplit
+import logging
+
+from .util import Location
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READAHEAD = 1024**2
+"""Minimum size of a Range request made to satisfy a read."""
+
+MAX_BUFFERED = 16 * 1024**2
+"""Ranges announced with `will_read` up to this size are fetched in one request
+and buffered; larger ranges are streamed."""
+
+TAIL_SIZE = 22 + 0xFFFF + 20
+"""Enough of the end of the file to contain the end of central directory records."""
+
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class RemoteError(OSError):
+    pass
+
+
+def is_url(location: Location) -> bool:
+    return isinstance(location, str) and location.split("://", 1)[0] in (
+        "http",
+        "https",
+    )
+
+
+def parse_location(s: str) -> Location:
+    """argparse type for arguments which may be a local path or an HTTP(S) URL."""
+    if is_url(s):
+        return s
+    return Path(s)
+
+
+def location_suffix(location: Location) -> str:
+    if is_url(location):
+        return PurePosixPath(urlsplit(str(location)).path).suffix
+    return Path(location).suffix
+
+
+def open_location(location: Location) -> BinaryIO:
+    if is_url(location):
+        return HttpRangeFile(str(location))  # type: ignore[return-value]
+    return open(location, "rb")
+
+
+class ConnectionPool:
+    """Idle keep-alive connections by (scheme, host), shared by a process's threads.
+
+    Connections are checked out for the exclusive use of one file,
+    so that requests from different threads are not interleaved on one socket,
+    and are returned when it is closed.
+    """
+
+    def __init__(self, timeout: float = 60) -> None:
+        self.timeout = timeout
+        self.idle: dict[tuple[str, str], list[HTTPConnection]] = dict()
+        self.lock = Lock()
+
+    def acquire(self, scheme: str, netloc: str) -> HTTPConnection:
+        """An idle connection, or a new one if there are none."""
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        Cls = HTTPSConnection if scheme == "https" else HTTPConnection
+        return Cls(netloc, timeout=self.timeout)
+
+    def release(self, scheme: str, netloc: str, conn: HTTPConnection):
+        """Return a connection with no response pending, for reuse."""
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(conn)
+
+
+POOL = ConnectionPool()
+
+
+class HttpRangeFile(io.RawIOBase):
+    """Seekable, read-only file over HTTP(S) Range requests.
+
+    The tail of the file is fetched on construction,
+    which also establishes the file size.
+    Reads are served from a single cached window,
+    from an open streaming response if they continue where it left off,
+    or by fetching at least `readahead` bytes into the window.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        readahead: int = DEFAULT_READAHEAD,
+        pool: ConnectionPool = POOL,
+    ) -> None:
+        super().__init__()
+        parts = urlsplit(url)
+        self.url = url
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.target = parts.path or "/"
+        if parts.query:
+            self.target += "?" + parts.query
+        self.readahead = readahead
+        self.pool = pool
+        self.conn: HTTPConnection | None = None
+
+        self.pos = 0
+        self.window_start = 0
+        self.window = b""
+
+        self.stream: HTTPResponse | None = None
+        self.stream_pos = 0
+        self.stream_end = 0
+
+        self.requests = 0
+        self.bytes_fetched = 0
+
+        self.size = 0
+        self.window_start, self.window = self._fetch(f"-{TAIL_SIZE}")
+
+    def _request(self, headers: dict[str, str]) -> HTTPResponse:
+        """Make a GET request, retrying once if a reused connection has gone stale."""
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = self.pool.acquire(self.scheme, self.netloc)
+            try:
+                self.conn.request("GET", self.target, headers=headers)
+                return self.conn.getresponse()
+            except (HTTPException, ConnectionError) as e:
+                self._discard_connection()
+                if attempt:
+                    raise RemoteError(f"request to {self.netloc} failed: {e}") from e
+                logger.debug("retrying request to %s after %s", self.netloc, e)
+        raise AssertionError("unreachable")
+
+    def _discard_connection(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _get(self, range_spec: str) -> tuple[int, int, HTTPResponse]:
+        self._close_stream()
+        resp = self._request({"Range": f"bytes={range_spec}"})
+        self.requests += 1
+        if resp.status != 206:
+            # rather than reading a body which may be the whole file
+            self._discard_connection()
+            raise RemoteError(
+                f"expected partial content from {self.url}, "
+                f"got HTTP {resp.status} {resp.reason}"
+            )
+        m = CONTENT_RANGE.fullmatch(resp.headers.get("Content-Range", ""))
+        if m is None:
+            resp.read()
+            raise RemoteError(f"bad Content-Range header from {self.url}")
+        start, last, self.size = (int(g) for g in m.groups())
+        return start, last + 1, resp
+
+    def _fetch(self, range_spec: str) -> tuple[int, bytes]:
+        start, end, resp = self._get(range_spec)
+        b = resp.read()
+        self.bytes_fetched += len(b)
+        if len(b) != end - start:
+            self._discard_connection()
+            raise RemoteError(f"short read from {self.url}")
+        logger.debug("fetched bytes %s-%s of %s", start, end, self.url)
+        return start, b
+
+    def _close_stream(self):
+        if self.stream is None:
+            return
+        if self.stream_pos < self.stream_end:
+            # the connection cannot be reused with an unread body
+            self.stream.close()
+            self._discard_connection()
+        self.stream = None
+
+    def will_read(self, offset: int, length: int):
+        """Announce that a range is about to be read sequentially.
+
+        Any part which is already in the cached window is not re-fetched.
+        If the remainder is adjacent to the window and small, it is merged into it;
+        otherwise it is streamed by a single request.
+        """
+        end = min(offset + length, self.size)
+        window_end = self.window_start + len(self.window)
+        if offset >= self.window_start and end <= window_end:
+            return
+        if self.window_start <= end <= window_end:
+            end = self.window_start
+        if end <= offset:
+            return
+
+        if end - offset <= MAX_BUFFERED:
+            start, b = self._fetch(f"{offset}-{end - 1}")
+            if start + len(b) == self.window_start:
+                self.window = b + self.window
+            else:
+                self.window = b
+            self.window_start = start
+            return
+
+        start, stream_end, self.stream = self._get(f"{offset}-{end - 1}")
+        self.stream_pos = start
+        self.stream_end = stream_end
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = self.size - self.pos
+        size = max(0, min(size, self.size - self.pos))
+        if not size:
+            return b""
+
+        out = self._read_window(size)
+        if out is None and self.stream is not None and self.stream_pos == self.pos:
+            n = min(size, self.stream_end - self.stream_pos)
+            out = self.stream.read(n)
+            self.bytes_fetched += len(out)
+            self.stream_pos += len(out)
+            if len(out) < n:
+                raise RemoteError(f"short read from {self.url}")
+            if self.stream_pos >= self.stream_end:
+                self.stream = None
+        if out is None:
+            end = min(self.size, self.pos + max(size, self.readahead))
+            self.window_start, self.window = self._fetch(f"{self.pos}-{end - 1}")
+            out = self._read_window(size)
+            assert out is not None
+
+        self.pos += len(out)
+        if len(out) < size:
+            # e.g. the start was in the window, but the end was not
+            out += self.read(size - len(out))
+        return out
+
+    def _read_window(self, size: int) -> bytes | None:
+        offset = self.pos - self.window_start
+        if offset < 0 or offset >= len(self.window):
+            return None
+        return self.window[offset : offset + size]
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        match whence:
+            case os.SEEK_SET:
+                self.pos = offset
+            case os.SEEK_CUR:
+                self.pos += offset
+            case os.SEEK_END:
+                self.pos = self.size + offset
+            case _:
+                raise ValueError(f"invalid whence: {whence}")
+        if self.pos < 0:
+            raise ValueError("negative seek position")
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def close(self):
+        if not self.closed:
+            self._close_stream()
+            if self.conn is not None:
+                self.pool.release(self.scheme, self.netloc, self.conn)
+                self.conn = None
+            logger.info(
+                "fetched %s bytes of %s in %s requests",
+                self.bytes_fetched,
+                self.url,
+                self.requests,
+            )
+        super().close()
@@ -0,0 +1,271 @@
+"""Serve validation requests from a long-running process.
+
+Each `ozx-tck validate` invocation pays for interpreter startup and imports,
+which dominate the time taken to validate a small archive.
+`serve` pays them once, then validates archives on request,
+sharing a pool of worker processes and result caches between requests.
+
+Requests are HTTP, over a local TCP port or a Unix socket:
+`POST /validate` with a JSON body `{"args": [...]}`,
+where `args` are the arguments `validate` would take on the command line,
+returns the events, per-archive counts and summary as JSON,
+with the exit code `validate` would have given.
+Paths are resolved by the server.
+
+    ozx-tck serve --socket /tmp/ozx.sock -j 4 &
+    curl --unix-socket /tmp/ozx.sock http://localhost/validate \\
+        -d '{"args": ["--strict", "-j", "4", "uploads/"]}'
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+from pathlib import Path
+import signal
+import socket
+import socketserver
+import stat
+import sys
+from typing import Any
+import logging
+
+from .executor import Executor
+from .util import tool_version
+from .validate import Validate
+from .validate.cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8750
+MAX_REQUEST_BYTES = 1024**2
+
+
+class RequestParser(ArgumentParser):
+    """Raises ValueError, rather than exiting, on invalid arguments."""
+
+    def error(self, message: str):
+        raise ValueError(message)
+
+
+def _warm_worker() -> int:
+    """Run in each worker at startup, so that it has imported `validate`."""
+    return os.getpid()
+
+
+class ValidationService:
+    """Runs validate requests, sharing a worker pool and caches between them."""
+
+    def __init__(self, jobs: int = 1) -> None:
+        """With `jobs` other than 1, requests with `--jobs` share a pool of this size.
+
+        Requests cannot pass `--profile` or `--cprofile`,
+        which would write to paths of the client's choosing;
+        use `serve --profile` instead.
+        """
+        self.parser = RequestParser("validate", add_help=False)
+        Validate().populate_parser(self.parser)
+        self.parser.set_defaults(verbose=0)
+
+        self.pool: ProcessPoolExecutor | None = None
+        if jobs != 1:
+            n = jobs or os.process_cpu_count() or 1
+            self.pool = ProcessPoolExecutor(n)
+            for fut in [self.pool.submit(_warm_worker) for _ in range(n)]:
+                fut.result()
+        self.caches: dict[Path, ResultCache] = dict()
+
+    def parse(self, argv: list[str]) -> Namespace:
+        """Raises ValueError if the arguments are invalid."""
+        args = self.parser.parse_args(argv)
+        args.output_format = "jsonl"
+        return args
+
+    def validate(self, argv: list[str]) -> dict[str, Any]:
+        """Validate as `ozx-tck validate <argv>` would, returning the results."""
+        args = self.parse(argv)
+        stream = io.StringIO()
+        code: Any = 0
+        try:
+            Validate(stream, self.pool, self.caches).run(args)
+        except SystemExit as e:
+            code = e.code
+
+        result: dict[str, Any] = {
+            "exit_code": code,
+            "events": [],
+            "archives": [],
+            "summary": None,
+        }
+        for line in stream.getvalue().splitlines():
+            record = json.loads(line)
+            kind = record.pop("type")
+            if kind == "summary":
+                result["summary"] = record
+            else:
+                result[kind + "s"].append(record)
+        return result
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        for cache in self.caches.values():
+            cache.close()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = f"ozx-tck/{tool_version()}"
+
+    @property
+    def service(self) -> ValidationService:
+        assert isinstance(self.server, (TCPServiceServer, UnixServiceServer))
+        return self.server.service
+
+    def send_json(self, code: int, d: dict[str, Any]):
+        body = json.dumps(d).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, code: int, msg: str):
+        self.send_json(code, {"error": msg})
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "version": tool_version()})
+        else:
+            self.send_error_json(404, f"no such endpoint {self.path}")
+
+    def do_POST(self):
+        if self.path != "/validate":
+            self.send_error_json(404, f"no such endpoint {self.path}")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            self.send_error_json(413, "request too large")
+            return
+        try:
+            argv = json.loads(self.rfile.read(length))["args"]
+            if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+                raise TypeError("`args` must be a list of strings")
+            result = self.service.validate(argv)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_error_json(400, f"bad request: {e}")
+            return
+        except Exception as e:
+            logger.exception("failed to validate %s", argv)
+            self.send_error_json(500, f"{type(e).__name__}: {e}")
+            return
+        self.send_json(200, result)
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        if isinstance(self.client_address, tuple):
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format: str, *args: Any):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class TCPServiceServer(ThreadingHTTPServer):
+    """HTTP server on a TCP port, holding the service its handlers use."""
+
+    def __init__(self, address: tuple[str, int], service: ValidationService) -> None:
+        super().__init__(address, ServiceHandler)
+        self.service = service
+
+
+class UnixServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket, holding the service its handlers use."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, service: ValidationService) -> None:
+        super().__init__(path, ServiceHandler)
+        self.service = service
+
+
+class Serve(Executor):
+    def populate_parser(self, parser: ArgumentParser):
+        super().populate_parser(parser)
+        parser.description = (
+            "Serve validation requests over HTTP from a long-running process, "
+            "avoiding per-invocation startup; "
+            'POST {"args": [<validate arguments>...]} to /validate.'
+        )
+        where = parser.add_mutually_exclusive_group()
+        where.add_argument(
+            "--socket", type=Path, help="listen on a Unix socket at this path"
+        )
+        where.add_argument(
+            "--port",
+            type=int,
+            default=DEFAULT_PORT,
+            help=f"listen on this TCP port (default {DEFAULT_PORT})",
+        )
+        parser.add_argument(
+            "--host",
+            default=DEFAULT_HOST,
+            help=f"address to listen on with --port (default {DEFAULT_HOST})",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help=(
+                "size of the worker process pool shared by requests with --jobs; "
+                "0 means one per CPU (default 1, no shared pool)"
+            ),
+        )
+
+    def execute(self, args: Namespace):
+        super().execute(args)
+        service = ValidationService(args.jobs)
+        server: socketserver.BaseServer
+        if args.socket is not None:
+            remove_stale_socket(args.socket)
+            server = UnixServiceServer(str(args.socket), service)
+            where = f"unix:{args.socket}"
+        else:
+            server = TCPServiceServer((args.host, args.port), service)
+            where = f"http://{args.host}:{server.server_address[1]}"
+
+        # shut down cleanly when terminated, as when interrupted
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print(f"serving validation requests on {where}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if args.socket is not None:
+                args.socket.unlink(missing_ok=True)
+            service.close()
+
+
+def remove_stale_socket(path: Path):
+    """Remove a socket left by a previous server; refuse to replace other files."""
+    try:
+        mode = path.lstat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(str(path))
+        except ConnectionRefusedError:
+            path.unlink()
+            return
+    raise FileExistsError(f"another server is listening on {path}")
@@ -0,0 +1,457 @@
+"""Deterministic synthetic OME-Zarr v0.5 hierarchies, for testing at scale.
+
+Metadata is written first, then chunks in parallel.
+The same arguments always produce the same files,
+so that archives generated from them are reproducible.
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice, product
+import json
+import math
+import os
+from pathlib import Path
+import random
+import string
+import time
+from typing import Any, TypedDict
+import logging
+
+from .executor import Executor
+from .profile import NullProfile
+
+logger = logging.getLogger(__name__)
+
+OME_VERSION = "0.5"
+AXES = ("z", "y", "x")
+
+FILLS = ("random", "zeros", "holes")
+"""How chunk contents are written.
+
+- random: pseudo-random bytes, seeded by the array path and chunk key
+- zeros: zero bytes, written out in full
+- holes: files truncated to the chunk size, sparse on most file systems
+"""
+
+DTYPES = {"uint8": 1, "uint16": 2, "uint32": 4, "float32": 4, "float64": 8}
+"""Supported data types and their sizes in bytes."""
+
+BATCH_SIZE = 1024
+"""Chunks written per task."""
+
+
+def shape_arg(s: str) -> tuple[int, ...]:
+    """Parse e.g. "64,1024,1024" into a 3D shape."""
+    try:
+        shape = tuple(int(item) for item in s.split(","))
+    except ValueError:
+        raise ArgumentTypeError(f"not a comma-separated list of integers: {s!r}")
+    if len(shape) != len(AXES) or min(shape) < 1:
+        raise ArgumentTypeError(f"expected {len(AXES)} positive integers (ZYX): {s!r}")
+    return shape
+
+
+def density_arg(s: str) -> float:
+    try:
+        density = float(s)
+    except ValueError:
+        raise ArgumentTypeError(f"not a number: {s!r}")
+    if not 0 < density <= 1:
+        raise ArgumentTypeError(f"must be in (0, 1]: {s!r}")
+    return density
+
+
+class Well(TypedDict):
+    """A well of a plate, as listed in the plate metadata."""
+
+    path: str
+    rowIndex: int
+    columnIndex: int
+
+
+@dataclass(frozen=True)
+class ArraySpec:
+    path: str
+    """Path of the array below the root, "/"-separated."""
+
+    shape: tuple[int, ...]
+    chunks: tuple[int, ...]
+    dtype: str
+
+    @property
+    def grid(self) -> tuple[int, ...]:
+        """Number of chunks along each dimension."""
+        return tuple(math.ceil(s / c) for s, c in zip(self.shape, self.chunks))
+
+    @property
+    def n_chunks(self) -> int:
+        return math.prod(self.grid)
+
+    @property
+    def chunk_nbytes(self) -> int:
+        return math.prod(self.chunks) * DTYPES[self.dtype]
+
+    def metadata(self) -> dict[str, Any]:
+        return {
+            "zarr_format": 3,
+            "node_type": "array",
+            "shape": list(self.shape),
+            "data_type": self.dtype,
+            "chunk_grid": {
+                "name": "regular",
+                "configuration": {"chunk_shape": list(self.chunks)},
+            },
+            "chunk_key_encoding": {
+                "name": "default",
+                "configuration": {"separator": "/"},
+            },
+            "fill_value": 0,
+            "codecs": [{"name": "bytes", "configuration": {"endian": "little"}}],
+            "dimension_names": list(AXES),
+        }
+
+    def chunk_keys(self) -> Iterator[tuple[int, ...]]:
+        return product(*(range(n) for n in self.grid))
+
+
+def group_metadata(ome: dict[str, Any] | None = None) -> dict[str, Any]:
+    attrs = {"version": OME_VERSION}
+    if ome is not None:
+        attrs |= ome
+    return {"zarr_format": 3, "node_type": "group", "attributes": {"ome": attrs}}
+
+
+def level_shape(shape: tuple[int, ...], level: int) -> tuple[int, ...]:
+    """Shape of a multiscale level; Y and X are halved per level, Z is kept."""
+    z, y, x = shape
+    factor = 2**level
+    return (z, math.ceil(y / factor), math.ceil(x / factor))
+
+
+def multiscales(name: str, levels: int) -> dict[str, Any]:
+    return {
+        "multiscales": [
+            {
+                "name": name,
+                "axes": [
+                    {"name": a, "type": "space", "unit": "micrometer"} for a in AXES
+                ],
+                "datasets": [
+                    {
+                        "path": str(level),
+                        "coordinateTransformations": [
+                            {"type": "scale", "scale": [1.0, 2.0**level, 2.0**level]}
+                        ],
+                    }
+                    for level in range(levels)
+                ],
+            }
+        ]
+    }
+
+
+def row_name(idx: int) -> str:
+    """A, B, ..., Z, AA, AB, ..."""
+    name = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        name = string.ascii_uppercase[rem] + name
+    return name
+
+
+class Plan:
+    """Every group and array in a synthetic hierarchy."""
+
+    def __init__(
+        self,
+        shape: tuple[int, ...],
+        chunks: tuple[int, ...],
+        dtype: str = "uint8",
+        levels: int = 1,
+        depth: int = 0,
+        rows: int = 0,
+        columns: int = 0,
+        fields: int = 1,
+    ) -> None:
+        """With `rows` and `columns`, a plate of images; otherwise a single image.
+
+        A single image is nested below `depth` intermediate groups.
+        """
+        self.groups: dict[str, dict[str, Any]] = dict()
+        self.arrays: list[ArraySpec] = []
+        self.shape = shape
+        self.chunks = chunks
+        self.dtype = dtype
+        self.levels = levels
+
+        if rows and columns:
+            self.add_plate(rows, columns, fields)
+        else:
+            parents = [f"g{d}" for d in range(depth)]
+            for d in range(depth):
+                self.groups["/".join(parents[:d])] = group_metadata()
+            self.add_image("/".join(parents), "image")
+
+    def add_image(self, path: str, name: str):
+        self.groups[path] = group_metadata(multiscales(name, self.levels))
+        for level in range(self.levels):
+            self.arrays.append(
+                ArraySpec(
+                    "/".join(p for p in [path, str(level)] if p),
+                    level_shape(self.shape, level),
+                    self.chunks,
+                    self.dtype,
+                )
+            )
+
+    def add_plate(self, rows: int, columns: int, fields: int):
+        row_names = [row_name(r) for r in range(rows)]
+        col_names = [str(c + 1) for c in range(columns)]
+        wells: list[Well] = []
+        for (r, row), (c, col) in product(enumerate(row_names), enumerate(col_names)):
+            wells.append({"path": f"{row}/{col}", "rowIndex": r, "columnIndex": c})
+        self.groups[""] = group_metadata(
+            {
+                "plate": {
+                    "name": "synthetic",
+                    "rows": [{"name": n} for n in row_names],
+                    "columns": [{"name": n} for n in col_names],
+                    "wells": wells,
+                    "field_count": fields,
+                }
+            }
+        )
+        for row in row_names:
+            self.groups[row] = {"zarr_format": 3, "node_type": "group"}
+        for well in wells:
+            self.groups[well["path"]] = group_metadata(
+                {"well": {"images": [{"path": str(f)} for f in range(fields)]}}
+            )
+            for f in range(fields):
+                self.add_image(f"{well['path']}/{f}", f"{well['path']}/{f}")
+
+    @property
+    def n_chunks(self) -> int:
+        return sum(a.n_chunks for a in self.arrays)
+
+    def write_metadata(self, root: Path):
+        docs = list(self.groups.items()) + [(a.path, a.metadata()) for a in self.arrays]
+        for path, doc in docs:
+            d = root / path
+            d.mkdir(parents=True, exist_ok=True)
+            (d / "zarr.json").write_text(json.dumps(doc, indent=2))
+
+    def iter_batches(
+        self, root: Path, batch_size=BATCH_SIZE
+    ) -> Iterator[tuple[Path, ArraySpec, list[tuple[int, ...]]]]:
+        for array in self.arrays:
+            keys = array.chunk_keys()
+            while batch := list(islice(keys, batch_size)):
+                yield root / array.path, array, batch
+
+    def write_chunks(
+        self, root: Path, fill="random", density=1.0, seed=0, jobs=0
+    ) -> tuple[int, int]:
+        """Write every chunk below `root`; return the number of chunks and bytes.
+
+        `jobs` processes write batches of chunks; 0 means one per CPU.
+        """
+        batches = self.iter_batches(root)
+        options = (fill, density, seed)
+        n_chunks = 0
+        nbytes = 0
+        jobs = jobs or os.process_cpu_count() or 1
+        if jobs == 1:
+            for array_dir, array, keys in batches:
+                n, b = write_chunks(array_dir, array, keys, *options)
+                n_chunks += n
+                nbytes += b
+            return n_chunks, nbytes
+
+        # bound the number of pending batches, as there may be millions of chunks
+        with ProcessPoolExecutor(jobs) as pool:
+            pending: list[Future[tuple[int, int]]] = []
+            for array_dir, array, keys in batches:
+                pending.append(
+                    pool.submit(write_chunks, array_dir, array, keys, *options)
+                )
+                if len(pending) >= jobs * 4:
+                    n, b = pending.pop(0).result()
+                    n_chunks += n
+                    nbytes += b
+            for fut in pending:
+                n, b = fut.result()
+                n_chunks += n
+                nbytes += b
+        return n_chunks, nbytes
+
+
+def chunk_rng(seed: int, array: ArraySpec, key: tuple[int, ...]) -> random.Random:
+    # string seeds are hashed with SHA-512, so are stable across processes
+    return random.Random(f"{seed}:{array.path}:{'/'.join(map(str, key))}")
+
+
+def write_chunks(
+    array_dir: Path,
+    array: ArraySpec,
+    keys: list[tuple[int, ...]],
+    fill: str,
+    density: float = 1.0,
+    seed: int = 0,
+) -> tuple[int, int]:
+    """Write a batch of chunks of one array; return the number of chunks and bytes.
+
+    With `density` < 1, each chunk is skipped with that probability,
+    so that readers see the fill value.
+    """
+    nbytes = array.chunk_nbytes
+    zeros = bytes(nbytes) if fill == "zeros" else b""
+    parent = None
+    n_chunks = 0
+    for key in keys:
+        rng = chunk_rng(seed, array, key)
+        if density < 1 and rng.random() >= density:
+            continue
+        path = array_dir.joinpath("c", *map(str, key))
+        if path.parent != parent:
+            parent = path.parent
+            parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as f:
+            if fill == "random":
+                f.write(rng.randbytes(nbytes))
+            elif fill == "zeros":
+                f.write(zeros)
+            else:
+                f.truncate(nbytes)
+        n_chunks += 1
+    return n_chunks, n_chunks * nbytes
+
+
+class Synth(Executor):
+    def populate_parser(self, parser: ArgumentParser):
+        super().populate_parser(parser)
+        self.parser = parser
+        parser.description = (
+            "Write a deterministic synthetic OME-Zarr v0.5 hierarchy, "
+            "for testing `generate` and `validate` at scale without a network."
+        )
+        parser.add_argument(
+            "output_root",
+            type=Path,
+            help="path to the hierarchy root to create; must not exist",
+        )
+        parser.add_argument(
+            "--shape",
+            type=shape_arg,
+            default=(1, 1024, 1024),
+            help="ZYX shape of the full-resolution array (default 1,1024,1024)",
+        )
+        parser.add_argument(
+            "--chunks",
+            type=shape_arg,
+            default=(1, 256, 256),
+            help="ZYX chunk shape of every array (default 1,256,256)",
+        )
+        parser.add_argument(
+            "--dtype", choices=list(DTYPES), default="uint8", help="(default uint8)"
+        )
+        parser.add_argument(
+            "--levels",
+            type=int,
+            default=1,
+            help=(
+                "number of multiscale levels; "
+                "each halves the Y and X size of the last (default 1)"
+            ),
+        )
+        parser.add_argument(
+            "--depth",
+            type=int,
+            default=0,
+            help=(
+                "number of intermediate groups "
+                "between the root and a single image (default 0)"
+            ),
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=0,
+            help="number of plate rows; with --columns, write a plate of images",
+        )
+        parser.add_argument(
+            "--columns", type=int, default=0, help="number of plate columns"
+        )
+        parser.add_argument(
+            "--fields", type=int, default=1, help="images per plate well (default 1)"
+        )
+        parser.add_argument(
+            "--fill",
+            choices=FILLS,
+            default="random",
+            help=(
+                "chunk contents: seeded pseudo-random bytes, zeros, "
+                "or holes (sparse files, cheapest for large trees) (default random)"
+            ),
+        )
+        parser.add_argument(
+            "--density",
+            type=density_arg,
+            default=1.0,
+            help=(
+                "fraction of chunks to write; "
+                "the others are left missing, i.e. the fill value (default 1)"
+            ),
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="seed for --fill random and --density"
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=0,
+            help="number of processes writing chunks; 0 means one per CPU (default 0)",
+        )
+
+    def execute(self, args: Namespace):
+        super().execute(args)
+        if (args.rows > 0) != (args.columns > 0):
+            self.parser.error("--rows and --columns must be given together")
+
+        plan = Plan(
+            args.shape,
+            args.chunks,
+            args.dtype,
+            args.levels,
+            args.depth,
+            args.rows,
+            args.columns,
+            args.fields,
+        )
+        logger.info(
+            "writing %s groups and %s arrays of %s chunks to %s",
+            len(plan.groups),
+            len(plan.arrays),
+            plan.n_chunks,
+            args.output_root,
+        )
+        total = NullProfile() if self.profiling is None else self.profiling.total
+        args.output_root.mkdir(parents=True, exist_ok=False)
+        with total.phase("metadata"):
+            plan.write_metadata(args.output_root)
+
+        start = time.perf_counter()
+        with total.phase("chunks"):
+            n_chunks, nbytes = plan.write_chunks(
+                args.output_root, args.fill, args.density, args.seed, args.jobs
+            )
+        elapsed = time.perf_counter() - start
+        total.count("chunks", n_chunks)
+        total.count("chunk_bytes", nbytes)
+        logger.info("wrote %s chunks (%s bytes) in %.1fs", n_chunks, nbytes, elapsed)
@@ -1,8 +1,11 @@
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import os
 from pathlib import Path
 from dataclasses import dataclass
 import json
-from collections import deque
+from importlib.metadata import PackageNotFoundError, version
+import shutil
 from typing import Any, Literal
 from zipfile import ZipFile
 import logging
@@ -13,6 +16,18 @@ SUBCOMMANDS = dict()
 
 type State = Literal["valid", "warn", "error"]
 
+type CaseState = State | Literal["perf"]
+"""States of generated cases; `perf` cases are valid, but stress readers."""
+
+type EventState = State | Literal["info"]
+"""States of validation events; `info` is advisory and never affects the exit code."""
+
+type Location = Path | str
+"""Local path to a file, or an HTTP(S) URL."""
+
+COPY_BUFSIZE = 4 * 1024**2
+"""Size of the buffer used to stream files into archives."""
+
 
 @dataclass
 class FileEntry:
@@ -26,10 +41,13 @@ class FileEntry:
     def from_root(cls, root: Path, fullpath: Path):
         return cls(fullpath, str(fullpath.relative_to(root)))
 
-    def copy_entry(self, zf: ZipFile, force_zip64=True):
-        b = self.path.read_bytes()
-        with zf.open(self.name, "w", force_zip64=force_zip64) as f:
-            f.write(b)
+    def copy_entry(self, zf: ZipFile, force_zip64=True, bufsize=COPY_BUFSIZE):
+        """Stream the file into the archive, holding at most `bufsize` bytes."""
+        with (
+            self.path.open("rb", buffering=0) as src,
+            zf.open(self.name, "w", force_zip64=force_zip64) as dst,
+        ):
+            shutil.copyfileobj(src, dst, bufsize)
 
 
 def is_array(path: Path) -> bool:
@@ -37,52 +55,121 @@ def is_array(path: Path) -> bool:
     return json.loads(path.read_text())["node_type"] == "array"
 
 
-def walk_files_sorted(root: Path) -> Iterable[FileEntry]:
-    yield from walk_files(root, True)
-    yield from walk_files(root, False)
+def is_metadata(name: str) -> bool:
+    """Whether a name in an archive is that of a zarr.json file."""
+    return name == "zarr.json" or name.endswith("/zarr.json")
 
 
-def walk_files(root: Path, metadata: bool | None = None) -> Iterable[FileEntry]:
-    """Recursively iterate through all files below the root in breadth-first order.
+def _scan(dirpath: str) -> tuple[list[str], list[str]]:
+    """Sorted names of subdirectories and files, skipping symlinks.
 
-    If metadata is None, return all files.
-    If metadata is True, only return zarr.json files.
-    If metadata is False, only return files other than zarr.json.
+    Uses the file types cached by `os.scandir`,
+    so no extra stat calls are made on most file systems.
     """
-    to_visit = deque([root])
-    while to_visit:
-        dirpath = to_visit.popleft()
-        dirnames = []
-        filenames = []
-        for p in dirpath.iterdir():
-            if p.is_symlink():
+    dirnames = []
+    filenames = []
+    with os.scandir(dirpath) as it:
+        for entry in it:
+            if entry.is_symlink():
                 continue
-            elif p.is_dir():
-                dirnames.append(p.name)
-            elif p.is_file():
-                if p.name == "zarr.json":
-                    if metadata is False:
-                        continue
+            elif entry.is_dir(follow_symlinks=False):
+                dirnames.append(entry.name)
+            elif entry.is_file(follow_symlinks=False):
+                filenames.append(entry.name)
+    dirnames.sort()
+    filenames.sort()
+    return dirnames, filenames
+
+
+def iter_dirs(
+    root: Path, concurrency: int = 1
+) -> Iterator[tuple[str, str, list[str], list[str]]]:
+    """Visit every directory below the root in breadth-first order.
+
+    Yields the directory's path, its path relative to the root
+    ("" for the root itself, otherwise ending in "/"),
+    and the sorted names of its subdirectories and files.
+    Directories are listed a level at a time;
+    with `concurrency` above 1, each level's listings are made in parallel threads,
+    which helps on high-latency storage.
+    """
+    pool = ThreadPoolExecutor(concurrency) if concurrency > 1 else None
+    level = [(os.fspath(root), "")]
+    try:
+        while level:
+            paths = [p for p, _ in level]
+            listings = map(_scan, paths) if pool is None else pool.map(_scan, paths)
+            next_level: list[tuple[str, str]] = []
+            for (dirpath, prefix), (dirnames, filenames) in zip(level, listings):
+                yield dirpath, prefix, dirnames, filenames
+                next_level.extend(
+                    (os.path.join(dirpath, d), prefix + d + "/") for d in dirnames
+                )
+            level = next_level
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def walk_tree(
+    root: Path, concurrency: int = 1
+) -> tuple[list[FileEntry], list[FileEntry]]:
+    """Metadata and data files below the root, each in breadth-first order.
+
+    Makes a single traversal.
+    Metadata is every zarr.json which is not below an array;
+    data is every other file.
+    """
+    metadata = []
+    data = []
+    # directories below an array; holds at most two levels of the tree
+    below_array: set[str] = set()
+    for dirpath, prefix, dirnames, filenames in iter_dirs(root, concurrency):
+        in_array = dirpath in below_array
+        below_array.discard(dirpath)
+        for fname in filenames:
+            path = Path(dirpath, fname)
+            if fname != "zarr.json":
+                data.append(FileEntry(path, prefix + fname))
+                continue
+            if in_array:
+                continue
+            metadata.append(FileEntry(path, prefix + fname))
+            if is_array(path):
+                in_array = True
+        if in_array:
+            below_array.update(os.path.join(dirpath, d) for d in dirnames)
+    return metadata, data
 
-                    if metadata is True and is_array(p):
-                        dirnames.clear()
-                        filenames.clear()
-                        yield FileEntry.from_root(root, p)
-                        break
 
-                elif metadata is True:
-                    continue
+def walk_files_sorted(root: Path, concurrency: int = 1) -> Iterable[FileEntry]:
+    metadata, data = walk_tree(root, concurrency)
+    yield from metadata
+    yield from data
 
-                filenames.append(p.name)
 
-        dirnames.sort()
-        filenames.sort()
+def walk_files(root: Path, metadata: bool | None = None) -> Iterable[FileEntry]:
+    """Recursively iterate through all files below the root in breadth-first order.
+
+    If metadata is None, return all files.
+    If metadata is True, only return zarr.json files (not those below arrays).
+    If metadata is False, only return files other than zarr.json.
+    """
+    if metadata is None:
+        for dirpath, prefix, _, filenames in iter_dirs(root):
+            for fname in filenames:
+                yield FileEntry(Path(dirpath, fname), prefix + fname)
+        return
+
+    meta, data = walk_tree(root)
+    yield from meta if metadata else data
 
-        for fname in filenames:
-            yield FileEntry.from_root(root, dirpath / fname)
 
-        for dname in dirnames:
-            to_visit.append(dirpath / dname)
+def tool_version() -> str:
+    try:
+        return version("ozx-tck")
+    except PackageNotFoundError:
+        return "unknown"
 
 
 def make_zip_comment(version: str, json_first: bool | None = True) -> bytes:
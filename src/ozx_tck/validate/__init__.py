@@ -1,25 +1,81 @@
 from __future__ import annotations
 from argparse import ArgumentParser, Namespace
-from contextlib import AbstractContextManager
+from collections import deque
+from collections.abc import Callable, Generator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import AbstractContextManager, closing
 from dataclasses import dataclass
+from functools import partial
+from itertools import batched
 import json
+import os
 from pathlib import Path
 import sys
-from typing import Self, Sequence
-from zipfile import ZipFile, ZipInfo
+from typing import Any, BinaryIO, Self, Sequence, TextIO
+from zipfile import BadZipFile
 import logging
 
 from ..executor import Executor
-from ..util import State
+from ..profile import NullProfile, Profile
+from ..remote import is_url, location_suffix, open_location, parse_location
+from ..util import EventState, Location, is_metadata
+from ..zipread import (
+    CentralDirectoryEntry,
+    EndOfCentralDirectory,
+    file_size,
+    iter_central_directory,
+    iter_local_headers,
+    read_eocd,
+    read_local_header,
+)
+from .cache import DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES, CachedResult, ResultCache
+from .coverage import CoverageChecker, read_metadata
+from .deep import DeepChecker
+from .discover import DEFAULT_QUEUE_SIZE, iter_archives, iter_bounded
+from .layout import DEFAULT_ALIGN, LayoutAnalyzer
+from .output import WRITERS, EventWriter
 
 logger = logging.getLogger(__name__)
 
+LOCAL_HEADER_BATCH = 4096
+"""Number of entries whose local headers are read and checked together."""
+
+NOT_ZIP64_LIMIT = 100
+"""Maximum number of individual entries to report as not ZIP64."""
+
 
 class Validate(Executor):
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        pool: ProcessPoolExecutor | None = None,
+        caches: dict[Path, ResultCache] | None = None,
+    ) -> None:
+        """By default, events are written to stdout,
+        and a worker pool and cache are opened for each execution.
+
+        A long-lived `pool`, and `caches` by directory,
+        can instead be shared between executions (e.g. by `serve`);
+        they are left open afterwards.
+        """
+        self.stream = stream
+        self.pool = pool
+        self.caches = caches
+
     def populate_parser(self, parser: ArgumentParser):
         super().populate_parser(parser)
         parser.description = "Validate existing OZX files."
-        parser.add_argument("path", nargs="+", type=Path, help="path to an OZX file")
+        parser.add_argument(
+            "path",
+            nargs="+",
+            type=parse_location,
+            help=(
+                "path to an OZX file, or an HTTP(S) URL of one; "
+                "remote files are read with Range requests, "
+                "fetching only the end of central directory and central directory. "
+                "Directories are searched recursively for .ozx and .zip files"
+            ),
+        )
         parser.add_argument(
             "-s", "--strict", action="store_true", help="fail on a warning case"
         )
@@ -29,24 +85,253 @@ class Validate(Executor):
             action="store_true",
             help="exit on the first validation failure",
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help=(
+                "number of archives to validate in parallel, in separate processes; "
+                "0 means one per CPU (default 1)"
+            ),
+        )
+        parser.add_argument(
+            "--queue-size",
+            type=int,
+            default=DEFAULT_QUEUE_SIZE,
+            help=(
+                "maximum number of discovered archives waiting to be validated "
+                f"(default {DEFAULT_QUEUE_SIZE})"
+            ),
+        )
+        parser.add_argument(
+            "--deep",
+            action="store_true",
+            help=(
+                "also check every entry's local header against the central directory, "
+                "and its data against its CRC-32; "
+                "local archives only, and results are not cached"
+            ),
+        )
+        parser.add_argument(
+            "--deep-workers",
+            type=int,
+            help="number of threads for --deep (default one per CPU)",
+        )
+        parser.add_argument(
+            "--layout",
+            action="store_true",
+            help=(
+                "also report advisory findings about reading performance: "
+                "alignment of stored chunk data, "
+                "the proportion of the archive which is metadata, "
+                "and how many seeks loading all metadata needs; "
+                "local archives only"
+            ),
+        )
+        parser.add_argument(
+            "--align",
+            type=int,
+            default=DEFAULT_ALIGN,
+            help=(
+                "expected alignment of entry data for --layout "
+                f"(default {DEFAULT_ALIGN})"
+            ),
+        )
+        parser.add_argument(
+            "--coverage",
+            action="store_true",
+            help=(
+                "also read every array's metadata, "
+                "and check the chunk keys in the archive against its chunk grid: "
+                "keys outside the grid are warnings, "
+                "and missing chunks (which read as the fill value) are summarised"
+            ),
+        )
+        parser.add_argument(
+            "--cache-dir",
+            type=Path,
+            help=(
+                "directory for a persistent cache of results; "
+                "unchanged local archives are not re-validated"
+            ),
+        )
+        parser.add_argument(
+            "--cache-max-entries",
+            type=int,
+            default=DEFAULT_MAX_ENTRIES,
+            help=f"maximum number of cached results (default {DEFAULT_MAX_ENTRIES})",
+        )
+        parser.add_argument(
+            "--cache-max-mb",
+            type=int,
+            default=DEFAULT_MAX_BYTES // 1024**2,
+            help=(
+                "maximum total size of cached results in MiB "
+                f"(default {DEFAULT_MAX_BYTES // 1024**2})"
+            ),
+        )
+        parser.add_argument(
+            "-o",
+            "--output-format",
+            choices=sorted(WRITERS),
+            default="text",
+            help=(
+                "format for events, which are written to stdout as they are produced; "
+                "jsonl and sarif also include per-archive and overall summaries "
+                "(default text)"
+            ),
+        )
 
     def execute(self, args: Namespace):
         super().execute(args)
-        events = []
-        for p in args.path:
-            with Validator(p, args.fail_fast, args.strict) as v:
-                events.extend(v.process())
+        self.cache = None
+        if args.cache_dir is not None and (args.deep or args.layout or args.coverage):
+            logger.warning(
+                "not using cache, "
+                "as results of deep, layout or coverage checks are not cached"
+            )
+        elif args.cache_dir is not None:
+            self.cache = self.open_cache(args)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        stream = sys.stdout if self.stream is None else self.stream
+        self.writer: EventWriter = WRITERS[args.output_format](stream, args.verbose)
+        self.writer.begin()
+        code = None
+        with closing(self.iter_results(args)) as results:
+            for path, (evs, failed) in results:
+                for e in evs:
+                    self.writer.write(e)
+                if failed is not None:
+                    self.writer.write(failed)
+                    code = failed.normalised_level(args.strict)
+                self.writer.end_archive(path)
+        self.close_cache(args)
+
+        if code is None:
+            code = self.writer.exit_code(args.strict)
+        self.writer.end(code)
+        sys.exit(code)
+
+    def open_cache(self, args: Namespace) -> ResultCache:
+        """A new cache, or the shared one for the same directory."""
+        if self.caches is not None and args.cache_dir.resolve() in self.caches:
+            return self.caches[args.cache_dir.resolve()]
+        cache = ResultCache(
+            args.cache_dir, args.cache_max_entries, args.cache_max_mb * 1024**2
+        )
+        if self.caches is not None:
+            self.caches[args.cache_dir.resolve()] = cache
+        return cache
 
-        highest = 0
-        msgs = []
-        for e in events:
-            highest = max(highest, e.level())
-            msgs.append(e.fmt())
+    def close_cache(self, args: Namespace):
+        if self.cache is None:
+            return
+        self.cache.evict()
+        if self.caches is None:
+            self.cache.close()
+        if args.verbose:
+            print(
+                f"cache: {self.cache_hits} hits, {self.cache_misses} misses",
+                file=sys.stderr,
+            )
 
-        if highest == 1 and not args.strict:
-            highest = 0
+    def add_profile(self, report: dict[str, Any] | None):
+        if self.profiling is not None and report is not None:
+            self.profiling.add(report)
+
+    def count_cache(self, hit: bool | None):
+        if hit:
+            self.cache_hits += 1
+        elif hit is not None:
+            self.cache_misses += 1
+
+    def iter_results(
+        self, args: Namespace
+    ) -> Generator[tuple[Location, ValidationResult]]:
+        """Validate every archive, yielding results in input order.
+
+        Directories are walked in a background thread while validation proceeds;
+        with multiple jobs, only a bounded window of archives is in flight.
+        When validating serially, events which do not need to be cached
+        are passed straight to the writer rather than being returned.
+        With fail-fast, iteration stops after the first result with a failure.
+        """
+        run = partial(
+            validate_cached,
+            fail_fast=args.fail_fast,
+            strict=args.strict,
+            cache=self.cache,
+            deep=args.deep,
+            deep_workers=args.deep_workers,
+            layout_align=args.align if args.layout else None,
+            coverage=args.coverage,
+            profile=self.profiling is not None,
+        )
+        paths = iter_bounded(iter_archives(args.path), args.queue_size)
+        jobs: int = args.jobs or os.process_cpu_count() or 1
+
+        if jobs == 1:
+            with closing(paths):
+                for p in paths:
+                    result, hit, report = run(p, on_event=self.writer.write)
+                    self.count_cache(hit)
+                    self.add_profile(report)
+                    yield p, result
+                    if result[1] is not None:
+                        return
+            return
+
+        pool = ProcessPoolExecutor(jobs) if self.pool is None else self.pool
+        window: deque[tuple[int, Location, Future]] = deque()
+
+        def cancel_later(idx: int, fut: Future):
+            """Cancel queued work after a fail-fast failure.
+
+            Work before the failure is left to finish so that the reported failure
+            is the first in input order, as it would be in a serial run.
+            """
+            if fut.cancelled() or fut.exception() is not None:
+                return
+            if fut.result()[0][1] is None:
+                return
+            for later_idx, _, later in list(window):
+                if later_idx > idx:
+                    later.cancel()
+
+        def pop():
+            _, p, fut = window.popleft()
+            result, hit, report = fut.result()
+            self.count_cache(hit)
+            self.add_profile(report)
+            return p, result
 
-        bail(highest, msgs)
+        try:
+            with closing(paths):
+                for idx, p in enumerate(paths):
+                    fut = pool.submit(run, p)
+                    window.append((idx, p, fut))
+                    if args.fail_fast:
+                        fut.add_done_callback(partial(cancel_later, idx))
+                    if len(window) >= 4 * jobs:
+                        p, result = pop()
+                        yield p, result
+                        if result[1] is not None:
+                            return
+
+            while window:
+                p, result = pop()
+                yield p, result
+                if result[1] is not None:
+                    return
+        finally:
+            if pool is self.pool:
+                for _, _, fut in window:
+                    fut.cancel()
+            else:
+                pool.shutdown(wait=False, cancel_futures=True)
 
 
 def bail(code=0, msg: None | str | Sequence[str] = None):
@@ -65,8 +350,16 @@ def maybe_bail(info: tuple[int, str] | None):
 
 
 class BfsChecker:
+    """Track whether a stream of archive names is in breadth-first order.
+
+    Each layer keeps a set of the names seen at that depth
+    and the most recent one,
+    so checking a name is linear in its number of path components.
+    """
+
     def __init__(self) -> None:
-        self.layers: list[list[str]] = []
+        self.layers: list[set[str]] = []
+        self.last: list[str] = []
         self.max_depth = 0
         self.bfs = True
 
@@ -82,31 +375,31 @@ class BfsChecker:
         if not last == "zarr.json":
             return self.bfs
 
-        is_bfs = self.bfs
         # if this element belongs to a layer we've already finished
         if len(elems) < len(self.layers):
             self.bfs = False
             return False
         for idx, elem in enumerate(elems):
             if idx >= len(self.layers):
-                self.layers.append([])
+                self.layers.append(set())
+                self.last.append(elem)
             layer = self.layers[idx]
 
             if elem in layer:
-                if elem != layer[-1]:
-                    is_bfs = False
+                if elem != self.last[idx]:
                     return False
             else:
-                layer.append(elem)
+                layer.add(elem)
+                self.last[idx] = elem
 
-        return is_bfs
+        return self.bfs
 
 
 @dataclass
 class Event:
-    path: Path
+    path: Location
     arcname: str | None
-    state: State
+    state: EventState
     msg: str
 
     def fmt(self) -> str:
@@ -114,7 +407,7 @@ class Event:
 
     def level(self) -> int:
         match self.state:
-            case "valid":
+            case "valid" | "info":
                 return 0
             case "warn":
                 return 1
@@ -128,14 +421,174 @@ class Event:
         return lvl
 
 
+class FailFast(Exception):
+    """Raised by a fail-fast Validator on the first failing event."""
+
+    def __init__(self, event: Event) -> None:
+        super().__init__(event.fmt())
+        self.event = event
+
+
+type ValidationResult = tuple[list[Event], Event | None]
+"""Events for a single archive, and the failing event if it stopped early."""
+
+
+def validate_path(
+    path: Location,
+    fail_fast=False,
+    strict=False,
+    on_event: Callable[[Event], None] | None = None,
+    deep=False,
+    deep_workers: int | None = None,
+    layout_align: int | None = None,
+    coverage=False,
+    profile: Profile | None = None,
+) -> ValidationResult:
+    """Validate a single archive; suitable for running in a worker process.
+
+    If `on_event` is given, events are passed to it rather than returned.
+    """
+    try:
+        validator = Validator(
+            path,
+            fail_fast,
+            strict,
+            on_event,
+            deep,
+            deep_workers,
+            layout_align,
+            coverage,
+            profile,
+        )
+    except OSError as e:
+        # e.g. a missing file, or a server which refuses the connection,
+        # does not have the file, or does not support Range requests
+        return open_failed(path, e, fail_fast, on_event)
+
+    with validator as v:
+        try:
+            return v.process(), None
+        except FailFast as e:
+            return v.events, e.event
+
+
+def open_failed(
+    path: Location,
+    error: OSError,
+    fail_fast=False,
+    on_event: Callable[[Event], None] | None = None,
+) -> ValidationResult:
+    """The result of validating an archive which could not be opened."""
+    event = Event(path, None, "error", f"cannot open archive: {error}")
+    if fail_fast:
+        return [], event
+    if on_event is None:
+        return [event], None
+    on_event(event)
+    return [], None
+
+
+def validate_cached(
+    path: Location,
+    fail_fast=False,
+    strict=False,
+    cache: ResultCache | None = None,
+    on_event: Callable[[Event], None] | None = None,
+    deep=False,
+    deep_workers: int | None = None,
+    layout_align: int | None = None,
+    coverage=False,
+    profile=False,
+) -> tuple[ValidationResult, bool | None, dict[str, Any] | None]:
+    """Validate a single archive, using the cache if given.
+
+    Also returns whether the result came from the cache,
+    or None if the archive could not be cached,
+    and a profile report if `profile` is True.
+    `on_event` is only used for archives which are not cached.
+    """
+    prof = Profile(str(path)) if profile else NullProfile()
+    report = prof.report if profile else lambda: None
+
+    with prof.phase("cache"):
+        key = None if cache is None else cache.key(path, strict, fail_fast)
+    if cache is None or key is None:
+        result = validate_path(
+            path,
+            fail_fast,
+            strict,
+            on_event,
+            deep,
+            deep_workers,
+            layout_align,
+            coverage,
+            prof,
+        )
+        return result, None, report()
+
+    with prof.phase("cache"):
+        cached = cache.get(key)
+    if cached is not None:
+        return result_from_rows(path, cached), True, report()
+
+    result = validate_path(path, fail_fast, strict, profile=prof)
+    with prof.phase("cache"):
+        cache.put(key, result_to_rows(result))
+    return result, False, report()
+
+
+def result_to_rows(result: ValidationResult) -> CachedResult:
+    (events, failed) = result
+    return (
+        [(e.arcname, e.state, e.msg) for e in events],
+        None if failed is None else (failed.arcname, failed.state, failed.msg),
+    )
+
+
+def result_from_rows(path: Location, rows: CachedResult) -> ValidationResult:
+    (events, failed) = rows
+    return (
+        [Event(path, *e) for e in events],  # type: ignore[arg-type]
+        None if failed is None else Event(path, *failed),  # type: ignore[arg-type]
+    )
+
+
 class Validator(AbstractContextManager):
-    def __init__(self, path: Path, fail_fast=False, strict=False):
+    def __init__(
+        self,
+        path: Location,
+        fail_fast=False,
+        strict=False,
+        on_event: Callable[[Event], None] | None = None,
+        deep=False,
+        deep_workers: int | None = None,
+        layout_align: int | None = None,
+        coverage=False,
+        profile: Profile | None = None,
+    ):
+        """If `layout_align` is given, layout is analysed with that alignment.
+
+        If `coverage`, chunk keys are checked against arrays' metadata.
+
+        If `profile` is given, time spent in each phase is recorded in it.
+        """
         self.path = path
-        self.zf = ZipFile(self.path)
+        self.profile = NullProfile() if profile is None else profile
+        self.fp: BinaryIO = open_location(self.path)
+        self.eocd: EndOfCentralDirectory | None = None
+
+        # reading local headers from a remote file would need a request per entry
+        self.check_local_headers = not is_url(self.path)
         self.fail_fast = fail_fast
         self.strict = strict
+        self.on_event = on_event
+        self.deep = deep
+        self.deep_workers = deep_workers
+        self.layout_align = layout_align
+        self.coverage = coverage
 
         self.events: list[Event] = []
+        self.not_zip64 = 0
 
     def finish(self):
         highest = 0
@@ -158,7 +611,7 @@ class Validator(AbstractContextManager):
         self.close()
         bail(lvl, msg)
 
-    def add_event(self, state: State, msg: str, arcname: str | None = None):
+    def add_event(self, state: EventState, msg: str, arcname: str | None = None):
         if state == "valid":
             return
 
@@ -166,11 +619,15 @@ class Validator(AbstractContextManager):
         logger.debug("got event %s", event)
         lvl = event.normalised_level(self.strict)
         if self.fail_fast and lvl:
-            self.exit(lvl, event.fmt())
-        self.events.append(event)
+            raise FailFast(event)
+        if self.on_event is None:
+            self.events.append(event)
+        else:
+            self.on_event(event)
 
     def process_comment(self):
-        comment = self.zf.comment
+        assert self.eocd is not None
+        comment = self.eocd.comment
         try:
             d: dict = json.loads(comment)
         except json.JSONDecodeError:
@@ -201,28 +658,72 @@ class Validator(AbstractContextManager):
 
     def process(self):
         logger.info("validating %s", self.path)
-        if self.path.suffix != ".ozx":
+        if location_suffix(self.path) != ".ozx":
             self.add_event("warn", "does not end in .ozx")
 
-        expect_sorted = self.process_comment()
+        try:
+            with self.profile.phase("eocd"):
+                self.eocd = read_eocd(self.fp)
+        except BadZipFile as e:
+            self.add_event("error", f"not a readable ZIP archive: {e}")
+            return self.events
+
+        if self.eocd.multipart:
+            self.add_event("error", "multi-part archive")
+            return self.events
+
+        with self.profile.phase("comment"):
+            expect_sorted = self.process_comment()
         bfs = None
         if expect_sorted:
             bfs = BfsChecker()
         has_root_zarr_json = False
 
         non_zarr_json = False
+        phase = self.profile.phase
+        entries = self.profile.timed(
+            "central_directory", iter_central_directory(self.fp, self.eocd)
+        )
+        # entries whose local headers must be read to tell whether they use ZIP64
+        pending: list[CentralDirectoryEntry] = []
+        unchecked = 0
 
-        for info in self.zf.infolist():
-            logger.debug("processing file %s", info.filename)
-            if info.filename == "zarr.json":
-                has_root_zarr_json = True
-                if non_zarr_json and bfs is not None:
-                    self.add_event("error", "should be JSON first but isn't")
-            else:
-                non_zarr_json = True
-            self.process_info(info)
-            if bfs is not None:
-                bfs.is_bfs_order(info.filename)
+        try:
+            for entry in entries:
+                self.profile.count("entries")
+                logger.debug("processing file %s", entry.filename)
+                if entry.filename == "zarr.json":
+                    has_root_zarr_json = True
+                    if non_zarr_json and bfs is not None:
+                        self.add_event("error", "should be JSON first but isn't")
+                else:
+                    non_zarr_json = True
+                with phase("process_info"):
+                    self.process_info(entry)
+                if not entry.zip64 and not self.check_local_headers:
+                    unchecked += 1
+                elif not entry.zip64:
+                    pending.append(entry)
+                    if len(pending) >= LOCAL_HEADER_BATCH:
+                        with phase("zip64"):
+                            self.check_zip64(pending)
+                        pending.clear()
+                if bfs is not None:
+                    with phase("bfs"):
+                        bfs.is_bfs_order(entry.filename)
+        except BadZipFile as e:
+            self.add_event("error", f"corrupt central directory: {e}")
+
+        with phase("zip64"):
+            self.check_zip64(pending)
+        if self.not_zip64 > NOT_ZIP64_LIMIT:
+            self.add_event("warn", f"{self.not_zip64} entries are not ZIP64")
+        if unchecked:
+            self.add_event(
+                "info",
+                f"{unchecked} entries may not be ZIP64: "
+                "local headers of remote archives are not checked",
+            )
 
         if bfs is not None and not bfs.bfs:
             self.add_event("error", "should be BFS but isn't")
@@ -230,20 +731,139 @@ class Validator(AbstractContextManager):
         if not has_root_zarr_json:
             self.add_event("error", "missing root metadata", "zarr.json")
 
+        if self.deep:
+            with phase("deep"):
+                self.process_deep()
+
+        if self.layout_align is not None:
+            with phase("layout"):
+                self.process_layout(self.layout_align)
+
+        if self.coverage:
+            with phase("coverage"):
+                self.process_coverage()
+
         return self.events
 
-    def process_info(self, info: ZipInfo):
-        if info.compress_type != 0:
-            self.add_event("warn", "zip compressed", info.filename)
+    def process_coverage(self):
+        """Report missing and orphaned chunks from a CoverageChecker.
 
-        elems = info.filename.lower().rsplit(".", 1)
-        if len(elems) > 1 and elems[-1] in ("zip", "ozx"):
-            self.add_event("error", "probably contains archive", info.filename)
+        The central directory is read twice:
+        once to find and fetch metadata, and once to check chunk keys.
+        """
+        assert self.eocd is not None
+        checker = CoverageChecker()
+        try:
+            metadata = [
+                e
+                for e in iter_central_directory(self.fp, self.eocd)
+                if is_metadata(e.filename)
+            ]
+            for entry, data in read_metadata(self.fp, metadata, self.eocd.concat):
+                checker.add_metadata(entry.filename, data)
+            if checker.arrays:
+                for entry in iter_central_directory(self.fp, self.eocd):
+                    checker.add_name(entry.filename)
+        except BadZipFile:
+            # already reported while processing the central directory
+            return
+
+        for state, msg, arcname in checker.summarise():
+            self.add_event(state, msg, arcname)
+
+    def process_layout(self, align: int):
+        """Report advisory findings from a LayoutAnalyzer."""
+        assert self.eocd is not None
+        if is_url(self.path):
+            logger.warning("cannot analyse layout of remote archive %s", self.path)
+            return
 
-        # TODO: test for ZIP64?
+        analyzer = LayoutAnalyzer(file_size(self.fp), align)
+        concat = self.eocd.concat
+        entries = iter_central_directory(self.fp, self.eocd)
+        try:
+            for batch in batched(entries, LOCAL_HEADER_BATCH):
+                for entry, local in iter_local_headers(self.fp, batch, concat):
+                    if local is None:
+                        try:
+                            local = read_local_header(self.fp, entry, concat)
+                        except BadZipFile:
+                            # already reported while processing the central directory
+                            continue
+                    analyzer.add(entry, local)
+        except BadZipFile:
+            return
+
+        for msg, arcname in analyzer.summarise():
+            self.add_event("info", msg, arcname)
+
+    def process_deep(self):
+        """Check local headers and entry data with a DeepChecker."""
+        assert self.eocd is not None
+        if is_url(self.path):
+            logger.warning("cannot deep check remote archive %s", self.path)
+            return
+
+        checker = DeepChecker(self.fp, self.eocd.concat, self.deep_workers)
+        results = checker.check(iter_central_directory(self.fp, self.eocd))
+        try:
+            for entry, problems in results:
+                for problem in problems:
+                    self.add_event("error", problem, entry.filename)
+        except BadZipFile:
+            # already reported while processing the central directory
+            pass
+        finally:
+            results.close()
+            checker.close()
+
+        stats = checker.stats
+        self.profile.count("deep_checked_bytes", stats.checked_bytes)
+        logger.info(
+            "deep checked %s entries (%.3f GB) of %s in %.3fs: %.2f GB/s",
+            stats.entries,
+            stats.checked_bytes / 1e9,
+            self.path,
+            stats.seconds,
+            stats.gb_per_s,
+        )
+
+    def process_info(self, entry: CentralDirectoryEntry):
+        if entry.compress_type != 0:
+            self.add_event("warn", "zip compressed", entry.filename)
+
+        elems = entry.filename.lower().rsplit(".", 1)
+        if len(elems) > 1 and elems[-1] in ("zip", "ozx"):
+            self.add_event("error", "probably contains archive", entry.filename)
+
+    def check_zip64(self, entries: list[CentralDirectoryEntry]):
+        """Warn about entries whose local headers do not use ZIP64 either.
+
+        Writers (including python's zipfile) often only add the ZIP64 extra field
+        to the central directory when it is required,
+        so the local headers of entries without it there are checked,
+        in batches read in offset order.
+        Local headers of remote archives are not checked,
+        as that would need a request for each entry which is not stored densely.
+        Only the first `NOT_ZIP64_LIMIT` such entries are reported individually.
+        """
+        assert self.eocd is not None
+        concat = self.eocd.concat
+        for entry, local in iter_local_headers(self.fp, entries, concat):
+            if local is None:
+                try:
+                    local = read_local_header(self.fp, entry, concat)
+                except BadZipFile as e:
+                    msg = f"bad local file header: {e}"
+                    self.add_event("error", msg, entry.filename)
+                    continue
+            if not local.zip64:
+                self.not_zip64 += 1
+                if self.not_zip64 <= NOT_ZIP64_LIMIT:
+                    self.add_event("warn", "not ZIP64", entry.filename)
 
     def close(self):
-        self.zf.close()
+        self.fp.close()
 
     def __enter__(self) -> Self:
         return self
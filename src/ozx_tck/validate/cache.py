@@ -0,0 +1,217 @@
+"""On-disk cache of validation results, so unchanged archives are not re-scanned."""
+
+from __future__ import annotations
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from zipfile import BadZipFile
+import logging
+
+from ..util import Location, tool_version
+from ..zipread import DEFAULT_BUFSIZE, file_size, pread, read_eocd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_BYTES = 256 * 1024**2
+CORRUPT_TAIL = 64 * 1024
+"""Bytes hashed from the end of files whose central directory cannot be found."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT NOT NULL,
+    strict INTEGER NOT NULL,
+    fail_fast INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    tail_hash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (path, strict, fail_fast)
+)
+"""
+
+type EventRow = tuple[str | None, str, str]
+"""Archive name, state and message of an event."""
+
+type CachedResult = tuple[list[EventRow], EventRow | None]
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    path: str
+    strict: bool
+    fail_fast: bool
+    size: int
+    mtime_ns: int
+    tail_hash: str
+
+
+def tail_hash(path: Path, bufsize: int = DEFAULT_BUFSIZE) -> str:
+    """Hash everything from the start of the central directory to the end of the file.
+
+    This covers the central directory, ZIP64 records, EOCD and comment,
+    which are all a Validator looks at.
+    If the end of central directory cannot be found,
+    only the last `CORRUPT_TAIL` bytes are hashed;
+    the size and mtime in the key cover the rest.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        end = file_size(f)
+        try:
+            start = read_eocd(f).cd_start
+        except BadZipFile:
+            start = max(end - CORRUPT_TAIL, 0)
+        while start < end:
+            b = pread(f, start, min(bufsize, end - start))
+            if not b:
+                break
+            h.update(b)
+            start += len(b)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed store of validation results.
+
+    Results are keyed on the file's absolute path and the strict/fail-fast settings,
+    and are only returned if the file's size, mtime, tail hash
+    and the tool version all match.
+    Least-recently-used results are evicted to keep within the entry and size limits.
+
+    The connection is opened lazily, so instances can be sent to worker processes,
+    and is shared between threads, one statement at a time.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = tool_version()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def db_path(self) -> Path:
+        return self.cache_dir / "validate.sqlite"
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.db_path, timeout=60, autocommit=True, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def key(self, location: Location, strict: bool, fail_fast: bool) -> CacheKey | None:
+        """Returns None for locations which cannot be cached, e.g. URLs."""
+        if not isinstance(location, Path):
+            return None
+        try:
+            stat = location.stat()
+            digest = tail_hash(location)
+        except OSError:
+            return None
+        return CacheKey(
+            os.path.abspath(location),
+            strict,
+            fail_fast,
+            stat.st_size,
+            stat.st_mtime_ns,
+            digest,
+        )
+
+    def get(self, key: CacheKey) -> CachedResult | None:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, tail_hash, version, result FROM results "
+                "WHERE path = ? AND strict = ? AND fail_fast = ?",
+                (key.path, key.strict, key.fail_fast),
+            ).fetchone()
+            if row is None:
+                return None
+            if tuple(row[:4]) != (key.size, key.mtime_ns, key.tail_hash, self.version):
+                logger.debug("stale cache entry for %s", key.path)
+                return None
+
+            self.conn.execute(
+                "UPDATE results SET last_used = ? "
+                "WHERE path = ? AND strict = ? AND fail_fast = ?",
+                (time.time_ns(), key.path, key.strict, key.fail_fast),
+            )
+            d = json.loads(row[4])
+            events = [tuple(e) for e in d["events"]]
+            failed = tuple(d["failed"]) if d["failed"] is not None else None
+            return events, failed  # type: ignore[return-value]
+
+    def put(self, key: CacheKey, result: CachedResult):
+        with self._lock:
+            events, failed = result
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key.path,
+                    key.strict,
+                    key.fail_fast,
+                    key.size,
+                    key.mtime_ns,
+                    key.tail_hash,
+                    self.version,
+                    json.dumps({"events": events, "failed": failed}),
+                    time.time_ns(),
+                ),
+            )
+
+    def evict(self):
+        """Delete least-recently-used results until within the limits."""
+        with self._lock:
+            (count, total) = self.conn.execute(
+                "SELECT count(*), coalesce(sum(length(result)), 0) FROM results"
+            ).fetchone()
+            if count <= self.max_entries and total <= self.max_bytes:
+                return
+
+            to_delete = []
+            for rowid, nbytes in self.conn.execute(
+                "SELECT rowid, length(result) FROM results ORDER BY last_used ASC"
+            ):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                to_delete.append((rowid,))
+                count -= 1
+                total -= nbytes
+
+            logger.info("evicting %s cached results", len(to_delete))
+            self.conn.executemany("DELETE FROM results WHERE rowid = ?", to_delete)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
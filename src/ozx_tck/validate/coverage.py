@@ -0,0 +1,307 @@
+"""Structural checks of the chunk keys in an archive against its arrays' metadata.
+
+Metadata documents are fetched in as few reads as possible,
+and the expected chunk keys of each array follow from its
+`shape`, `chunk_grid` and `chunk_key_encoding`.
+Rather than building the set of expected keys,
+the keys present in each array are recorded in a bitmap over its chunk grid,
+so memory is one bit per chunk and arrays can have tens of millions of them.
+Keys which do not map into the grid are orphaned;
+unset bits are missing chunks, which readers fill with the fill value.
+"""
+
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+import json
+import math
+import re
+from typing import Any, BinaryIO
+from zipfile import BadZipFile
+import logging
+
+from ..util import EventState, is_metadata
+from ..zipread import (
+    LOCAL_HEADER,
+    CentralDirectoryEntry,
+    decompress_entry,
+    group_reads,
+    parse_local_header,
+    pread,
+    read_entry,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 100
+"""Maximum number of individual orphaned keys to report."""
+
+MISSING_EXAMPLES = 5
+"""Number of missing chunk keys to name in each array's summary."""
+
+MAX_CHUNKS = 1 << 31
+"""Arrays with more chunks than this (a 256 MiB bitmap) are not checked."""
+
+READ_GAP = 1024**2
+"""Metadata entries less than this far apart are fetched in the same read."""
+
+READ_MAX = 16 * 1024**2
+"""Maximum size of a read fetching several metadata entries."""
+
+READ_SLACK = 1024
+"""Allowance for local header extra fields when fetching metadata."""
+
+INCOMPLETE_BYTE = re.compile(rb"[^\xff]")
+"""Bytes of a bitmap with any chunk missing."""
+
+type CoverageFinding = tuple[EventState, str, str | None]
+"""State, message and archive name of a finding."""
+
+
+def read_metadata(
+    f: BinaryIO, entries: Iterable[CentralDirectoryEntry], concat: int = 0
+) -> Iterator[tuple[CentralDirectoryEntry, bytes]]:
+    """Contents of metadata entries, in archive order.
+
+    Entries close together (as they are when metadata is stored first)
+    are fetched with a single read, of up to `READ_MAX` bytes.
+    Entries which cannot be read are skipped,
+    as they are reported while processing the central directory.
+    """
+    for run, run_end in group_reads(entries, end_estimate, READ_GAP, READ_MAX):
+        offset = run[0].header_offset + concat
+        buf = pread(f, offset, run_end + concat - offset)
+        for entry in run:
+            try:
+                yield entry, read_buffered(f, buf, offset, entry, concat)
+            except (BadZipFile, OSError, ValueError) as e:
+                logger.debug("cannot read %s: %s", entry.filename, e)
+
+
+def end_estimate(entry: CentralDirectoryEntry) -> int:
+    """Offset beyond the end of an entry's data, unless its extra field is large."""
+    return (
+        entry.header_offset
+        + LOCAL_HEADER.size
+        + len(entry.filename.encode())
+        + READ_SLACK
+        + entry.compress_size
+    )
+
+
+def read_buffered(
+    f: BinaryIO, buf: bytes, offset: int, entry: CentralDirectoryEntry, concat: int
+) -> bytes:
+    """Contents of an entry from a buffer read at `offset`, or from the file."""
+    pos = entry.header_offset + concat - offset
+    try:
+        local = parse_local_header(buf, pos, pos + offset)
+    except BadZipFile:
+        # e.g. padded beyond the buffer; read_entry reports real corruption
+        return read_entry(f, entry, concat)
+    start = local.data_offset - offset
+    end = start + entry.compress_size
+    if end > len(buf):
+        return read_entry(f, entry, concat)
+    return decompress_entry(memoryview(buf)[start:end], entry.compress_type)
+
+
+@dataclass
+class ArrayCoverage:
+    """Which chunks of an array are present, as a bitmap over its chunk grid."""
+
+    path: str
+    grid: tuple[int, ...]
+    encoding: str
+    separator: str
+    present: bytearray = field(repr=False)
+
+    n_present: int = 0
+    n_orphaned: int = 0
+
+    @classmethod
+    def from_metadata(cls, path: str, meta: dict[str, Any]) -> ArrayCoverage:
+        """Raises ValueError if the chunk grid or key encoding are not supported."""
+        try:
+            shape = [int(s) for s in meta["shape"]]
+            grid = meta["chunk_grid"]
+            encoding = meta.get("chunk_key_encoding", {"name": "default"})
+            if grid["name"] != "regular":
+                raise ValueError(f"unsupported chunk grid {grid['name']!r}")
+            chunks = [int(c) for c in grid["configuration"]["chunk_shape"]]
+            name = encoding["name"]
+            default_sep = {"default": "/", "v2": "."}.get(name)
+            if default_sep is None:
+                raise ValueError(f"unsupported chunk key encoding {name!r}")
+            separator = encoding.get("configuration", {}).get("separator", default_sep)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"malformed array metadata: {e!r}") from e
+        if len(chunks) != len(shape) or any(c < 1 for c in chunks):
+            raise ValueError("chunk shape does not match array shape")
+
+        n_grid = tuple(math.ceil(s / c) for s, c in zip(shape, chunks))
+        n_chunks = math.prod(n_grid)
+        if n_chunks > MAX_CHUNKS:
+            raise ValueError(f"too many chunks to check ({n_chunks})")
+        return cls(path, n_grid, name, separator, bytearray((n_chunks + 7) // 8))
+
+    @property
+    def prefix(self) -> str:
+        return self.path + "/" if self.path else ""
+
+    @property
+    def n_chunks(self) -> int:
+        return math.prod(self.grid)
+
+    def parse_key(self, key: str) -> int | None:
+        """Position in the chunk grid of a chunk key, if it is valid."""
+        if self.encoding == "default":
+            if key == "c":
+                parts = []
+            elif key.startswith("c" + self.separator):
+                parts = key[2:].split(self.separator)
+            else:
+                return None
+        elif not self.grid and key == "0":
+            parts = []
+        else:
+            parts = key.split(self.separator)
+        if len(parts) != len(self.grid):
+            return None
+
+        idx = 0
+        for part, n in zip(parts, self.grid):
+            # digits only, without leading zeros
+            if not (part.isascii() and part.isdigit()) or (
+                part[0] == "0" and len(part) > 1
+            ):
+                return None
+            coord = int(part)
+            if coord >= n:
+                return None
+            idx = idx * n + coord
+        return idx
+
+    def chunk_key(self, idx: int) -> str:
+        coords = []
+        for n in reversed(self.grid):
+            idx, coord = divmod(idx, n)
+            coords.append(str(coord))
+        parts = coords[::-1]
+        if self.encoding == "default":
+            parts.insert(0, "c")
+        elif not parts:
+            parts = ["0"]
+        return self.separator.join(parts)
+
+    def add(self, key: str) -> bool:
+        """Record a key as present; returns whether it is a chunk of this array."""
+        idx = self.parse_key(key)
+        if idx is None:
+            self.n_orphaned += 1
+            return False
+        byte, bit = divmod(idx, 8)
+        if not self.present[byte] & 1 << bit:
+            self.present[byte] |= 1 << bit
+            self.n_present += 1
+        return True
+
+    def iter_missing(self) -> Iterator[int]:
+        """Positions of missing chunks, in order."""
+        n = self.n_chunks
+        for m in INCOMPLETE_BYTE.finditer(self.present):
+            bits = self.present[m.start()]
+            for bit in range(8):
+                idx = m.start() * 8 + bit
+                if idx >= n:
+                    return
+                if not bits & 1 << bit:
+                    yield idx
+
+
+@dataclass
+class CoverageChecker:
+    """Accumulates arrays' metadata and chunk keys, and summarises coverage."""
+
+    limit: int = DEFAULT_LIMIT
+
+    arrays: dict[str, ArrayCoverage] = field(default_factory=dict)
+    findings: list[CoverageFinding] = field(default_factory=list)
+    orphaned: int = 0
+
+    _last: ArrayCoverage | None = field(default=None, init=False, repr=False)
+
+    def add_metadata(self, name: str, data: bytes):
+        path = name.rsplit("/", 1)[0] if "/" in name else ""
+        try:
+            meta = json.loads(data)
+        except ValueError as e:
+            self.findings.append(("warn", f"cannot parse metadata: {e}", name))
+            return
+        if not isinstance(meta, dict) or meta.get("node_type") != "array":
+            return
+        try:
+            self.arrays[path] = ArrayCoverage.from_metadata(path, meta)
+        except ValueError as e:
+            self.findings.append(("info", f"cannot check chunks: {e}", name))
+
+    def owner(self, name: str) -> ArrayCoverage | None:
+        """The array an entry is below, if any."""
+        last = self._last
+        if last is not None and name.startswith(last.prefix):
+            return last
+        pos = len(name)
+        while (pos := name.rfind("/", 0, pos)) != -1:
+            array = self.arrays.get(name[:pos])
+            if array is not None:
+                self._last = array
+                return array
+        array = self.arrays.get("")
+        if array is not None:
+            self._last = array
+        return array
+
+    def add_name(self, name: str):
+        if not self.arrays or is_metadata(name) or name.endswith("/"):
+            return
+        array = self.owner(name)
+        if array is None or array.add(name[len(array.prefix) :]):
+            return
+        self.orphaned += 1
+        if self.orphaned <= self.limit:
+            self.findings.append(
+                (
+                    "warn",
+                    f"not a chunk key of array {array.path or '/'!r}",
+                    name,
+                )
+            )
+
+    def summarise(self) -> list[CoverageFinding]:
+        findings = list(self.findings)
+        if self.orphaned > self.limit:
+            findings.append(
+                (
+                    "warn",
+                    f"{self.orphaned} entries below arrays are not chunk keys",
+                    None,
+                )
+            )
+        for path, array in sorted(self.arrays.items()):
+            missing = array.n_chunks - array.n_present
+            if not missing:
+                continue
+            examples = [
+                array.prefix + array.chunk_key(idx)
+                for _, idx in zip(range(MISSING_EXAMPLES), array.iter_missing())
+            ]
+            more = ", ..." if missing > len(examples) else ""
+            findings.append(
+                (
+                    "info",
+                    f"{missing} of {array.n_chunks} chunks missing "
+                    f"(read as fill value): {', '.join(examples)}{more}",
+                    array.prefix + "zarr.json",
+                )
+            )
+        return findings
@@ -0,0 +1,176 @@
+"""Deep integrity checks of entry data against the central directory.
+
+The archive is memory-mapped and entries are checked in batches by a thread pool;
+zlib releases the GIL while computing checksums and inflating,
+and memoryview slices of the map avoid copying entry data.
+"""
+
+from __future__ import annotations
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import mmap
+import os
+import time
+from typing import BinaryIO
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile
+import zlib
+import logging
+
+from ..zipread import UTF8_FLAG, CentralDirectoryEntry, parse_local_header
+
+logger = logging.getLogger(__name__)
+
+DATA_DESCRIPTOR_FLAG = 0x08
+INFLATE_CHUNK = 4 * 1024**2
+
+BATCH_BYTES = 16 * 1024**2
+"""Entries are grouped into batches of about this much data for each task."""
+BATCH_ENTRIES = 1024
+
+type EntryProblems = tuple[CentralDirectoryEntry, list[str]]
+
+
+@dataclass
+class DeepStats:
+    entries: int = 0
+    checked_bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def gb_per_s(self) -> float:
+        if not self.seconds:
+            return 0.0
+        return self.checked_bytes / self.seconds / 1e9
+
+
+def inflate_crc(data: memoryview) -> tuple[int, int]:
+    """CRC-32 and length of raw deflate data, inflated in bounded chunks."""
+    d = zlib.decompressobj(-zlib.MAX_WBITS)
+    crc = 0
+    size = 0
+    for start in range(0, len(data), INFLATE_CHUNK):
+        buf: bytes | memoryview = data[start : start + INFLATE_CHUNK]
+        while buf:
+            out = d.decompress(buf, INFLATE_CHUNK)
+            crc = zlib.crc32(out, crc)
+            size += len(out)
+            buf = d.unconsumed_tail
+    out = d.flush()
+    return zlib.crc32(out, crc), size + len(out)
+
+
+class DeepChecker:
+    """Check local headers and CRC-32s of entries in a local archive."""
+
+    def __init__(
+        self, fp: BinaryIO, concat: int = 0, workers: int | None = None
+    ) -> None:
+        self.concat = concat
+        self.workers = workers or os.process_cpu_count() or 1
+        self.mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+        self.stats = DeepStats()
+
+    def check_entry(self, entry: CentralDirectoryEntry) -> list[str]:
+        try:
+            local = parse_local_header(self.view, entry.header_offset + self.concat)
+        except BadZipFile as e:
+            return [f"bad local file header: {e}"]
+
+        problems = []
+        encoding = "utf-8" if entry.flag_bits & UTF8_FLAG else "cp437"
+        mismatched = []
+        if local.filename != entry.filename.encode(encoding):
+            mismatched.append("name")
+        if local.compress_type != entry.compress_type:
+            mismatched.append("compression method")
+        if not local.flag_bits & DATA_DESCRIPTOR_FLAG:
+            if local.crc != entry.crc:
+                mismatched.append("CRC-32")
+            if local.compress_size != entry.compress_size:
+                mismatched.append("compressed size")
+            if local.file_size != entry.file_size:
+                mismatched.append("uncompressed size")
+        if mismatched:
+            problems.append(
+                "local header does not match central directory: "
+                + ", ".join(mismatched)
+            )
+
+        end = local.data_offset + entry.compress_size
+        if end > len(self.view):
+            problems.append("entry data extends past end of file")
+            return problems
+
+        with self.view[local.data_offset : end] as data:
+            if entry.compress_type == ZIP_STORED:
+                crc = zlib.crc32(data)
+                size = len(data)
+            elif entry.compress_type == ZIP_DEFLATED:
+                try:
+                    crc, size = inflate_crc(data)
+                except zlib.error as e:
+                    problems.append(f"could not inflate data: {e}")
+                    return problems
+            else:
+                logger.debug(
+                    "cannot check data with compression method %s",
+                    entry.compress_type,
+                )
+                return problems
+
+        if size != entry.file_size:
+            problems.append("data length does not match central directory")
+        if crc != entry.crc:
+            problems.append("CRC-32 mismatch")
+        return problems
+
+    def check_batch(self, batch: list[CentralDirectoryEntry]) -> list[EntryProblems]:
+        return [(entry, self.check_entry(entry)) for entry in batch]
+
+    def iter_batches(
+        self, entries: Iterable[CentralDirectoryEntry]
+    ) -> Iterator[list[CentralDirectoryEntry]]:
+        batch: list[CentralDirectoryEntry] = []
+        nbytes = 0
+        for entry in entries:
+            batch.append(entry)
+            nbytes += entry.compress_size
+            if nbytes >= BATCH_BYTES or len(batch) >= BATCH_ENTRIES:
+                yield batch
+                batch = []
+                nbytes = 0
+        if batch:
+            yield batch
+
+    def check(
+        self, entries: Iterable[CentralDirectoryEntry]
+    ) -> Iterator[EntryProblems]:
+        """Check entries in parallel, yielding problems for each in input order.
+
+        Only a bounded number of batches is in flight at once,
+        so memory use does not depend on the number of entries.
+        """
+        start = time.perf_counter()
+        pending: deque[Future[list[EntryProblems]]] = deque()
+        with ThreadPoolExecutor(self.workers) as pool:
+            for batch in self.iter_batches(entries):
+                pending.append(pool.submit(self.check_batch, batch))
+                if len(pending) >= 2 * self.workers:
+                    yield from self._collect(pending.popleft())
+            while pending:
+                yield from self._collect(pending.popleft())
+        self.stats.seconds += time.perf_counter() - start
+
+    def _collect(self, fut: Future[list[EntryProblems]]) -> list[EntryProblems]:
+        results = fut.result()
+        for entry, _ in results:
+            self.stats.entries += 1
+            self.stats.checked_bytes += entry.compress_size
+        return results
+
+    def close(self):
+        self.view.release()
+        self.mm.close()
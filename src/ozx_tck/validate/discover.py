@@ -0,0 +1,109 @@
+"""Discovery of archives to validate, which can overlap with validation."""
+
+from __future__ import annotations
+from collections.abc import Generator, Iterable, Iterator
+from itertools import chain, islice
+import os
+from pathlib import Path
+from queue import Full, Queue
+from threading import Event, Thread
+import logging
+
+from ..remote import is_url
+from ..util import Location
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (".ozx", ".zip")
+DEFAULT_QUEUE_SIZE = 1024
+POLL_SECONDS = 0.1
+SORT_LIMIT = 100_000
+"""Directories with up to this many entries are listed in sorted order."""
+
+
+def iter_archives(
+    locations: Iterable[Location], suffixes: tuple[str, ...] = ARCHIVE_SUFFIXES
+) -> Iterator[Location]:
+    """Yield locations, replacing directories with the archives below them.
+
+    Directories are walked depth-first with `os.scandir`.
+    Listings of up to `SORT_LIMIT` entries are sorted,
+    so that the result is deterministic;
+    larger directories are yielded in the order the file system lists them,
+    so that memory does not grow with their size.
+    Symlinked directories are not followed.
+    """
+    for location in locations:
+        if is_url(location) or not Path(location).is_dir():
+            yield location
+            continue
+
+        stack = [os.fspath(location)]
+        while stack:
+            dirpath = stack.pop()
+            subdirs = []
+            try:
+                with os.scandir(dirpath) as it:
+                    first = list(islice(it, SORT_LIMIT + 1))
+                    if len(first) <= SORT_LIMIT:
+                        entries: Iterable[os.DirEntry] = sorted(
+                            first, key=lambda e: e.name
+                        )
+                    else:
+                        logger.info("not sorting large directory %s", dirpath)
+                        entries = chain(first, it)
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(suffixes) and entry.is_file():
+                            yield Path(entry.path)
+            except OSError as e:
+                logger.warning("could not list directory %s: %s", dirpath, e)
+            stack.extend(reversed(subdirs))
+
+
+def iter_bounded[T](
+    items: Iterable[T], maxsize: int = DEFAULT_QUEUE_SIZE
+) -> Generator[T]:
+    """Iterate over `items` in a background thread, through a bounded queue.
+
+    Producing items (e.g. walking a directory tree) overlaps with consuming them,
+    while at most `maxsize` items are held at once.
+    Exceptions raised by the producer are re-raised in the consumer.
+    Closing the iterator stops the producer.
+    """
+    q: Queue[tuple[bool, object]] = Queue(maxsize)
+    stop = Event()
+
+    def put(item: tuple[bool, object]) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((False, item)):
+                    return
+        except BaseException as e:
+            put((True, e))
+            return
+        put((True, None))
+
+    thread = Thread(target=produce, daemon=True, name="ozx-tck-discover")
+    thread.start()
+    try:
+        while True:
+            done, value = q.get()
+            if done:
+                if value is not None:
+                    raise value  # type: ignore[misc]
+                return
+            yield value  # type: ignore[misc]
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,130 @@
+"""Analysis of how efficiently an archive's entries can be read.
+
+Findings are advisory: they do not make an archive invalid,
+but they predict how well readers which memory-map chunk data
+or load metadata up front will perform.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+
+from ..util import is_metadata
+from ..zipread import CentralDirectoryEntry, LocalHeader
+
+DEFAULT_ALIGN = 4096
+DEFAULT_LIMIT = 100
+"""Maximum number of individual misaligned chunks to report."""
+
+type Finding = tuple[str, str | None]
+"""Message and archive name of an advisory finding."""
+
+
+def bfs_key(name: str) -> tuple[int, list[str]]:
+    """Sort key which puts archive names in breadth-first order."""
+    parts = name.split("/")
+    return (len(parts), parts)
+
+
+@dataclass
+class LayoutAnalyzer:
+    """Accumulates per-entry layout information and summarises it."""
+
+    archive_size: int
+    align: int = DEFAULT_ALIGN
+    limit: int = DEFAULT_LIMIT
+
+    stored: int = 0
+    """Stored chunks which are large enough to be aligned."""
+    misaligned: int = 0
+    metadata_bytes: int = 0
+    chunk_bytes: int = 0
+    padding_bytes: int = 0
+    findings: list[Finding] = field(default_factory=list)
+
+    metadata_spans: list[tuple[tuple[int, list[str]], int, int]] = field(
+        default_factory=list
+    )
+    """BFS key, start and end offsets of each metadata entry, header included."""
+
+    def add(self, entry: CentralDirectoryEntry, local: LocalHeader):
+        """Only stored chunks of at least `align` bytes are checked for alignment:
+        metadata is parsed rather than memory-mapped,
+        and smaller chunks could not fill a whole block anyway.
+        """
+        self.padding_bytes += local.padding
+        if is_metadata(entry.filename):
+            self.metadata_bytes += entry.compress_size
+            self.metadata_spans.append(
+                (
+                    bfs_key(entry.filename),
+                    local.offset,
+                    local.data_offset + entry.compress_size,
+                )
+            )
+            return
+
+        self.chunk_bytes += entry.compress_size
+        if entry.compress_type != 0 or entry.compress_size < max(self.align, 1):
+            return
+        self.stored += 1
+        if local.data_offset % self.align:
+            self.misaligned += 1
+            if self.misaligned <= self.limit:
+                self.findings.append(
+                    (
+                        f"data at offset {local.data_offset} "
+                        f"is not aligned to {self.align} bytes",
+                        entry.filename,
+                    )
+                )
+
+    def metadata_seeks(self) -> int:
+        """Number of discontiguous reads needed to load all metadata in BFS order."""
+        seeks = 0
+        last_end = None
+        for _, start, end in sorted(self.metadata_spans):
+            if start != last_end:
+                seeks += 1
+            last_end = end
+        return seeks
+
+    def summarise(self) -> list[Finding]:
+        findings = list(self.findings)
+        if self.misaligned:
+            findings.append(
+                (
+                    f"{self.misaligned} of {self.stored} stored chunks "
+                    f"are not aligned to {self.align} bytes",
+                    None,
+                )
+            )
+
+        other = (
+            self.archive_size
+            - self.metadata_bytes
+            - self.chunk_bytes
+            - self.padding_bytes
+        )
+        total = self.archive_size or 1
+        findings.append(
+            (
+                f"metadata is {self.metadata_bytes} bytes "
+                f"({self.metadata_bytes / total:.2%}), "
+                f"chunk data is {self.chunk_bytes} bytes "
+                f"({self.chunk_bytes / total:.2%}), "
+                f"alignment padding is {self.padding_bytes} bytes "
+                f"({self.padding_bytes / total:.2%}), "
+                f"headers and central directory are {other} bytes "
+                f"({other / total:.2%})",
+                None,
+            )
+        )
+
+        findings.append(
+            (
+                f"loading {len(self.metadata_spans)} metadata documents "
+                f"in BFS order needs {self.metadata_seeks()} seeks",
+                None,
+            )
+        )
+        return findings
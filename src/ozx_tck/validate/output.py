@@ -0,0 +1,173 @@
+"""Writers which stream validation events to an output as they are produced."""
+
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import Counter
+import json
+from typing import TYPE_CHECKING, Any, TextIO
+import sys
+
+from ..util import Location, tool_version
+
+if TYPE_CHECKING:
+    from . import Event
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+RFC_URI = "https://ngff.openmicroscopy.org/rfc/9/index.html"
+SARIF_LEVELS = {"valid": "none", "info": "note", "warn": "warning", "error": "error"}
+
+
+class EventWriter(ABC):
+    """Writes events one at a time, keeping only running counts."""
+
+    def __init__(self, stream: TextIO, verbose: int = 0) -> None:
+        self.stream = stream
+        self.verbose = verbose
+        self.archives = 0
+        self.counts: Counter[str] = Counter()
+        self.archive_counts: Counter[str] = Counter()
+        self.highest = 0
+
+    def begin(self):
+        pass
+
+    def write(self, event: Event):
+        self.counts[event.state] += 1
+        self.archive_counts[event.state] += 1
+        self.highest = max(self.highest, event.level())
+        self._write(event)
+
+    @abstractmethod
+    def _write(self, event: Event):
+        pass
+
+    def end_archive(self, path: Location):
+        self.archives += 1
+        self._end_archive(path)
+        self.archive_counts.clear()
+        self.stream.flush()
+
+    def _end_archive(self, path: Location):
+        pass
+
+    def exit_code(self, strict=False) -> int:
+        if self.highest == 1 and not strict:
+            return 0
+        return self.highest
+
+    def summary(self, code: int) -> dict[str, Any]:
+        return {
+            "archives": self.archives,
+            "counts": dict(self.counts),
+            "exit_code": code,
+        }
+
+    @abstractmethod
+    def end(self, code: int):
+        pass
+
+
+class TextWriter(EventWriter):
+    def _write(self, event: Event):
+        print(event.fmt(), file=self.stream)
+
+    def end(self, code: int):
+        self.stream.flush()
+        if self.verbose:
+            counts = ", ".join(
+                f"{n} {state}" for state, n in sorted(self.counts.items())
+            )
+            print(
+                f"validated {self.archives} archives: {counts or 'no events'}",
+                file=sys.stderr,
+            )
+
+
+class JsonlWriter(EventWriter):
+    """One JSON object per line.
+
+    Each event is an `event` record; each archive is followed by an `archive` record
+    with its event counts, and the output ends with a `summary` record.
+    """
+
+    def line(self, d: dict[str, Any]):
+        self.stream.write(json.dumps(d) + "\n")
+
+    def _write(self, event: Event):
+        self.line(
+            {
+                "type": "event",
+                "path": str(event.path),
+                "arcname": event.arcname,
+                "state": event.state,
+                "msg": event.msg,
+            }
+        )
+
+    def _end_archive(self, path: Location):
+        self.line(
+            {"type": "archive", "path": str(path), "counts": dict(self.archive_counts)}
+        )
+
+    def end(self, code: int):
+        self.line({"type": "summary"} | self.summary(code))
+        self.stream.flush()
+
+
+class SarifWriter(EventWriter):
+    """A single SARIF 2.1.0 log, written incrementally.
+
+    Events are written as results as they arrive;
+    the summary is written to the run's properties when the log is closed.
+    """
+
+    def begin(self):
+        driver = {
+            "name": "ozx-tck",
+            "version": tool_version(),
+            "informationUri": RFC_URI,
+        }
+        head = json.dumps(
+            {
+                "$schema": SARIF_SCHEMA,
+                "version": "2.1.0",
+                "runs": [{"tool": {"driver": driver}, "results": []}],
+            }
+        )
+        # split before the closing brackets of the results array, run, runs and log
+        self.stream.write(head[: -len("]}]}")] + "\n")
+        self.first = True
+
+    def _write(self, event: Event):
+        location: dict[str, Any] = {
+            "physicalLocation": {"artifactLocation": {"uri": str(event.path)}}
+        }
+        if event.arcname is not None:
+            location["logicalLocations"] = [
+                {
+                    "name": event.arcname,
+                    "fullyQualifiedName": f"{event.path}::{event.arcname}",
+                    "kind": "member",
+                }
+            ]
+        result = {
+            "level": SARIF_LEVELS[event.state],
+            "message": {"text": event.msg},
+            "locations": [location],
+        }
+        sep = "" if self.first else ","
+        self.first = False
+        self.stream.write(sep + json.dumps(result) + "\n")
+
+    def end(self, code: int):
+        self.stream.write(
+            '], "properties": ' + json.dumps(self.summary(code)) + "}]}\n"
+        )
+        self.stream.flush()
+
+
+WRITERS: dict[str, type[EventWriter]] = {
+    "text": TextWriter,
+    "jsonl": JsonlWriter,
+    "sarif": SarifWriter,
+}
@@ -0,0 +1,587 @@
+"""Minimal streaming reader for ZIP archive structure.
+
+Unlike `zipfile.ZipFile`, nothing is read until it is asked for:
+the end of central directory records are located by seeking to the tail,
+and central directory records are parsed from large buffered reads
+and yielded one at a time,
+so memory use does not grow with the number of entries.
+"""
+
+from __future__ import annotations
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, replace
+import io
+from mmap import mmap
+import os
+from pathlib import Path
+import struct
+from typing import BinaryIO
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+EOCD_SIG = b"PK\x05\x06"
+ZIP64_EOCD_SIG = b"PK\x06\x06"
+ZIP64_LOCATOR_SIG = b"PK\x06\x07"
+CENTRAL_DIR_SIG = b"PK\x01\x02"
+LOCAL_HEADER_SIG = b"PK\x03\x04"
+SPANNING_SIG = b"PK\x07\x08"
+
+EOCD = struct.Struct("<4s4H2LH")
+ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+CENTRAL_DIR = struct.Struct("<4s6H3L5H2L")
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+ZIP64_EXTRA_ID = 0x0001
+ALIGNMENT_EXTRA_ID = 0xD935
+"""Extra field which pads a local header so that its data is aligned (as zipalign)."""
+
+UTF8_FLAG = 0x800
+MAX_COMMENT = 0xFFFF
+
+DEFAULT_BUFSIZE = 4 * 1024**2
+"""Size of reads made while streaming the central directory."""
+
+LOCAL_HEADER_GAP = 64 * 1024
+"""Local headers less than this far apart are read together."""
+
+LOCAL_HEADER_MAX_READ = 4 * 1024**2
+"""Maximum size of a read of several local headers."""
+
+LOCAL_HEADER_SLACK = 64
+"""Allowance for local header extra fields when reading several headers at once."""
+
+
+@dataclass(slots=True)
+class EndOfCentralDirectory:
+    """Location and size of the central directory, and the archive comment.
+
+    Where a ZIP64 end of central directory record exists,
+    its values take precedence.
+    """
+
+    offset: int
+    """Offset of the (non-ZIP64) end of central directory record."""
+
+    disk_number: int
+    cd_start_disk: int
+    total_entries: int
+    cd_size: int
+    cd_offset: int
+    comment: bytes
+
+    zip64_offset: int | None
+    """Offset of the ZIP64 end of central directory record, if present."""
+
+    concat: int
+    """Number of bytes prepended to the archive, e.g. by a self-extractor."""
+
+    @property
+    def zip64(self) -> bool:
+        return self.zip64_offset is not None
+
+    @property
+    def multipart(self) -> bool:
+        return self.disk_number != 0 or self.cd_start_disk != 0
+
+    @property
+    def cd_start(self) -> int:
+        """Absolute offset of the first central directory record in this file."""
+        return self.cd_offset + self.concat
+
+
+@dataclass(slots=True)
+class CentralDirectoryEntry:
+    """Compact record of a single central directory file header."""
+
+    filename: str
+    header_offset: int
+    compress_size: int
+    file_size: int
+    compress_type: int
+    crc: int
+    flag_bits: int
+    disk_start: int
+
+    zip64: bool
+    """Whether the central directory record has a ZIP64 extra field."""
+
+
+@dataclass(slots=True)
+class LocalHeader:
+    """Fields of a local file header which are useful for cross-checking."""
+
+    offset: int
+    compress_type: int
+    flag_bits: int
+    crc: int
+    compress_size: int
+    file_size: int
+    filename: bytes
+
+    extra_len: int
+
+    zip64: bool
+    """Whether the local header has a ZIP64 extra field."""
+
+    padding: int = 0
+    """Length of the alignment extra field, if any."""
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + LOCAL_HEADER.size + len(self.filename) + self.extra_len
+
+
+def pread(f: BinaryIO, offset: int, size: int) -> bytes:
+    """Read up to `size` bytes at `offset`, using positional reads where possible."""
+    try:
+        fd = f.fileno()
+    except OSError:
+        f.seek(offset)
+        return f.read(size)
+    return os.pread(fd, size, offset)
+
+
+def file_size(f: BinaryIO) -> int:
+    return f.seek(0, os.SEEK_END)
+
+
+def read_eocd(f: BinaryIO) -> EndOfCentralDirectory:
+    """Find and parse the end of central directory records at the tail of the file.
+
+    Raises BadZipFile if they cannot be found.
+    """
+    size = file_size(f)
+    tail_len = min(size, EOCD.size + MAX_COMMENT + ZIP64_LOCATOR.size)
+    tail_start = size - tail_len
+    tail = pread(f, tail_start, tail_len)
+
+    pos = len(tail)
+    while True:
+        pos = tail.rfind(EOCD_SIG, 0, pos)
+        if pos < 0:
+            raise BadZipFile("end of central directory record not found")
+        if pos + EOCD.size > len(tail):
+            continue
+        (
+            _,
+            disk_number,
+            cd_start_disk,
+            _,
+            total_entries,
+            cd_size,
+            cd_offset,
+            comment_len,
+        ) = EOCD.unpack_from(tail, pos)
+        if pos + EOCD.size + comment_len <= len(tail):
+            break
+
+    offset = tail_start + pos
+    comment = tail[pos + EOCD.size : pos + EOCD.size + comment_len]
+
+    zip64_offset = None
+    cd_end = offset
+    loc_pos = pos - ZIP64_LOCATOR.size
+    if loc_pos >= 0 and tail[loc_pos : loc_pos + 4] == ZIP64_LOCATOR_SIG:
+        (_, _, zip64_offset, _) = ZIP64_LOCATOR.unpack_from(tail, loc_pos)
+        rec = pread(f, zip64_offset, ZIP64_EOCD.size)
+        if len(rec) != ZIP64_EOCD.size or rec[:4] != ZIP64_EOCD_SIG:
+            # the locator offset is relative to the start of the archive,
+            # so try again assuming nothing is prepended
+            # and the record sits directly before the locator
+            zip64_offset = tail_start + loc_pos - ZIP64_EOCD.size
+            rec = pread(f, zip64_offset, ZIP64_EOCD.size)
+            if len(rec) != ZIP64_EOCD.size or rec[:4] != ZIP64_EOCD_SIG:
+                raise BadZipFile("ZIP64 end of central directory record not found")
+        (
+            _,
+            _,
+            _,
+            _,
+            disk_number,
+            cd_start_disk,
+            _,
+            total_entries,
+            cd_size,
+            cd_offset,
+        ) = ZIP64_EOCD.unpack(rec)
+        cd_end = zip64_offset
+
+    concat = cd_end - cd_size - cd_offset
+    if concat < 0:
+        if disk_number == 0:
+            raise BadZipFile("central directory size or offset is corrupt")
+        # for multi-part archives, offsets refer to other files
+        concat = 0
+
+    return EndOfCentralDirectory(
+        offset,
+        disk_number,
+        cd_start_disk,
+        total_entries,
+        cd_size,
+        cd_offset,
+        comment,
+        zip64_offset,
+        concat,
+    )
+
+
+def parse_zip64_extra(
+    extra: bytes | memoryview, needed: list[int]
+) -> tuple[bool, list[int]]:
+    """Find the ZIP64 extra field and use it to replace saturated values.
+
+    `needed` holds, in order, the uncompressed size, compressed size,
+    header offset and disk start;
+    the values which are saturated (0xFFFFFFFF, or 0xFFFF for the disk)
+    are replaced in order by the 64-bit values in the extra field.
+    """
+    pos = 0
+    while pos + 4 <= len(extra):
+        (tag, length) = struct.unpack_from("<2H", extra, pos)
+        pos += 4
+        if tag != ZIP64_EXTRA_ID:
+            pos += length
+            continue
+
+        body = extra[pos : pos + length]
+        idx = 0
+        for n, val in enumerate(needed):
+            limit = 0xFFFF if n == 3 else 0xFFFFFFFF
+            if val != limit:
+                continue
+            if n == 3:
+                if idx + 4 > len(body):
+                    break
+                needed[n] = struct.unpack_from("<L", body, idx)[0]
+                idx += 4
+            else:
+                if idx + 8 > len(body):
+                    break
+                needed[n] = struct.unpack_from("<Q", body, idx)[0]
+                idx += 8
+        return True, needed
+    return False, needed
+
+
+def extra_field_length(extra: bytes | memoryview, tag: int) -> int:
+    """Length of an extra field, header included, or 0 if it is not present."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        (field_tag, length) = struct.unpack_from("<2H", extra, pos)
+        if field_tag == tag:
+            return 4 + length
+        pos += 4 + length
+    return 0
+
+
+def decode_name(raw: bytes | memoryview, flag_bits: int) -> str:
+    if flag_bits & UTF8_FLAG:
+        return str(raw, "utf-8")
+    return str(raw, "cp437")
+
+
+def iter_central_directory(
+    f: BinaryIO,
+    eocd: EndOfCentralDirectory | None = None,
+    bufsize: int = DEFAULT_BUFSIZE,
+) -> Iterator[CentralDirectoryEntry]:
+    """Stream records from the central directory, in central directory order.
+
+    Raises BadZipFile if a record is truncated or has the wrong signature.
+    """
+    if eocd is None:
+        eocd = read_eocd(f)
+
+    offset = eocd.cd_start
+    end = offset + eocd.cd_size
+    # remote files can fetch the whole central directory in one request
+    will_read = getattr(f, "will_read", None)
+    if will_read is not None:
+        will_read(offset, eocd.cd_size)
+
+    buf = b""
+    pos = 0
+
+    def fill(n: int) -> bool:
+        nonlocal buf, pos, offset
+        if len(buf) - pos >= n:
+            return True
+        to_read = max(bufsize, n) - (len(buf) - pos)
+        to_read = min(to_read, end - offset)
+        chunk = pread(f, offset, to_read) if to_read > 0 else b""
+        offset += len(chunk)
+        buf = buf[pos:] + chunk
+        pos = 0
+        return len(buf) >= n
+
+    for _ in range(eocd.total_entries):
+        if not fill(CENTRAL_DIR.size):
+            raise BadZipFile("truncated central directory")
+        (
+            sig,
+            _,
+            _,
+            flag_bits,
+            compress_type,
+            _,
+            _,
+            crc,
+            compress_size,
+            file_size,
+            name_len,
+            extra_len,
+            comment_len,
+            disk_start,
+            _,
+            _,
+            header_offset,
+        ) = CENTRAL_DIR.unpack_from(buf, pos)
+        if sig != CENTRAL_DIR_SIG:
+            raise BadZipFile("bad central directory record signature")
+
+        rec_len = CENTRAL_DIR.size + name_len + extra_len + comment_len
+        if not fill(rec_len):
+            raise BadZipFile("truncated central directory record")
+
+        name_start = pos + CENTRAL_DIR.size
+        extra_start = name_start + name_len
+        extra = buf[extra_start : extra_start + extra_len]
+        zip64, (file_size, compress_size, header_offset, disk_start) = (
+            parse_zip64_extra(
+                extra, [file_size, compress_size, header_offset, disk_start]
+            )
+        )
+
+        yield CentralDirectoryEntry(
+            decode_name(buf[name_start:extra_start], flag_bits),
+            header_offset,
+            compress_size,
+            file_size,
+            compress_type,
+            crc,
+            flag_bits,
+            disk_start,
+            zip64,
+        )
+        pos += rec_len
+
+
+def read_local_header(
+    f: BinaryIO, entry: CentralDirectoryEntry, concat: int = 0
+) -> LocalHeader:
+    """Read the local file header for a central directory entry.
+
+    Raises BadZipFile if there is no local file header at the recorded offset.
+    """
+    offset = entry.header_offset + concat
+    b = pread(f, offset, LOCAL_HEADER.size)
+    if len(b) != LOCAL_HEADER.size:
+        raise BadZipFile("truncated local file header")
+    (name_len, extra_len) = struct.unpack_from("<2H", b, LOCAL_HEADER.size - 4)
+    b += pread(f, offset + LOCAL_HEADER.size, name_len + extra_len)
+    return parse_local_header(b, 0, offset)
+
+
+def group_reads(
+    entries: Iterable[CentralDirectoryEntry],
+    end: Callable[[CentralDirectoryEntry], int],
+    gap: int,
+    max_bytes: int,
+) -> Iterator[tuple[list[CentralDirectoryEntry], int]]:
+    """Group entries, in offset order, into runs which can each be fetched in one read.
+
+    `end` gives the offset beyond the part of an entry which is needed.
+    A run continues while the next entry starts less than `gap` bytes
+    after the end of the previous one,
+    and would not make the run longer than `max_bytes`.
+    Yields each run with the offset it ends at.
+    """
+    run: list[CentralDirectoryEntry] = []
+    run_end = 0
+    for entry in sorted(entries, key=lambda e: e.header_offset):
+        entry_end = end(entry)
+        if run and (
+            entry.header_offset - run_end >= gap
+            or entry_end - run[0].header_offset > max_bytes
+        ):
+            yield run, run_end
+            run = []
+        run_end = max(run_end, entry_end) if run else entry_end
+        run.append(entry)
+    if run:
+        yield run, run_end
+
+
+def local_header_end(entry: CentralDirectoryEntry) -> int:
+    """Offset beyond an entry's local header, unless its extra field is large."""
+    return (
+        entry.header_offset
+        + LOCAL_HEADER.size
+        + len(entry.filename.encode())
+        + LOCAL_HEADER_SLACK
+    )
+
+
+def iter_local_headers(
+    f: BinaryIO, entries: Iterable[CentralDirectoryEntry], concat: int = 0
+) -> Iterator[tuple[CentralDirectoryEntry, LocalHeader | None]]:
+    """Local headers of entries, in offset order.
+
+    Headers close together (as they are between small entries)
+    are parsed from a single read, rather than each needing their own.
+    The header is None where it cannot be parsed from the read,
+    e.g. because it is corrupt or its extra field is large;
+    `read_local_header` gives the reason.
+    """
+    for run, end in group_reads(
+        entries, local_header_end, LOCAL_HEADER_GAP, LOCAL_HEADER_MAX_READ
+    ):
+        start = run[0].header_offset + concat
+        buf = pread(f, start, end + concat - start)
+        for entry in run:
+            offset = entry.header_offset + concat
+            try:
+                yield entry, parse_local_header(buf, offset - start, offset)
+            except BadZipFile:
+                yield entry, None
+
+
+def parse_local_header(
+    buf: bytes | memoryview | mmap, pos: int = 0, offset: int | None = None
+) -> LocalHeader:
+    """Parse a local file header starting at `pos` in a buffer.
+
+    `offset` is the header's offset in the archive, if the buffer does not start there.
+    Raises BadZipFile if the header is truncated or has the wrong signature.
+    """
+    if pos + LOCAL_HEADER.size > len(buf):
+        raise BadZipFile("truncated local file header")
+    (
+        sig,
+        _,
+        flag_bits,
+        compress_type,
+        _,
+        _,
+        crc,
+        compress_size,
+        file_size,
+        name_len,
+        extra_len,
+    ) = LOCAL_HEADER.unpack_from(buf, pos)
+    if sig != LOCAL_HEADER_SIG:
+        raise BadZipFile("bad local file header signature")
+
+    name_start = pos + LOCAL_HEADER.size
+    extra_start = name_start + name_len
+    if extra_start + extra_len > len(buf):
+        raise BadZipFile("truncated local file header")
+    extra = buf[extra_start : extra_start + extra_len]
+    zip64, (file_size, compress_size, _, _) = parse_zip64_extra(
+        extra, [file_size, compress_size, 0, 0]
+    )
+    return LocalHeader(
+        pos if offset is None else offset,
+        compress_type,
+        flag_bits,
+        crc,
+        compress_size,
+        file_size,
+        bytes(buf[name_start:extra_start]),
+        extra_len,
+        zip64,
+        extra_field_length(extra, ALIGNMENT_EXTRA_ID),
+    )
+
+
+def decompress_entry(data: bytes | memoryview, compress_type: int) -> bytes:
+    """Contents of an entry from its (possibly compressed) data."""
+    if compress_type == ZIP_DEFLATED:
+        return zlib.decompress(data, -zlib.MAX_WBITS)
+    if compress_type != ZIP_STORED:
+        raise BadZipFile(f"unsupported compression type {compress_type}")
+    return bytes(data)
+
+
+def read_entry(f: BinaryIO, entry: CentralDirectoryEntry, concat: int = 0) -> bytes:
+    """Read and decompress the contents of an entry."""
+    local = read_local_header(f, entry, concat)
+    return decompress_entry(
+        pread(f, local.data_offset, entry.compress_size), entry.compress_type
+    )
+
+
+def split_segment_path(path: Path, disk: int, last: bool) -> Path:
+    """Path of a segment of a split archive, whose last segment is at `path`.
+
+    Earlier segments replace its suffix with `.z01`, `.z02`, etc..
+    """
+    return path if last else path.with_suffix(f".z{disk + 1:02d}")
+
+
+@dataclass(slots=True)
+class SplitLayout:
+    segments: list[Path]
+    sizes: list[int]
+    eocd: EndOfCentralDirectory
+    entries: list[CentralDirectoryEntry]
+
+
+def read_split_layout(path: Path) -> SplitLayout:
+    """Read and check the structure of a split archive, given its last segment.
+
+    Checks that every segment exists,
+    that the first starts with the spanning signature,
+    that the central directory can be read across segments,
+    and that every local header lies within one segment
+    and has the name recorded in the central directory.
+    Raises BadZipFile if any of these fail.
+    """
+    with open(path, "rb") as f:
+        eocd = read_eocd(f)
+    count = eocd.disk_number + 1
+    segments = [split_segment_path(path, d, d == count - 1) for d in range(count)]
+    missing = [p.name for p in segments if not p.is_file()]
+    if missing:
+        raise BadZipFile(f"missing segments: {', '.join(missing)}")
+    sizes = [p.stat().st_size for p in segments]
+
+    files = [open(p, "rb") for p in segments]
+    try:
+        if pread(files[0], 0, len(SPANNING_SIG)) != SPANNING_SIG:
+            raise BadZipFile("first segment does not start with spanning signature")
+
+        end = eocd.offset if eocd.zip64_offset is None else eocd.zip64_offset
+        parts = []
+        for disk in range(eocd.cd_start_disk, count):
+            start = eocd.cd_offset if disk == eocd.cd_start_disk else 0
+            stop = end if disk == count - 1 else sizes[disk]
+            parts.append(pread(files[disk], start, stop - start))
+        cd = b"".join(parts)
+        if len(cd) != eocd.cd_size:
+            raise BadZipFile(
+                f"central directory is {len(cd)} bytes, expected {eocd.cd_size}"
+            )
+
+        entries = list(
+            iter_central_directory(
+                io.BytesIO(cd),  # type: ignore[arg-type]
+                replace(eocd, cd_offset=0, concat=0),
+            )
+        )
+        for entry in entries:
+            if entry.disk_start >= count:
+                raise BadZipFile(f"{entry.filename}: no segment {entry.disk_start}")
+            local = read_local_header(files[entry.disk_start], entry)
+            if decode_name(local.filename, local.flag_bits) != entry.filename:
+                raise BadZipFile(f"{entry.filename}: local header has another name")
+    finally:
+        for f in files:
+            f.close()
+
+    return SplitLayout(segments, sizes, eocd, entries)
@@ -0,0 +1,748 @@
+"""Minimal writer for ZIP archives whose entries' sizes and CRC-32s are known.
+
+Unlike `zipfile.ZipFile`, a stored entry's local header is written
+with its final sizes and CRC-32 before its data,
+so the data can be copied from the source file by the kernel
+(`os.copy_file_range`, falling back to `os.sendfile` or a buffered copy)
+rather than passing through Python.
+Timestamps are fixed, so the same entries always produce the same bytes.
+
+Otherwise, records follow the choices `zipfile` makes:
+a ZIP64 extra field in the local header if requested or needed,
+in the central directory only if needed,
+and ZIP64 end of central directory records only if needed.
+"""
+
+from __future__ import annotations
+from collections import Counter
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+from functools import cache
+import os
+from pathlib import Path
+import struct
+from typing import BinaryIO
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+import zlib
+import logging
+
+from .zipread import (
+    ALIGNMENT_EXTRA_ID,
+    CENTRAL_DIR,
+    CENTRAL_DIR_SIG,
+    EOCD,
+    EOCD_SIG,
+    LOCAL_HEADER,
+    LOCAL_HEADER_SIG,
+    MAX_COMMENT,
+    SPANNING_SIG,
+    UTF8_FLAG,
+    ZIP64_EOCD,
+    ZIP64_EOCD_SIG,
+    ZIP64_EXTRA_ID,
+    ZIP64_LOCATOR,
+    ZIP64_LOCATOR_SIG,
+    split_segment_path,
+)
+
+logger = logging.getLogger(__name__)
+
+ZIP64_LIMIT = (1 << 31) - 1
+"""Sizes and offsets above this need ZIP64 (as in `zipfile`)."""
+
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+
+DEFAULT_VERSION = 20
+ZIP64_VERSION = 45
+CREATE_SYSTEM = 3
+"""UNIX"""
+
+DEFAULT_EXTERNAL_ATTR = 0o600 << 16
+"""Permissions rw-------, as `zipfile` uses for entries written from streams."""
+
+DEFAULT_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+"""The earliest date a ZIP archive can represent."""
+
+COPY_BUFSIZE = 4 * 1024**2
+"""Size of reads when data cannot be copied by the kernel, or is compressed."""
+
+KERNEL_COPY_MIN = 256 * 1024
+"""Files smaller than this are copied through the output buffer instead."""
+
+ALIGNMENT_EXTRA_MIN = 6
+"""Header, and 2-byte alignment value, of the alignment extra field."""
+
+
+@dataclass(slots=True)
+class WrittenEntry:
+    """What the central directory needs to know about a written entry."""
+
+    name: bytes
+    flag_bits: int
+    compress_type: int
+    crc: int
+    compress_size: int
+    file_size: int
+    header_offset: int
+
+    zip64: bool
+    """Whether the local header has a ZIP64 extra field."""
+
+    disk: int = 0
+    """Segment of a split archive which contains the local header."""
+
+    padding: int = 0
+    """Length of the alignment extra field in the local header, if any."""
+
+
+def encode_name(name: str) -> tuple[bytes, int]:
+    """Encoded name and flag bits, as `zipfile` chooses them."""
+    try:
+        return name.encode("ascii"), 0
+    except UnicodeEncodeError:
+        return name.encode("utf-8"), UTF8_FLAG
+
+
+def dos_date_time(date_time: tuple[int, ...]) -> tuple[int, int]:
+    dt = date_time
+    dosdate = (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2]
+    dostime = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+    return dosdate, dostime
+
+
+CRC32_POLYNOMIAL = 0xEDB88320
+"""Reversed CRC-32 polynomial, as used by ZIP and zlib."""
+
+
+def _gf2_times(matrix: list[int], vector: int) -> int:
+    """Multiply a 32x32 matrix over GF(2), stored as columns, by a vector."""
+    out = 0
+    idx = 0
+    while vector:
+        if vector & 1:
+            out ^= matrix[idx]
+        vector >>= 1
+        idx += 1
+    return out
+
+
+def _gf2_square(matrix: list[int]) -> list[int]:
+    return [_gf2_times(matrix, col) for col in matrix]
+
+
+@cache
+def _zeros_operator(log2_bytes: int) -> list[int]:
+    """Matrix which advances a CRC-32 register over 2**`log2_bytes` zero bytes."""
+    if log2_bytes:
+        return _gf2_square(_zeros_operator(log2_bytes - 1))
+    # one zero bit, then square up to one zero byte
+    matrix = [CRC32_POLYNOMIAL] + [1 << n for n in range(31)]
+    for _ in range(3):
+        matrix = _gf2_square(matrix)
+    return matrix
+
+
+def crc32_zeros(size: int, crc: int = 0) -> int:
+    """CRC-32 of `size` zero bytes, continuing from `crc`, without reading them.
+
+    As `zlib.crc32(bytes(size), crc)`,
+    but in time logarithmic in `size` (as zlib's `crc32_combine`).
+    """
+    register = crc ^ 0xFFFFFFFF
+    log2_bytes = 0
+    while size:
+        if size & 1:
+            register = _gf2_times(_zeros_operator(log2_bytes), register)
+        size >>= 1
+        log2_bytes += 1
+    return register ^ 0xFFFFFFFF
+
+
+def crc32_file(path: Path, bufsize=COPY_BUFSIZE) -> tuple[int, int]:
+    """CRC-32 and size of a file, reading at most `bufsize` bytes at a time."""
+    crc = 0
+    size = 0
+    buf = bytearray(bufsize)
+    view = memoryview(buf)
+    with path.open("rb", buffering=0) as f:
+        while n := f.readinto(buf):
+            crc = zlib.crc32(view[:n], crc)
+            size += n
+    return crc, size
+
+
+def copy_file_data(
+    src_fd: int, dst_fd: int, dst_offset: int, size: int, src_offset: int = 0
+) -> None:
+    """Copy `size` bytes from an offset in one file to an offset in another.
+
+    Uses `os.copy_file_range` where possible, which may share extents
+    on file systems which support it;
+    otherwise `os.sendfile`, and finally positional reads and writes.
+    """
+    done = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while done < size:
+                n = os.copy_file_range(
+                    src_fd,
+                    dst_fd,
+                    size - done,
+                    src_offset + done,
+                    dst_offset + done,
+                )
+                if not n:
+                    break
+                done += n
+        except OSError as e:
+            logger.debug("copy_file_range failed, falling back: %s", e)
+
+    if done < size and hasattr(os, "sendfile"):
+        try:
+            os.lseek(dst_fd, dst_offset + done, os.SEEK_SET)
+            while done < size:
+                n = os.sendfile(dst_fd, src_fd, src_offset + done, size - done)
+                if not n:
+                    break
+                done += n
+        except OSError as e:
+            logger.debug("sendfile failed, falling back: %s", e)
+
+    while done < size:
+        b = os.pread(src_fd, min(COPY_BUFSIZE, size - done), src_offset + done)
+        if not b:
+            raise OSError(f"source file ended {size - done} bytes early")
+        done += os.pwrite(dst_fd, b, dst_offset + done)
+
+
+def needs_zip64_end(total: int, cd_offset: int, cd_size: int) -> bool:
+    return (
+        total > ZIP_FILECOUNT_LIMIT or cd_offset > ZIP64_LIMIT or cd_size > ZIP64_LIMIT
+    )
+
+
+def end_records(
+    offset: int,
+    total: int,
+    cd_size: int,
+    cd_offset: int,
+    comment: bytes,
+    disk: int = 0,
+    cd_disk: int = 0,
+    disk_count: int | None = None,
+    zip64: bool | None = None,
+) -> bytes:
+    """ZIP64 end of central directory records if needed, then the EOCD and comment.
+
+    `offset` is where they will be written, within the last segment if split;
+    `disk_count` is the number of central directory records in that segment,
+    by default `total`.
+    `zip64` forces the ZIP64 records to be written, or not; by default, if needed.
+    """
+    if len(comment) > MAX_COMMENT:
+        raise ValueError("archive comment is too long")
+    if disk_count is None:
+        disk_count = total
+    if zip64 is None:
+        zip64 = needs_zip64_end(total, cd_offset, cd_size)
+    out = b""
+    if zip64:
+        out += ZIP64_EOCD.pack(
+            ZIP64_EOCD_SIG,
+            ZIP64_EOCD.size - 12,
+            ZIP64_VERSION,
+            ZIP64_VERSION,
+            disk,
+            cd_disk,
+            disk_count,
+            total,
+            cd_size,
+            cd_offset,
+        )
+        out += ZIP64_LOCATOR.pack(ZIP64_LOCATOR_SIG, disk, offset, disk + 1)
+        disk_count = min(disk_count, 0xFFFF)
+        total = min(total, 0xFFFF)
+        cd_size = min(cd_size, 0xFFFFFFFF)
+        cd_offset = min(cd_offset, 0xFFFFFFFF)
+
+    return (
+        out
+        + EOCD.pack(
+            EOCD_SIG,
+            disk,
+            cd_disk,
+            disk_count,
+            total,
+            cd_size,
+            cd_offset,
+            len(comment),
+        )
+        + comment
+    )
+
+
+class ZipWriter(AbstractContextManager):
+    """Write a ZIP archive to a new local file.
+
+    Set `comment` before closing to add an archive comment.
+    """
+
+    COMPRESS_TYPES: tuple[int, ...] = (ZIP_STORED, ZIP_DEFLATED)
+
+    def __init__(
+        self,
+        path: Path,
+        mode="x",
+        compression: int = ZIP_STORED,
+        date_time: tuple[int, ...] = DEFAULT_DATE_TIME,
+        align: int = 0,
+        force_zip64_end=False,
+    ) -> None:
+        """`mode` is "x" to create a new file or "w" to overwrite one.
+
+        With `align`, the data of stored entries of at least `align` bytes
+        starts at a multiple of `align` bytes,
+        so that whole blocks can be shared with the source file
+        by file systems which support reflinks;
+        smaller entries could not share a whole block, so are not padded.
+        With `force_zip64_end`, ZIP64 end of central directory records are written
+        even if they are not needed.
+        """
+        if mode not in ("x", "w"):
+            raise ValueError(f"unsupported mode: {mode}")
+        if not 0 <= align <= 0x8000:
+            raise ValueError(f"unsupported alignment: {align}")
+        self.path = path
+        self.align = align
+        self.force_zip64_end = force_zip64_end
+        self.fp = self.open_output(path, mode)
+        self.compression = compression
+        self.dosdate, self.dostime = dos_date_time(date_time)
+        self.entries: list[WrittenEntry] = []
+        self.comment = b""
+
+    def open_output(self, path: Path, mode: str) -> BinaryIO:
+        return open(path, "xb" if mode == "x" else "wb")
+
+    @property
+    def disk(self) -> int:
+        """Segment being written; always 0 unless the archive is split."""
+        return 0
+
+    def begin_record(self, size: int):
+        """Called before writing a header or record of `size` bytes.
+
+        Split archives use this to keep records within a single segment.
+        """
+
+    def local_header(self, entry: WrittenEntry) -> bytes:
+        file_size = entry.file_size
+        compress_size = entry.compress_size
+        extra = b""
+        version = DEFAULT_VERSION
+        if entry.zip64:
+            extra = struct.pack("<2H2Q", ZIP64_EXTRA_ID, 16, file_size, compress_size)
+            file_size = compress_size = 0xFFFFFFFF
+            version = ZIP64_VERSION
+        if entry.padding:
+            extra += struct.pack(
+                "<3H", ALIGNMENT_EXTRA_ID, entry.padding - 4, self.align
+            ) + bytes(entry.padding - ALIGNMENT_EXTRA_MIN)
+        return (
+            LOCAL_HEADER.pack(
+                LOCAL_HEADER_SIG,
+                version,
+                entry.flag_bits,
+                entry.compress_type,
+                self.dostime,
+                self.dosdate,
+                entry.crc,
+                compress_size,
+                file_size,
+                len(entry.name),
+                len(extra),
+            )
+            + entry.name
+            + extra
+        )
+
+    def write(
+        self,
+        name: str,
+        source: bytes | Path,
+        crc: int | None = None,
+        size: int | None = None,
+        compress_type: int | None = None,
+        force_zip64=True,
+    ):
+        """Add an entry from bytes, or from the contents of a file.
+
+        `crc` and `size` are calculated if not given;
+        a file is then read an extra time.
+        """
+        if compress_type is None:
+            compress_type = self.compression
+        if compress_type not in self.COMPRESS_TYPES:
+            raise ValueError(f"unsupported compression type: {compress_type}")
+
+        if isinstance(source, bytes):
+            size = len(source)
+            if crc is None:
+                crc = zlib.crc32(source)
+        elif crc is None or size is None:
+            crc, size = crc32_file(source)
+
+        encoded, flag_bits = encode_name(name)
+        entry = WrittenEntry(
+            encoded,
+            flag_bits,
+            compress_type,
+            crc,
+            size if compress_type == ZIP_STORED else 0,
+            size,
+            0,
+            # compressed data can be larger than the original
+            force_zip64 or size * 1.05 > ZIP64_LIMIT,
+        )
+        self._write_header(entry)
+
+        if compress_type == ZIP_DEFLATED:
+            self._write_deflated(entry, source)
+        elif isinstance(source, bytes):
+            self.fp.write(source)
+        else:
+            self._write_file(source, size)
+        self.entries.append(entry)
+
+    def writestr(self, name: str, data: bytes, force_zip64=True):
+        self.write(name, data, force_zip64=force_zip64)
+
+    def write_compressed(
+        self, name: str, data: bytes, crc: int, size: int, force_zip64=True
+    ):
+        """Add an entry from raw deflate data, e.g. compressed by another thread.
+
+        `crc` and `size` are those of the uncompressed data.
+        """
+        if ZIP_DEFLATED not in self.COMPRESS_TYPES:
+            raise ValueError(f"unsupported compression type: {ZIP_DEFLATED}")
+        encoded, flag_bits = encode_name(name)
+        entry = WrittenEntry(
+            encoded,
+            flag_bits,
+            ZIP_DEFLATED,
+            crc,
+            len(data),
+            size,
+            0,
+            force_zip64 or max(size, len(data)) > ZIP64_LIMIT,
+        )
+        self._write_header(entry)
+        self.fp.write(data)
+        self.entries.append(entry)
+
+    def write_zeros(
+        self, name: str, size: int, crc: int | None = None, force_zip64=True
+    ):
+        """Add a stored entry of `size` zero bytes, without writing them.
+
+        The output file is left sparse where the file system supports it.
+        """
+        if crc is None:
+            crc = crc32_zeros(size)
+        encoded, flag_bits = encode_name(name)
+        entry = WrittenEntry(
+            encoded,
+            flag_bits,
+            ZIP_STORED,
+            crc,
+            size,
+            size,
+            0,
+            force_zip64 or size > ZIP64_LIMIT,
+        )
+        self._write_header(entry)
+        self.fp.flush()
+        self.fp.seek(self.fp.tell() + size)
+        self.entries.append(entry)
+
+    def _write_header(self, entry: WrittenEntry):
+        """Write an entry's local header, padded to align stored data."""
+        header_len = len(self.local_header(entry))
+        self.begin_record(header_len)
+        entry.header_offset = self.fp.tell()
+        entry.disk = self.disk
+        if (
+            self.align
+            and entry.compress_type == ZIP_STORED
+            and entry.compress_size >= self.align
+        ):
+            padding = -(entry.header_offset + header_len) % self.align
+            while padding < ALIGNMENT_EXTRA_MIN:
+                padding += self.align
+            entry.padding = padding
+        self.fp.write(self.local_header(entry))
+
+    def _write_file(self, path: Path, size: int):
+        with path.open("rb", buffering=0) as src:
+            if size < KERNEL_COPY_MIN:
+                self.fp.write(src.read())
+                return
+            self.fp.flush()
+            offset = self.fp.tell()
+            copy_file_data(src.fileno(), self.fp.fileno(), offset, size)
+            self.fp.seek(offset + size)
+
+    def _write_deflated(self, entry: WrittenEntry, source: bytes | Path):
+        """Compress data after a provisional header, then rewrite the header."""
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS
+        )
+        start = self.fp.tell()
+        if isinstance(source, bytes):
+            self.fp.write(compressor.compress(source))
+        else:
+            with source.open("rb") as src:
+                while b := src.read(COPY_BUFSIZE):
+                    self.fp.write(compressor.compress(b))
+        self.fp.write(compressor.flush())
+        end = self.fp.tell()
+
+        entry.compress_size = end - start
+        if not entry.zip64 and entry.compress_size > ZIP64_LIMIT:
+            raise ValueError(f"compressed size of {entry.name!r} needs ZIP64")
+        self.fp.seek(entry.header_offset)
+        self.fp.write(self.local_header(entry))
+        self.fp.seek(end)
+
+    def central_directory_record(self, entry: WrittenEntry) -> bytes:
+        file_size = entry.file_size
+        compress_size = entry.compress_size
+        header_offset = entry.header_offset
+        extra_values = []
+        if file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT:
+            extra_values += [file_size, compress_size]
+            file_size = compress_size = 0xFFFFFFFF
+        if header_offset > ZIP64_LIMIT:
+            extra_values.append(header_offset)
+            header_offset = 0xFFFFFFFF
+
+        extra = b""
+        if extra_values:
+            extra = struct.pack(
+                f"<2H{len(extra_values)}Q",
+                ZIP64_EXTRA_ID,
+                8 * len(extra_values),
+                *extra_values,
+            )
+        version = ZIP64_VERSION if extra or entry.zip64 else DEFAULT_VERSION
+        return (
+            CENTRAL_DIR.pack(
+                CENTRAL_DIR_SIG,
+                CREATE_SYSTEM << 8 | version,
+                version,
+                entry.flag_bits,
+                entry.compress_type,
+                self.dostime,
+                self.dosdate,
+                entry.crc,
+                compress_size,
+                file_size,
+                len(entry.name),
+                len(extra),
+                0,
+                entry.disk,
+                0,
+                DEFAULT_EXTERNAL_ATTR,
+                header_offset,
+            )
+            + entry.name
+            + extra
+        )
+
+    def write_end(self):
+        """Write the central directory and end of central directory records."""
+        if len(self.comment) > MAX_COMMENT:
+            raise ValueError("archive comment is too long")
+        cd_size = 0
+        cd_start: tuple[int, int] | None = None
+        records_per_disk: Counter[int] = Counter()
+        for entry in self.entries:
+            rec = self.central_directory_record(entry)
+            self.begin_record(len(rec))
+            if cd_start is None:
+                cd_start = (self.disk, self.fp.tell())
+            records_per_disk[self.disk] += 1
+            self.fp.write(rec)
+            cd_size += len(rec)
+        if cd_start is None:
+            cd_start = (self.disk, self.fp.tell())
+        cd_disk, cd_offset = cd_start
+        total = len(self.entries)
+
+        zip64 = self.force_zip64_end or needs_zip64_end(total, cd_offset, cd_size)
+        end_len = EOCD.size + len(self.comment)
+        if zip64:
+            end_len += ZIP64_EOCD.size + ZIP64_LOCATOR.size
+        self.begin_record(end_len)
+        self.fp.write(
+            end_records(
+                self.fp.tell(),
+                total,
+                cd_size,
+                cd_offset,
+                self.comment,
+                self.disk,
+                cd_disk,
+                records_per_disk[self.disk],
+                zip64,
+            )
+        )
+
+    def close(self):
+        if self.fp.closed:
+            return
+        try:
+            self.write_end()
+        finally:
+            self.fp.close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.fp.close()
+
+
+MIN_SEGMENT_SIZE = 64 * 1024
+"""Smallest segment size allowed by the ZIP specification."""
+
+
+class SplitFile:
+    """Write-only output spread over segment files of at most `segment_size` bytes.
+
+    Segments are named as for `split_segment_path`;
+    the last is renamed to `path` on closing.
+    """
+
+    def __init__(self, path: Path, segment_size: int, mode="x") -> None:
+        if segment_size < MIN_SEGMENT_SIZE:
+            raise ValueError(f"segment size must be at least {MIN_SEGMENT_SIZE}")
+        self.path = path
+        self.segment_size = segment_size
+        self.mode = mode
+        self.disk = 0
+        self.paths: list[Path] = []
+        self.fp = self._open_segment()
+        self.fp.write(SPANNING_SIG)
+
+    def _open_segment(self) -> BinaryIO:
+        p = split_segment_path(self.path, self.disk, False)
+        self.paths.append(p)
+        return open(p, self.mode + "b")
+
+    @property
+    def remaining(self) -> int:
+        return self.segment_size - self.fp.tell()
+
+    def next_segment(self):
+        self.fp.close()
+        self.disk += 1
+        self.fp = self._open_segment()
+
+    def reserve(self, size: int):
+        """Start a new segment unless `size` bytes fit in this one."""
+        if size > self.segment_size:
+            raise ValueError(f"record of {size} bytes is larger than a segment")
+        if size > self.remaining:
+            self.next_segment()
+
+    def write(self, b: bytes | memoryview) -> int:
+        view = memoryview(b)
+        while view:
+            n = min(self.remaining, len(view))
+            if not n:
+                self.next_segment()
+                continue
+            self.fp.write(view[:n])
+            view = view[n:]
+        return len(b)
+
+    def tell(self) -> int:
+        """Offset in the current segment."""
+        return self.fp.tell()
+
+    def seek(self, offset: int) -> int:
+        """Seek within the current segment."""
+        return self.fp.seek(offset)
+
+    def flush(self):
+        self.fp.flush()
+
+    def fileno(self) -> int:
+        return self.fp.fileno()
+
+    @property
+    def closed(self) -> bool:
+        return self.fp.closed
+
+    def close(self):
+        if self.fp.closed:
+            return
+        self.fp.close()
+        self.paths[-1] = self.paths[-1].rename(self.path)
+
+
+class SplitZipWriter(ZipWriter):
+    """Write a split (multi-part) ZIP archive, streaming entries into segments.
+
+    Entry data may span segments,
+    but local headers, central directory records
+    and the end of central directory records each stay within one.
+    Entries can only be stored, not compressed.
+    """
+
+    COMPRESS_TYPES = (ZIP_STORED,)
+    fp: SplitFile  # type: ignore[assignment]
+
+    def __init__(
+        self,
+        path: Path,
+        segment_size: int,
+        mode="x",
+        date_time: tuple[int, ...] = DEFAULT_DATE_TIME,
+    ) -> None:
+        """`path` is the last segment, conventionally with a `.zip` suffix."""
+        self.segment_size = segment_size
+        super().__init__(path, mode, ZIP_STORED, date_time)
+
+    def open_output(self, path: Path, mode: str) -> BinaryIO:
+        return SplitFile(path, self.segment_size, mode)  # type: ignore[return-value]
+
+    @property
+    def disk(self) -> int:
+        return self.fp.disk
+
+    @property
+    def paths(self) -> list[Path]:
+        return self.fp.paths
+
+    def begin_record(self, size: int):
+        self.fp.reserve(size)
+
+    def _write_file(self, path: Path, size: int):
+        with path.open("rb", buffering=0) as src:
+            if size < KERNEL_COPY_MIN:
+                self.fp.write(src.read())
+                return
+            done = 0
+            while done < size:
+                n = min(self.fp.remaining, size - done)
+                if not n:
+                    self.fp.next_segment()
+                    continue
+                self.fp.flush()
+                offset = self.fp.tell()
+                copy_file_data(src.fileno(), self.fp.fileno(), offset, n, done)
+                self.fp.seek(offset + n)
+                done += n